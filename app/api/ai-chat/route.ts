@@ -1,11 +1,39 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
 import path from 'path';
+import { callGateway, gatewayAvailable, isGatewayUnreachable } from '@/lib/aiGateway';
+
+// Chat turns go to the pre-forked AI gateway when its socket exists. Otherwise a
+// small pool of warm Python processes serves them over stdin/stdout (NDJSON) so
+// each request skips interpreter start-up while concurrent users still run in
+// parallel. Set AI_CHAT_WORKER=false to spawn per request.
+const useChatWorker = process.env.AI_CHAT_WORKER !== 'false';
+const chatWorkerPoolSize = Math.max(1, parseInt(process.env.AI_CHAT_WORKERS || '4', 10) || 4);
+const chatWorkerTimeoutMs = 90000;
+
+type PendingChat = {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer: NodeJS.Timeout;
+  // Streaming requests get each {"type": "chunk"} line; the next other line ends the request
+  onChunk?: (event: any) => void;
+};
+
+type ChatWorker = {
+  process: ChildProcessWithoutNullStreams;
+  pending: Map<number, PendingChat>;
+};
+
+const globalForChatWorker = globalThis as unknown as {
+  chatWorkers: (ChatWorker | undefined)[] | undefined;
+  chatWorkerNextId: number | undefined;
+};
 
 export async function POST(request: NextRequest) {
   try {
     const body = await request.json();
-    const { message, conversationHistory, testContext } = body;
+    // With a conversationId the Python side keeps the history, so clients may send only the new message
+    const { message, conversationHistory, testContext, conversationId, stream } = body;
 
     if (!message) {
       return NextResponse.json(
@@ -14,10 +42,14 @@ export async function POST(request: NextRequest) {
       );
     }
 
-    console.log('Processing chat message:', { message, conversationHistory: conversationHistory?.length, testContext });
+    console.log('Processing chat message:', { message, conversationHistory: conversationHistory?.length, testContext, stream });
 
-    // Call Python script for chat continuation
-    const result = await callPythonChat(message, conversationHistory, testContext);
+    if (stream) {
+      return streamChat(message, conversationHistory, testContext, conversationId);
+    }
+
+    // Call Python for chat continuation
+    const result = await callChat(message, conversationHistory, testContext, conversationId);
     
     console.log('Chat result:', result);
     return NextResponse.json(result);
@@ -30,7 +62,62 @@ export async function POST(request: NextRequest) {
   }
 }
 
-async function callPythonChat(message: string, conversationHistory: any[] = [], testContext: any = null): Promise<any> {
+async function callChat(message: string, conversationHistory: any[] = [], testContext: any = null, conversationId: string | null = null): Promise<any> {
+  if (gatewayAvailable()) {
+    try {
+      return await callGateway('chat', 'chat_turn', [{ message, conversationHistory, testContext, conversationId }]);
+    } catch (error) {
+      // A stale socket file means no gateway is running; anything else is a real failure
+      if (!isGatewayUnreachable(error)) throw error;
+      console.log('AI gateway unreachable, using chat workers');
+    }
+  }
+  return useChatWorker
+    ? callChatWorker(message, conversationHistory, testContext, conversationId)
+    : callPythonChat(message, conversationHistory, testContext, conversationId);
+}
+
+// Streams NDJSON events ({"type": "chunk"} lines, then one "complete" or "error")
+// from a chat worker, in the same format as /api/google-ai-chat
+function streamChat(message: string, conversationHistory: any[] = [], testContext: any = null, conversationId: string | null = null): Response {
+  const encoder = new TextEncoder();
+
+  const readableStream = new ReadableStream({
+    async start(controller) {
+      const send = (event: any) => controller.enqueue(encoder.encode(JSON.stringify(event) + '\n'));
+      try {
+        if (useChatWorker) {
+          const final = await callChatWorker(message, conversationHistory, testContext, conversationId, send);
+          // A worker that failed before streaming answers with a plain error result
+          send(final.type ? final : { type: 'error', error: final.error || 'Unknown error' });
+        } else {
+          // Without workers the whole reply arrives at once
+          const result = await callPythonChat(message, conversationHistory, testContext, conversationId);
+          send(result.success
+            ? { type: 'complete', content: result.ai_response, ...(result.fallback_mode ? { fallback_mode: true } : {}) }
+            : { type: 'error', error: result.error || 'Unknown error' });
+        }
+      } catch (error) {
+        console.error('AI chat streaming error:', error);
+        send({
+          type: 'error',
+          error: error instanceof Error ? error.message : 'Unknown error',
+        });
+      }
+      controller.close();
+    },
+  });
+
+  return new Response(readableStream, {
+    headers: {
+      'Content-Type': 'text/event-stream',
+      'Cache-Control': 'no-cache',
+      'Connection': 'keep-alive',
+    },
+  });
+}
+
+async function callPythonChat(message: string, conversationHistory: any[] = [], testContext: any = null, conversationId: string | null = null): Promise<any> {
   return new Promise((resolve, reject) => {
     const scriptsDir = path.join(process.cwd(), 'scripts');
     const pythonScript = path.join(scriptsDir, 'chat_api_simple.py');
@@ -42,7 +129,8 @@ async function callPythonChat(message: string, conversationHistory: any[] = [],
       pythonScript,
       message,
       JSON.stringify(conversationHistory),
-      JSON.stringify(testContext)
+      JSON.stringify(testContext),
+      conversationId ?? 'null'
     ], {
       env: {
         ...process.env,
@@ -106,4 +194,141 @@ async function callPythonChat(message: string, conversationHistory: any[] = [],
       reject(new Error(`Failed to start Python process: ${error.message}`));
     });
   });
-} 
\ No newline at end of file
+}
+
+function startChatWorker(slot: number): ChatWorker {
+  const scriptsDir = path.join(process.cwd(), 'scripts');
+  const pythonScript = path.join(scriptsDir, 'chat_api_simple.py');
+  console.log(`Starting chat worker ${slot}:`, pythonScript);
+
+  const workerProcess = spawn('python3', [pythonScript, '--worker'], {
+    env: {
+      ...process.env,
+      PYTHONPATH: scriptsDir,
+      PYTHONUNBUFFERED: '1'
+    },
+    cwd: scriptsDir
+  });
+  const worker: ChatWorker = { process: workerProcess, pending: new Map<number, PendingChat>() };
+  const workers = globalForChatWorker.chatWorkers!;
+  workers[slot] = worker;
+
+  let buffer = '';
+  workerProcess.stdout.on('data', (data) => {
+    buffer += data.toString();
+    let newlineIndex;
+    while ((newlineIndex = buffer.indexOf('\n')) >= 0) {
+      const line = buffer.slice(0, newlineIndex).trim();
+      buffer = buffer.slice(newlineIndex + 1);
+      if (!line.startsWith('{')) continue;
+
+      try {
+        const result = JSON.parse(line);
+        const entry = worker.pending.get(result.id);
+        if (!entry) continue;
+        if (entry.onChunk && result.type === 'chunk') {
+          delete result.id;
+          entry.onChunk(result);
+          continue;
+        }
+        worker.pending.delete(result.id);
+        clearTimeout(entry.timer);
+        delete result.id;
+        entry.resolve(result);
+      } catch (e) {
+        console.error('Failed to parse chat worker output:', line);
+      }
+    }
+  });
+
+  workerProcess.stderr.on('data', (data) => {
+    console.log(`Chat worker ${slot} stderr:`, data.toString());
+  });
+
+  const failPending = (error: Error) => {
+    if (workers[slot] === worker) {
+      workers[slot] = undefined;
+    }
+    for (const entry of worker.pending.values()) {
+      clearTimeout(entry.timer);
+      entry.reject(error);
+    }
+    worker.pending.clear();
+  };
+
+  workerProcess.on('close', (code) => {
+    console.log(`Chat worker ${slot} exited with code:`, code);
+    failPending(new Error(`Chat worker exited with code ${code}`));
+  });
+
+  workerProcess.on('error', (error) => {
+    console.error('Failed to start chat worker:', error);
+    failPending(new Error(`Failed to start chat worker: ${error.message}`));
+  });
+
+  return worker;
+}
+
+function isRunning(worker: ChatWorker | undefined): worker is ChatWorker {
+  return !!worker && worker.process.exitCode === null && !worker.process.killed;
+}
+
+function conversationSlot(conversationId: string): number {
+  let hash = 0;
+  for (let i = 0; i < conversationId.length; i++) {
+    hash = (hash * 31 + conversationId.charCodeAt(i)) | 0;
+  }
+  return Math.abs(hash) % chatWorkerPoolSize;
+}
+
+function getChatWorker(conversationId: string | null): ChatWorker {
+  if (!globalForChatWorker.chatWorkers) {
+    globalForChatWorker.chatWorkers = [];
+  }
+  const workers = globalForChatWorker.chatWorkers;
+
+  // A conversation always goes to the same worker so its in-memory session stays current
+  if (conversationId) {
+    const slot = conversationSlot(conversationId);
+    const worker = workers[slot];
+    return isRunning(worker) ? worker : startChatWorker(slot);
+  }
+
+  // Otherwise prefer an idle worker, then start another, then the least busy one
+  let best: ChatWorker | undefined;
+  let emptySlot = -1;
+  for (let slot = 0; slot < chatWorkerPoolSize; slot++) {
+    const worker = workers[slot];
+    if (!isRunning(worker)) {
+      if (emptySlot < 0) emptySlot = slot;
+      continue;
+    }
+    if (worker.pending.size === 0) return worker;
+    if (!best || worker.pending.size < best.pending.size) best = worker;
+  }
+  if (emptySlot >= 0) return startChatWorker(emptySlot);
+  return best!;
+}
+
+async function callChatWorker(message: string, conversationHistory: any[] = [], testContext: any = null, conversationId: string | null = null, onChunk?: (event: any) => void): Promise<any> {
+  const worker = getChatWorker(conversationId);
+  const id = (globalForChatWorker.chatWorkerNextId ?? 0) + 1;
+  globalForChatWorker.chatWorkerNextId = id;
+
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      worker.pending.delete(id);
+      reject(new Error(`Chat worker timed out after ${chatWorkerTimeoutMs}ms`));
+    }, chatWorkerTimeoutMs);
+    worker.pending.set(id, { resolve, reject, timer, onChunk });
+
+    worker.process.stdin.write(JSON.stringify({
+      id,
+      message,
+      conversationHistory,
+      testContext,
+      conversationId,
+      stream: !!onChunk
+    }) + '\n');
+  });
+}
@@ -1,5 +1,5 @@
 import { NextRequest, NextResponse } from 'next/server';
-import { readFileSync, writeFileSync, existsSync } from 'fs';
+import { readFileSync, writeFileSync, existsSync, renameSync, unlinkSync } from 'fs';
 import path from 'path';
 
 // Default AI configuration
@@ -60,7 +60,18 @@ function loadConfig() {
 function saveConfig(config: any) {
   try {
     const configPath = getConfigPath();
-    writeFileSync(configPath, JSON.stringify(config, null, 2), 'utf8');
+    // Write a temp file and rename it into place so Python workers watching
+    // the config never read a partially written file
+    const tempPath = `${configPath}.${process.pid}.tmp`;
+    try {
+      writeFileSync(tempPath, JSON.stringify(config, null, 2), 'utf8');
+      renameSync(tempPath, configPath);
+    } catch (error) {
+      if (existsSync(tempPath)) {
+        unlinkSync(tempPath);
+      }
+      throw error;
+    }
     return true;
   } catch (error) {
     console.error('Error saving config:', error);
@@ -1,6 +1,7 @@
 import { NextRequest, NextResponse } from 'next/server';
 import { spawn } from 'child_process';
 import path from 'path';
+import { callGateway, gatewayAvailable, isGatewayUnreachable } from '@/lib/aiGateway';
 
 export async function POST(request: NextRequest) {
   try {
@@ -15,6 +16,18 @@ export async function POST(request: NextRequest) {
 
     console.log('Processing AI test with:', { testTitle, testDescription });
 
+    // Warm gateway workers answer without starting Python at all
+    if (gatewayAvailable()) {
+      try {
+        const result = await callGateway('google', 'process_memory_garden_test', [testTitle, testDescription]);
+        console.log('AI test result:', result);
+        return NextResponse.json(result);
+      } catch (error) {
+        if (!isGatewayUnreachable(error)) throw error;
+        console.log('AI gateway unreachable, spawning Python');
+      }
+    }
+
     // Execute Python script for Google AI
     const pythonScript = path.join(process.cwd(), 'scripts', 'test_google_ai_simple.py');
     const scriptDir = path.join(process.cwd(), 'scripts');
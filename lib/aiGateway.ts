@@ -0,0 +1,57 @@
+import net from 'net';
+import { existsSync } from 'fs';
+
+// Client for scripts/ai_gateway.py: pre-forked Python workers with warm
+// provider clients behind a Unix socket, one NDJSON request/response per line.
+export const gatewaySocketPath = process.env.AI_GATEWAY_SOCKET || '/tmp/memory-garden-ai.sock';
+const gatewayTimeoutMs = 120000;
+
+export function gatewayAvailable(): boolean {
+  return process.env.AI_GATEWAY !== 'false' && existsSync(gatewaySocketPath);
+}
+
+// Errors meaning the request never reached a worker, so the caller may safely run it another way
+export function isGatewayUnreachable(error: unknown): boolean {
+  const code = (error as NodeJS.ErrnoException)?.code;
+  return code === 'ENOENT' || code === 'ECONNREFUSED';
+}
+
+export function callGateway(provider: string, method: string, args: any[] = [], kwargs: Record<string, any> = {}): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const socket = net.createConnection(gatewaySocketPath);
+    let buffer = '';
+    let settled = false;
+
+    const finish = (error: Error | null, result?: any) => {
+      if (settled) return;
+      settled = true;
+      socket.destroy();
+      if (error) reject(error);
+      else resolve(result);
+    };
+
+    socket.setTimeout(gatewayTimeoutMs, () => {
+      finish(new Error(`AI gateway timed out after ${gatewayTimeoutMs}ms`));
+    });
+
+    socket.on('connect', () => {
+      socket.write(JSON.stringify({ id: 1, provider, method, args, kwargs }) + '\n');
+    });
+
+    socket.on('data', (data) => {
+      buffer += data.toString();
+      const newlineIndex = buffer.indexOf('\n');
+      if (newlineIndex < 0) return;
+      try {
+        const result = JSON.parse(buffer.slice(0, newlineIndex));
+        delete result.id;
+        finish(null, result);
+      } catch (e) {
+        finish(new Error(`Invalid AI gateway response: ${buffer.slice(0, newlineIndex)}`));
+      }
+    });
+
+    socket.on('error', (error) => finish(error));
+    socket.on('close', () => finish(new Error('AI gateway closed the connection without a response')));
+  });
+}
@@ -0,0 +1,24 @@
+"""
+Helpers for fanning out async provider calls on one event loop
+"""
+
+import asyncio
+from typing import Any, Awaitable, Iterable, List, Optional
+
+async def gather_bounded(calls: Iterable[Awaitable[Any]], limit: Optional[int] = None) -> List[Any]:
+    """Await many provider calls concurrently, at most `limit` in flight
+
+    Results come back in input order; exceptions are returned in place
+    rather than cancelling the other calls.
+    """
+    calls = list(calls)
+    if not limit:
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(call: Awaitable[Any]) -> Any:
+        async with semaphore:
+            return await call
+
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
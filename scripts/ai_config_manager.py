@@ -1,12 +1,197 @@
 import json
 import os
-from typing import Dict, Any, Optional
+import copy
+import hashlib
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, Optional, NamedTuple, Mapping
 from datetime import datetime
+from config_watcher import FileWatcher
+from cache_paths import DEFAULT_CACHE_DIR
+from shared_snapshot import SharedSnapshotFile, SHARED_SNAPSHOTS_AVAILABLE
+
+# Publish compiled snapshots to a memory-mapped file shared by all processes
+SHARED_SNAPSHOT_ENABLED = SHARED_SNAPSHOTS_AVAILABLE and os.environ.get('AI_CONFIG_SHARED', 'true').lower() == 'true'
+
+_GOOGLE_FALLBACK = {
+    "rules": [
+        {"keywords": ["hello", "hi"], "response": "Hi! 🌱 Ready to look at your memory garden? What memory would you like to plant today?"},
+        {"keywords": ["memory", "garden"], "response": "I like helping with memories! What special moment do you want to remember today?"},
+        {"keywords": ["help"], "response": "I'm here to help! What kind of memory are you thinking about planting?"},
+        {"keywords": ["sunset", "walk"], "response": "That sounds nice! 🌅 What made that time special for you?"},
+        {"keywords": ["reflection"], "response": "Thinking about things is good! What did this memory show you about yourself?"}
+    ],
+    "default": "Hi! I'm here to help with your memory garden. What memory would you like to explore?"
+}
+
+_CLOUD_FALLBACK = {
+    "rules": [
+        {"keywords": ["hello", "hi"], "response": "Hello! How can I help you today?"},
+        {"keywords": ["memory", "garden"], "response": "I'd be happy to help you with your memory garden! What would you like to know?"},
+        {"keywords": ["help"], "response": "I'm here to help! You can ask me about planting memories, exploring your garden, or any other features."},
+        {"keywords": ["sunset", "walk"], "response": "That sounds like a beautiful memory! Evening walks can be so peaceful and reflective. The changing light and quiet moments often help us process our thoughts and feelings."},
+        {"keywords": ["reflection"], "response": "This memory seems meaningful to you. Take a moment to reflect on how it made you feel and what it taught you about yourself."}
+    ],
+    "default": "I'm here to assist you with your Memory Garden. How can I help?"
+}
+
+# Canned replies used when a cloud provider is unavailable; the first rule
+# (in list order) with a keyword found anywhere in the prompt wins
+DEFAULT_FALLBACK_RULES = {
+    "google": _GOOGLE_FALLBACK,
+    "openai": _CLOUD_FALLBACK,
+    "huggingface": _CLOUD_FALLBACK
+}
+
+class ConfigSnapshot(NamedTuple):
+    """Immutable artifacts derived from one version of the AI configuration"""
+    version: int
+    fingerprint: str
+    personality_prompt: str
+    responses: Mapping[str, str]
+    default_response: str
+    conversation_settings: Mapping[str, Any]
+
+def build_personality_prompt(config: Dict[str, Any]) -> str:
+    """Render the personality prompt for a configuration dict"""
+    personality = config.get("personality", {})
+    techniques = config.get("therapeutic_techniques", {})
+    
+    prompt = f"""You are a {personality.get('role', 'compassionate_therapist')} with a {personality.get('tone', 'warm_and_empathetic')} tone.
+
+Your approach is {personality.get('approach', 'listening_and_reflecting')} and your style is {personality.get('style', 'gentle_and_supportive')}.
+
+Therapeutic techniques you use:
+"""
+    
+    for technique, enabled in techniques.items():
+        if enabled:
+            prompt += f"- {technique.replace('_', ' ').title()}\n"
+    
+    prompt += "\nKeep responses warm, empathetic, and focused on emotional support."
+    return prompt
 
 class AIConfigManager:
     def __init__(self, config_file: str = "ai_config.json"):
         self.config_file = config_file
-        self.config = self.load_config()
+        self._snapshot = None
+        self._snapshot_lock = threading.Lock()
+        self._watcher = None
+        self._shared = None
+        if SHARED_SNAPSHOT_ENABLED:
+            digest = hashlib.sha256(os.path.abspath(config_file).encode("utf-8")).hexdigest()[:12]
+            self._shared = SharedSnapshotFile(os.path.join(DEFAULT_CACHE_DIR, f"ai_config_{digest}.snapshot"))
+        # Skip parsing entirely when another process already compiled this exact file
+        if not self._adopt_shared(require_current_source=True):
+            self.config = self.load_config()
+            self._compile(self.config)
+    
+    def _source_signature(self) -> Optional[list]:
+        try:
+            stat = os.stat(self.config_file)
+            return [stat.st_mtime_ns, stat.st_size]
+        except OSError:
+            return None
+    
+    def _compile(self, config: Dict[str, Any], republish: bool = False) -> ConfigSnapshot:
+        """Rebuild the snapshot if the configuration content changed"""
+        # republish: the file was rewritten with unchanged content; publish anyway
+        # so other processes can match the shared snapshot against the file on disk
+        fingerprint = hashlib.sha256(
+            json.dumps(config, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:16]
+        with self._snapshot_lock:
+            previous = self._snapshot
+            if previous is not None and previous.fingerprint == fingerprint and not (republish and self._shared is not None):
+                return previous
+            responses = dict(config.get("responses", {}))
+            fields = {
+                "fingerprint": fingerprint,
+                "personality_prompt": build_personality_prompt(config),
+                "responses": responses,
+                "default_response": responses.get("fallback", "I hear you. 💚"),
+                "conversation_settings": dict(config.get("conversation_flow", {}))
+            }
+            version = previous.version + 1 if previous else 1
+            if self._shared is not None:
+                payload = dict(fields, config=config, source=self._source_signature())
+                try:
+                    version = self._shared.publish(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+                except OSError as e:
+                    print(f"⚠️ Could not publish shared config snapshot: {e}")
+                    self._shared = None
+            return self._install(config, fields, version)
+    
+    def _install(self, config: Dict[str, Any], fields: Dict[str, Any], version: int) -> ConfigSnapshot:
+        snapshot = ConfigSnapshot(
+            version=version,
+            fingerprint=fields["fingerprint"],
+            personality_prompt=fields["personality_prompt"],
+            responses=MappingProxyType(fields["responses"]),
+            default_response=fields["default_response"],
+            conversation_settings=MappingProxyType(fields["conversation_settings"])
+        )
+        # Readers see either the old or the new snapshot, never a mix
+        self._snapshot = snapshot
+        self.config = config
+        return snapshot
+    
+    def _adopt_shared(self, require_current_source: bool = False) -> bool:
+        """Install the snapshot another process published, without re-parsing the config file"""
+        if self._shared is None:
+            return False
+        entry = self._shared.read()
+        if entry is None:
+            return False
+        version, payload = entry
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            return False
+        if require_current_source and data.get("source") != self._source_signature():
+            return False
+        with self._snapshot_lock:
+            self._install(data["config"], data, version)
+        return True
+    
+    def _sync(self) -> ConfigSnapshot:
+        """Pick up a newer shared snapshot; costs one integer compare when nothing changed"""
+        shared = self._shared
+        if shared is not None and shared.read_version() != self._snapshot.version:
+            self._adopt_shared()
+        return self._snapshot
+    
+    def reload(self) -> bool:
+        """Re-read the config file, keeping the current config if it is missing or invalid"""
+        previous_version = self._snapshot.version
+        if self._adopt_shared(require_current_source=True):
+            # Another process already compiled the file we were about to parse
+            return True
+        try:
+            with open(self.config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reloading config: {e}")
+            return False
+        if self._compile(config, republish=True).version != previous_version:
+            print(f"🔄 AI config reloaded (version {self._snapshot.version})")
+        return True
+    
+    def start_watching(self) -> None:
+        """Reload in the background whenever the config file changes on disk"""
+        if self._watcher is None:
+            self._watcher = FileWatcher(self.config_file, self.reload)
+        self._watcher.start()
+    
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._watcher.stop()
+    
+    @property
+    def snapshot(self) -> ConfigSnapshot:
+        """Current compiled configuration; its version changes only when the config does"""
+        return self._sync()
     
     def load_config(self) -> Dict[str, Any]:
         """Load AI configuration from file"""
@@ -24,9 +209,24 @@ class AIConfigManager:
     def save_config(self, config: Dict[str, Any]) -> bool:
         """Save AI configuration to file"""
         try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
-            self.config = config
+            # Write a temp file and rename it over the config so readers
+            # (and file watchers) never see a partially written file
+            config_dir = os.path.dirname(os.path.abspath(self.config_file))
+            fd, temp_path = tempfile.mkstemp(prefix=".ai_config.", suffix=".tmp", dir=config_dir)
+            try:
+                # mkstemp creates the file 0600; keep the existing permissions
+                mode = os.stat(self.config_file).st_mode & 0o777 if os.path.exists(self.config_file) else 0o644
+                os.chmod(temp_path, mode)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.config_file)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+            self._compile(config, republish=True)
             return True
         except Exception as e:
             print(f"Error saving config: {e}")
@@ -67,15 +267,18 @@ class AIConfigManager:
                 "emotional_exploration": "What feelings come up when you think about this?",
                 "support_offering": "How can I best support you right now?",
                 "reflection_request": "Would you like to explore this further?"
-            }
+            },
+            "fallback_rules": copy.deepcopy(DEFAULT_FALLBACK_RULES)
         }
     
     def update_config(self, updates: Dict[str, Any]) -> bool:
         """Update specific parts of the configuration"""
         try:
-            # Deep merge updates into existing config
-            self.merge_config(self.config, updates)
-            return self.save_config(self.config)
+            # Deep merge updates into a copy so readers never see a half-merged config
+            self._sync()
+            config = copy.deepcopy(self.config)
+            self.merge_config(config, updates)
+            return self.save_config(config)
         except Exception as e:
             print(f"Error updating config: {e}")
             return False
@@ -90,31 +293,16 @@ class AIConfigManager:
     
     def get_personality_prompt(self) -> str:
         """Generate personality prompt from configuration"""
-        personality = self.config.get("personality", {})
-        techniques = self.config.get("therapeutic_techniques", {})
-        
-        prompt = f"""You are a {personality.get('role', 'compassionate_therapist')} with a {personality.get('tone', 'warm_and_empathetic')} tone.
-
-Your approach is {personality.get('approach', 'listening_and_reflecting')} and your style is {personality.get('style', 'gentle_and_supportive')}.
-
-Therapeutic techniques you use:
-"""
-        
-        for technique, enabled in techniques.items():
-            if enabled:
-                prompt += f"- {technique.replace('_', ' ').title()}\n"
-        
-        prompt += "\nKeep responses warm, empathetic, and focused on emotional support."
-        return prompt
+        return self._sync().personality_prompt
     
     def get_custom_response(self, response_type: str) -> str:
         """Get a custom response based on type"""
-        responses = self.config.get("responses", {})
-        return responses.get(response_type, responses.get("fallback", "I hear you. 💚"))
+        snapshot = self._sync()
+        return snapshot.responses.get(response_type, snapshot.default_response)
     
     def get_conversation_settings(self) -> Dict[str, Any]:
         """Get conversation flow settings"""
-        return self.config.get("conversation_flow", {})
+        return dict(self._sync().conversation_settings)
     
     def reset_to_default(self) -> bool:
         """Reset configuration to default values"""
@@ -123,6 +311,7 @@ Therapeutic techniques you use:
     
     def export_config(self) -> str:
         """Export configuration as JSON string"""
+        self._sync()
         return json.dumps(self.config, indent=2, ensure_ascii=False)
     
     def import_config(self, config_json: str) -> bool:
@@ -135,4 +324,8 @@ Therapeutic techniques you use:
             return False
 
 # Global config manager instance
-config_manager = AIConfigManager() 
\ No newline at end of file
+config_manager = AIConfigManager()
+
+# Long-lived processes can opt in to hot reloading at import time
+if os.environ.get('AI_CONFIG_WATCH', 'false').lower() == 'true':
+    config_manager.start_watching() 
\ No newline at end of file
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Pre-forked AI gateway for Memory Garden
+Keeps provider clients warm in N worker processes behind a Unix domain socket
+
+Each connection carries newline-delimited JSON requests:
+
+    {"id": 1, "provider": "google", "method": "continue_conversation",
+     "args": ["Hi", []], "kwargs": {"context": {"website_name": "Memory Garden"}}}
+
+and receives one JSON response per line: the provider method's result dict
+with the request "id" echoed back.
+"""
+
+import os
+import sys
+import json
+import socket
+import signal
+import time
+import argparse
+import importlib
+from datetime import datetime
+from collections import deque
+from typing import Dict, Any, Optional
+
+# Keep provider debug output out of the way for gateway traffic
+os.environ.setdefault('SUPPRESS_DEBUG', 'true')
+
+# Add the scripts directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_SOCKET_PATH = os.environ.get('AI_GATEWAY_SOCKET', '/tmp/memory-garden-ai.sock')
+DEFAULT_WORKERS = int(os.environ.get('AI_GATEWAY_WORKERS', '4'))
+
+# Restart backoff for workers that die soon after starting
+RESTART_BASE_DELAY = float(os.environ.get('AI_GATEWAY_RESTART_DELAY', '0.5'))
+RESTART_MAX_DELAY = float(os.environ.get('AI_GATEWAY_RESTART_MAX_DELAY', '30'))
+# A worker that stayed up this long resets the backoff
+STABLE_SECONDS = float(os.environ.get('AI_GATEWAY_STABLE_SECONDS', '30'))
+# More crashes than this within the window stop the gateway instead of fork-looping
+MAX_CRASHES = int(os.environ.get('AI_GATEWAY_MAX_CRASHES', '10'))
+CRASH_WINDOW = float(os.environ.get('AI_GATEWAY_CRASH_WINDOW', '60'))
+
+# provider name -> (module, class)
+PROVIDERS = {
+    "lmstudio": ("lmstudio_ai", "LMStudioAITester"),
+    "ollama": ("deepseek_ai", "OllamaAITester"),
+    "google": ("google_ai", "GoogleAI"),
+    "google_multimodal": ("google_ai_multimodal", "GoogleAIMultimodal"),
+    "google_image": ("google_ai_image_generation", "GoogleAIImageGeneration"),
+    "openai": ("openai_ai", "OpenAIAI"),
+    "huggingface": ("huggingface_ai", "HuggingFaceAI"),
+    "getimg": ("getimg_ai", "GetImgAIGenerator"),
+    "free_image": ("free_image_generation", "FreeImageGenerator"),
+    "router": ("provider_router", "ProviderRouter"),
+    "chat": ("chat_api_simple", "ChatService"),
+}
+
+# Only these entry points can be reached over the socket
+ALLOWED_METHODS = {
+    "continue_conversation",
+    "process_test_inputs",
+    "process_memory_garden_test",
+    "generate_image",
+    "generate_memory_visualization",
+    "analyze_image",
+    "analyze_video",
+    "analyze_memory_media",
+    "generate_memory_insights",
+    "chat_turn",
+}
+
+def preload_modules() -> Dict[str, Any]:
+    """Import provider modules once in the parent so workers inherit them"""
+    modules = {}
+    for provider, (module_name, _) in PROVIDERS.items():
+        try:
+            modules[provider] = importlib.import_module(module_name)
+        except Exception as e:
+            print(f"⚠️ Provider '{provider}' unavailable: {e}", file=sys.stderr)
+    return modules
+
+class GatewayWorker:
+    def __init__(self, modules: Dict[str, Any]):
+        self.modules = modules
+        self.clients = {}
+        # Construct every client up front; failures are retried on first use
+        for provider in modules:
+            try:
+                self.get_client(provider)
+            except Exception as e:
+                print(f"⚠️ Could not initialize '{provider}' in worker {os.getpid()}: {e}", file=sys.stderr)
+
+    def get_client(self, provider: str):
+        """Return the warm client for a provider, constructing it if needed"""
+        client = self.clients.get(provider)
+        if client is None:
+            if provider not in self.modules:
+                raise Exception(f"Unknown or unavailable provider: {provider}")
+            _, class_name = PROVIDERS[provider]
+            client = getattr(self.modules[provider], class_name)()
+            self.clients[provider] = client
+        return client
+
+    def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Route a decoded request to the provider method it names"""
+        provider = request.get("provider")
+        method = request.get("method")
+        if method not in ALLOWED_METHODS:
+            return {
+                "success": False,
+                "error": f"Method not allowed: {method}",
+                "timestamp": datetime.now().isoformat()
+            }
+
+        try:
+            client = self.get_client(provider)
+            handler = getattr(client, method, None)
+            if handler is None:
+                return {
+                    "success": False,
+                    "error": f"Provider '{provider}' does not support {method}",
+                    "timestamp": datetime.now().isoformat()
+                }
+            result = handler(*request.get("args", []), **request.get("kwargs", {}))
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
+
+        if not isinstance(result, dict):
+            result = {"success": True, "result": result}
+        return result
+
+    def handle_connection(self, conn: socket.socket) -> None:
+        """Serve NDJSON requests on one connection until the client closes it"""
+        with conn, conn.makefile('rb') as reader, conn.makefile('wb') as writer:
+            for line in reader:
+                line = line.strip()
+                if not line:
+                    continue
+
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    result = self.dispatch(request)
+                except (json.JSONDecodeError, AttributeError):
+                    result = {
+                        "success": False,
+                        "error": "Invalid JSON request",
+                        "timestamp": datetime.now().isoformat()
+                    }
+
+                if request_id is not None:
+                    result["id"] = request_id
+                writer.write((json.dumps(result) + "\n").encode('utf-8'))
+                writer.flush()
+
+    def serve(self, server: socket.socket) -> None:
+        """Accept connections on the shared listening socket forever"""
+        # Threads don't survive fork, so each worker runs its own config watcher
+        from ai_config_manager import config_manager
+        config_manager.start_watching()
+        while True:
+            try:
+                conn, _ = server.accept()
+            except InterruptedError:
+                continue
+            try:
+                self.handle_connection(conn)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            except Exception as e:
+                print(f"❌ Worker {os.getpid()} connection error: {e}", file=sys.stderr)
+
+class AIGateway:
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, workers: int = DEFAULT_WORKERS):
+        self.socket_path = socket_path
+        self.num_workers = max(1, workers)
+        # pid -> monotonic start time
+        self.worker_pids = {}
+        self.crash_times = deque()
+        self.fast_crashes = 0
+        self.gave_up = False
+        self.server = None
+        self.modules = {}
+        self.running = False
+
+    def _bind(self) -> socket.socket:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(128)
+        return server
+
+    def _spawn_worker(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Child: default signal handling, then serve until killed
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                GatewayWorker(self.modules).serve(self.server)
+            except BaseException as e:
+                print(f"❌ Worker {os.getpid()} failed: {e!r}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        self.worker_pids[pid] = time.monotonic()
+
+    def _shutdown(self, signum=None, frame=None) -> None:
+        self.running = False
+        for pid in list(self.worker_pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _restart_after_exit(self, pid: int, status: int, started: Optional[float]) -> None:
+        now = time.monotonic()
+        self.crash_times.append(now)
+        while self.crash_times and now - self.crash_times[0] > CRASH_WINDOW:
+            self.crash_times.popleft()
+        if len(self.crash_times) > MAX_CRASHES:
+            print(f"❌ {len(self.crash_times)} worker exits in {CRASH_WINDOW:g}s, shutting the gateway down", file=sys.stderr)
+            self.gave_up = True
+            self._shutdown()
+            return
+
+        if started is not None and now - started >= STABLE_SECONDS:
+            self.fast_crashes = 0
+        else:
+            self.fast_crashes += 1
+        # Exponential backoff so a worker failing at start-up can't become a fork loop
+        delay = min(RESTART_MAX_DELAY, RESTART_BASE_DELAY * (2 ** (self.fast_crashes - 1))) if self.fast_crashes else 0
+        print(f"⚠️ Worker {pid} exited ({status}), restarting in {delay:g}s", file=sys.stderr)
+        if delay:
+            time.sleep(delay)
+        if self.running:
+            self._spawn_worker()
+
+    def run(self) -> None:
+        """Pre-fork the workers and restart any that exit until shut down"""
+        self.modules = preload_modules()
+        self.server = self._bind()
+        self.running = True
+        signal.signal(signal.SIGTERM, self._shutdown)
+        signal.signal(signal.SIGINT, self._shutdown)
+
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+        print(f"✅ AI gateway listening on {self.socket_path} with {self.num_workers} workers", file=sys.stderr)
+
+        try:
+            while self.worker_pids:
+                try:
+                    pid, status = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                started = self.worker_pids.pop(pid, None)
+                if self.running:
+                    self._restart_after_exit(pid, status, started)
+        finally:
+            self.server.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+def call_gateway(provider: str, method: str, *args, socket_path: str = DEFAULT_SOCKET_PATH,
+                 timeout: Optional[float] = 120, **kwargs) -> Dict[str, Any]:
+    """Send one request to a running gateway and return its response"""
+    request = {"id": 1, "provider": provider, "method": method, "args": list(args), "kwargs": kwargs}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + "\n").encode('utf-8'))
+        with client.makefile('rb') as reader:
+            line = reader.readline()
+    if not line:
+        return {
+            "success": False,
+            "error": "Gateway closed the connection without a response",
+            "timestamp": datetime.now().isoformat()
+        }
+    result = json.loads(line)
+    result.pop("id", None)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory Garden pre-forked AI gateway")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path to listen on")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of pre-forked workers")
+    args = parser.parse_args()
+
+    gateway = AIGateway(args.socket, args.workers)
+    gateway.run()
+    if gateway.gave_up:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
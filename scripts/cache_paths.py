@@ -0,0 +1,9 @@
+"""
+Location of the on-disk caches shared by the AI scripts
+SQLite stores and temporary media files all live under one directory,
+overridable with AI_CACHE_DIR
+"""
+
+import os
+
+DEFAULT_CACHE_DIR = os.environ.get('AI_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache'))
@@ -2,6 +2,20 @@
 """
 Simple chat API script for Memory Garden with LM Studio
 Called directly by the Next.js API route for chat continuation
+
+Run with --worker to keep one warm process that reads newline-delimited
+JSON requests from stdin and writes one JSON response per line:
+
+    {"id": 1, "message": "...", "conversationHistory": [...], "testContext": {...}}
+
+Requests with "stream": true get {"type": "chunk"} lines followed by one
+{"type": "complete"} line, each carrying the request id.
+
+Requests with a "conversationId" keep their history server-side: send only
+the new message and the stored session supplies the earlier turns. Sending a
+non-empty conversationHistory with an id (re)seeds that session. In worker
+mode, turns that scroll out of the recent window are folded into a rolling
+summary in the background and sent in place of the old messages.
 """
 
 import sys
@@ -12,26 +26,170 @@ import os
 os.environ['SUPPRESS_DEBUG'] = 'true'
 
 from lmstudio_ai import LMStudioAITester
+from ai_config_manager import config_manager
+from session_store import session_store, normalize_history
+from conversation_summary import conversation_summarizer
+
+def completed_history(conversation_history: list) -> list:
+    """Normalized history without a trailing user turn that never got a reply"""
+    messages = normalize_history(conversation_history)
+    # Clients often post the history with the new message already appended;
+    # sessions only hold answered turns so record_turn can add this one whole
+    if messages and messages[-1]["role"] == "user":
+        messages.pop()
+    return messages
+
+def load_conversation(request: dict):
+    """Return (history, test_context, history_normalized, summary) for a request"""
+    conversation_history = request.get("conversationHistory") or []
+    test_context = request.get("testContext")
+    conversation_id = request.get("conversationId")
+    if not conversation_id:
+        return conversation_history, test_context, False, None
+
+    session = session_store.get(conversation_id)
+    history = completed_history(conversation_history)
+    # Clients that resend the full history each turn must not wipe the summary;
+    # only a missing session or a history that diverged from the stored one re-seeds
+    if session is None or (history and history != session["messages"]):
+        session = session_store.create(conversation_id, history, test_context)
+    if test_context is None:
+        test_context = session["test_context"]
+    # Messages already folded into the summary are not sent again
+    summarized_count = session.get("summarized_count") or 0
+    return session["messages"][summarized_count:], test_context, True, session.get("summary")
+
+def record_turn(request: dict, result: dict, test_context: dict = None) -> None:
+    """Append a finished turn to the request's session, if it has one"""
+    conversation_id = request.get("conversationId")
+    ai_response = result.get("ai_response") or result.get("content")
+    # Canned fallback replies would be replayed to the model as if it had said them
+    if conversation_id and ai_response and not result.get("fallback_mode"):
+        session_store.append(conversation_id, [
+            {"role": "user", "content": request["message"]},
+            {"role": "assistant", "content": ai_response}
+        ], test_context)
+
+def handle_request(ai_tester: LMStudioAITester, request: dict) -> dict:
+    """Run a single chat turn for a decoded worker request"""
+    message = request.get("message")
+    if not message:
+        return {
+            "success": False,
+            "error": "Missing argument: message is required"
+        }
+
+    conversation_history, test_context, history_normalized, summary = load_conversation(request)
+    result = ai_tester.continue_conversation(message, conversation_history, test_context, history_normalized, summary)
+    if result.get("success"):
+        record_turn(request, result, test_context)
+    if request.get("conversationId"):
+        result["conversationId"] = request["conversationId"]
+    return result
+
+class ChatService:
+    """Session-aware chat turns for the AI gateway (provider "chat")"""
+
+    def __init__(self):
+        self.ai_tester = LMStudioAITester()
+
+    def chat_turn(self, request: dict) -> dict:
+        """Run one turn from an /api/ai-chat request body"""
+        result = handle_request(self.ai_tester, request)
+        if result.get("success") and request.get("conversationId"):
+            # Gateway workers are long-lived, so the summary thread outlives the turn
+            conversation_summarizer.schedule(request["conversationId"])
+        return result
+
+def run_worker():
+    """Serve chat requests from stdin until EOF, one JSON object per line"""
+    protocol_out = sys.stdout
+    # Debug prints from the AI modules go to stderr so stdout stays pure NDJSON
+    sys.stdout = sys.stderr
+    # Pick up edits made through /api/ai-config without restarting the worker
+    config_manager.start_watching()
+
+    ai_tester = None
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            # Build the client lazily so a worker started before LM Studio
+            # can still recover once the server comes up
+            if ai_tester is None:
+                ai_tester = LMStudioAITester()
+            if request.get("stream") and request.get("message"):
+                conversation_history, test_context, history_normalized, summary = load_conversation(request)
+                for event in ai_tester.stream_conversation(
+                    request["message"],
+                    conversation_history,
+                    test_context,
+                    history_normalized,
+                    summary
+                ):
+                    if event["type"] == "complete":
+                        record_turn(request, event, test_context)
+                    event["id"] = request_id
+                    protocol_out.write(json.dumps(event) + "\n")
+                    protocol_out.flush()
+                if request.get("conversationId"):
+                    conversation_summarizer.schedule(request["conversationId"])
+                continue
+            result = handle_request(ai_tester, request)
+            if result.get("success") and request.get("conversationId"):
+                # Summarize after replying; only a long-lived worker keeps the thread alive
+                conversation_summarizer.schedule(request["conversationId"])
+        except json.JSONDecodeError:
+            result = {
+                "success": False,
+                "error": "Invalid JSON request"
+            }
+        except Exception as e:
+            result = {
+                "success": False,
+                "error": str(e)
+            }
+
+        if request_id is not None:
+            result["id"] = request_id
+        protocol_out.write(json.dumps(result) + "\n")
+        protocol_out.flush()
 
 def main():
+    if len(sys.argv) >= 2 and sys.argv[1] == '--worker':
+        run_worker()
+        return
+
     if len(sys.argv) < 4:
         print(json.dumps({
             "success": False,
             "error": "Missing arguments: message, conversationHistory, and testContext required"
         }))
         return
-    
+
     message = sys.argv[1]
     conversation_history_str = sys.argv[2]
     test_context_str = sys.argv[3]
-    
+    # Optional fourth argument: conversation id for a server-side session
+    conversation_id = sys.argv[4] if len(sys.argv) >= 5 and sys.argv[4] != 'null' else None
+
     try:
         conversation_history = json.loads(conversation_history_str) if conversation_history_str != 'null' else []
         test_context = json.loads(test_context_str) if test_context_str != 'null' else None
-        
+
         ai_tester = LMStudioAITester()
-        result = ai_tester.continue_conversation(message, conversation_history, test_context)
-        
+        result = handle_request(ai_tester, {
+            "message": message,
+            "conversationHistory": conversation_history,
+            "testContext": test_context,
+            "conversationId": conversation_id
+        })
+
         # Only print the JSON result, no debug output
         print(json.dumps(result))
     except Exception as e:
@@ -41,4 +199,4 @@ def main():
         }))
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,228 @@
+"""
+Per-provider circuit breakers for Memory Garden AI calls
+An open breaker rejects calls immediately so callers drop straight into their
+fallback response instead of waiting out a full request timeout
+"""
+
+import os
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"{name} is temporarily unavailable (circuit open)")
+        self.name = name
+
+class CallRefusedError(Exception):
+    """Raised by a guarded call that gave up before contacting its backend; not counted as a failure"""
+
+def _setting(name: str, key: str, default: str) -> float:
+    """Read AI_BREAKER_<NAME>_<KEY>, then AI_BREAKER_<KEY>, then the default"""
+    specific = os.environ.get(f"AI_BREAKER_{name.upper()}_{key}")
+    return float(specific if specific is not None else os.environ.get(f"AI_BREAKER_{key}", default))
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = None, error_rate_threshold: float = None,
+                 window_size: int = None, min_calls: int = None, slow_call_seconds: float = None,
+                 reset_timeout: float = None):
+        self.name = name
+        # Consecutive failures that open the breaker
+        self.failure_threshold = int(failure_threshold or _setting(name, "FAILURES", "5"))
+        # Failure ratio over the last window_size calls that opens the breaker
+        self.error_rate_threshold = error_rate_threshold or _setting(name, "ERROR_RATE", "0.5")
+        self.window_size = int(window_size or _setting(name, "WINDOW", "20"))
+        self.min_calls = int(min_calls or _setting(name, "MIN_CALLS", "10"))
+        # Successful calls slower than this still count as failures
+        self.slow_call_seconds = slow_call_seconds or _setting(name, "SLOW_CALL_SECONDS", "30")
+        # How long to stay open before letting a single trial call through
+        self.reset_timeout = reset_timeout or _setting(name, "RESET_SECONDS", "30")
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.outcomes = deque(maxlen=self.window_size)
+        self.half_open_in_flight = False
+        self.stats = {
+            "calls": 0,
+            "successes": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "times_opened": 0,
+            "ewma_latency": None,
+            "last_error": None
+        }
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Return True if a call may go ahead; counts a rejection otherwise"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.half_open_in_flight = False
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self.half_open_in_flight:
+                # Exactly one trial call decides whether to close again
+                self.half_open_in_flight = True
+                return True
+
+            self.stats["rejected"] += 1
+            return False
+
+    def is_open(self) -> bool:
+        """True while calls would be rejected; unlike allow_request() this never claims the trial call"""
+        with self._lock:
+            if self.state == OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == HALF_OPEN and self.half_open_in_flight
+
+    def _observe_latency(self, latency: float) -> None:
+        previous = self.stats["ewma_latency"]
+        self.stats["ewma_latency"] = latency if previous is None else 0.8 * previous + 0.2 * latency
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.half_open_in_flight = False
+        self.stats["times_opened"] += 1
+
+    def record_success(self, latency: float) -> None:
+        if latency > self.slow_call_seconds:
+            with self._lock:
+                self.stats["slow_calls"] += 1
+            self.record_failure(latency, f"slow call ({latency:.1f}s)")
+            return
+
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["successes"] += 1
+            self._observe_latency(latency)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.outcomes.clear()
+                self.half_open_in_flight = False
+
+    def release(self) -> None:
+        """Give back a trial call that ended without an outcome (e.g. an abandoned stream)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.half_open_in_flight = False
+
+    def record_failure(self, latency: float = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["failures"] += 1
+            self.stats["last_error"] = error
+            if latency is not None:
+                self._observe_latency(latency)
+            self.outcomes.append(False)
+            self.consecutive_failures += 1
+
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+
+            failures = self.outcomes.count(False)
+            error_rate = failures / len(self.outcomes)
+            if (self.consecutive_failures >= self.failure_threshold or
+                    (len(self.outcomes) >= self.min_calls and error_rate >= self.error_rate_threshold)):
+                self._open()
+
+    def call(self, func, *args, **kwargs):
+        """Run func through the breaker, raising CircuitOpenError when open"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except CallRefusedError:
+            # Nothing reached the backend, so there is no outcome to record
+            self.release()
+            raise
+        except Exception as e:
+            self.record_failure(time.monotonic() - start, str(e))
+            raise
+        except BaseException:
+            # Interrupted without a verdict; don't leave the trial call claimed
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """Async variant of call()"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name)
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except CallRefusedError:
+            self.release()
+            raise
+        except Exception as e:
+            self.record_failure(time.monotonic() - start, str(e))
+            raise
+        except BaseException:
+            # Cancellation (asyncio.CancelledError) lands here
+            self.release()
+            raise
+        self.record_success(time.monotonic() - start)
+        return result
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            window_failures = self.outcomes.count(False)
+            return {
+                "name": self.name,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "window_error_rate": window_failures / len(self.outcomes) if self.outcomes else 0.0,
+                **self.stats
+            }
+
+class CircuitBreakerRegistry:
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        """Return the breaker for a provider, creating it on first use"""
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(name, CircuitBreaker(name))
+        return breaker
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of every provider's breaker metrics"""
+        return {name: breaker.metrics() for name, breaker in list(self._breakers.items())}
+
+# Global breaker registry instance
+breakers = CircuitBreakerRegistry()
+
+def guarded(name: str):
+    """Decorate a provider call (sync or async) that raises on failure"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await breakers.get(name).acall(func, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return breakers.get(name).call(func, *args, **kwargs)
+        return wrapper
+    return decorator
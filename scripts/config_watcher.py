@@ -0,0 +1,121 @@
+"""
+Background file watcher for hot-reloading configuration files
+Uses Linux inotify through ctypes when available and falls back to polling
+the file's mtime and size everywhere else
+"""
+
+import os
+import sys
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+from typing import Callable, Optional
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+_EVENT_HEADER = struct.Struct("iIII")
+
+POLL_INTERVAL = float(os.environ.get('AI_CONFIG_POLL_INTERVAL', '1.0'))
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1  # noqa: B018 - raises AttributeError on libcs without inotify
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class FileWatcher:
+    def __init__(self, path: str, on_change: Callable[[], None], poll_interval: float = None):
+        self.path = os.path.abspath(path)
+        self.on_change = on_change
+        self.poll_interval = poll_interval or POLL_INTERVAL
+        self.mode = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> "FileWatcher":
+        """Start watching in a daemon thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"watch:{os.path.basename(self.path)}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _notify(self) -> None:
+        try:
+            self.on_change()
+        except Exception as e:
+            print(f"⚠️ Reload of {self.path} failed: {e}", file=sys.stderr)
+
+    def _run(self) -> None:
+        fd = self._open_inotify()
+        if fd is None:
+            self.mode = "polling"
+            self._poll()
+            return
+        self.mode = "inotify"
+        try:
+            self._watch_inotify(fd)
+        finally:
+            os.close(fd)
+
+    def _open_inotify(self) -> Optional[int]:
+        libc = _load_libc()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if fd < 0:
+            return None
+        # Watch the directory: an atomic rename replaces the file's inode
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _watch_inotify(self, fd: int) -> None:
+        name = os.path.basename(self.path).encode()
+        while not self._stop.is_set():
+            # Wake up regularly so stop() is honoured
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            changed = False
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                if data[offset:offset + length].rstrip(b"\0") == name:
+                    changed = True
+                offset += length
+            if changed:
+                self._notify()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except OSError:
+            return None
+
+    def _poll(self) -> None:
+        last = self._signature()
+        while not self._stop.wait(self.poll_interval):
+            current = self._signature()
+            if current != last:
+                last = current
+                self._notify()
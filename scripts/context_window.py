@@ -0,0 +1,97 @@
+"""
+Token-budgeted context windows for chat providers
+Packs the system prompt, story context and the most recent turns into a
+per-provider token budget instead of a fixed message count. Token counts
+come from tiktoken when it is installed (OpenAI) and from a calibrated
+character estimator otherwise; per-message counts are memoized, so packing
+a long session only pays for the messages that are new this turn.
+"""
+
+import os
+import re
+import math
+import functools
+from typing import Dict, Any, List, Iterable
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Context sizes used when AI_CONTEXT_TOKENS[_<PROVIDER>] is not set
+DEFAULT_BUDGETS = {
+    "lmstudio": 4096,
+    "ollama": 4096,
+    "google": 8192,
+    "openai": 4096,
+    "huggingface": 2048,
+}
+
+# Average characters per token for chat text; local Llama-style vocabularies
+# split English a little finer than OpenAI's and Gemini's
+CHARS_PER_TOKEN = {
+    "lmstudio": 3.6,
+    "ollama": 3.6,
+    "google": 4.0,
+    "openai": 4.0,
+    "huggingface": 3.6,
+}
+
+# Role markers and separators each message adds to the prompt
+MESSAGE_OVERHEAD = 4
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def context_budget(provider: str) -> int:
+    """Total prompt + reply tokens allowed for a provider"""
+    specific = os.environ.get(f"AI_CONTEXT_TOKENS_{provider.upper()}")
+    if specific:
+        return int(specific)
+    return int(os.environ.get('AI_CONTEXT_TOKENS', DEFAULT_BUDGETS.get(provider, 4096)))
+
+@functools.lru_cache(maxsize=4)
+def _encoding(provider: str):
+    if tiktoken is None or provider != "openai":
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+@functools.lru_cache(maxsize=16384)
+def count_tokens(text: str, provider: str) -> int:
+    """Token count of a text for a provider (memoized)"""
+    if not text:
+        return 0
+    encoding = _encoding(provider)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Punctuation-heavy text is never fewer tokens than its word/symbol pieces
+    by_chars = math.ceil(len(text) / CHARS_PER_TOKEN.get(provider, 4.0))
+    return max(by_chars, len(_PIECES.findall(text)))
+
+def count_message_tokens(content: str, provider: str) -> int:
+    return count_tokens(content, provider) + MESSAGE_OVERHEAD
+
+def fit_history(conversation_history: List[Dict[str, Any]], provider: str, fixed_texts: Iterable[str] = (),
+                reply_tokens: int = 0, budget: int = None) -> List[Dict[str, Any]]:
+    """Most recent history that fits beside the fixed prompt parts and the reply"""
+    if not conversation_history:
+        return []
+    remaining = (budget or context_budget(provider)) - reply_tokens
+    remaining -= sum(count_message_tokens(text, provider) for text in fixed_texts)
+
+    kept = 0
+    for msg in reversed(conversation_history):
+        cost = count_message_tokens(msg.get("content", "") or "", provider)
+        if cost > remaining:
+            break
+        remaining -= cost
+        kept += 1
+
+    window = conversation_history[len(conversation_history) - kept:]
+    # A window opening on an assistant turn would break user/assistant alternation
+    start = 0
+    while start < len(window) and window[start].get("role") == "assistant":
+        start += 1
+    return window[start:]
@@ -0,0 +1,128 @@
+"""
+Rolling summaries for long Memory Garden conversations
+Turns that fall out of the recent window are folded, one chunk at a time,
+into a running summary stored with the session. The summary is written by a
+cheap local model (LM Studio or Ollama) on a background thread, so the chat
+turn itself never waits for it and the prompt stays the same size however
+long the conversation runs.
+"""
+
+import os
+import sys
+import queue
+import functools
+import threading
+from typing import Dict, Any, List, Optional
+from session_store import session_store
+from circuit_breaker import breakers
+
+SUMMARY_PROMPT = """You keep a running summary of a conversation between a user and Sprout, a warm AI companion who helps people reflect on their memories.
+
+Update the summary with the new turns. Keep the people, places, feelings and facts the user shared, and anything Sprout promised or asked. Write plain prose in the third person, under {max_words} words. Reply with the updated summary only."""
+
+def summary_enabled() -> bool:
+    return os.environ.get('AI_CONVERSATION_SUMMARY', 'true').lower() == 'true'
+
+def format_turns(messages: List[Dict[str, str]]) -> str:
+    speakers = {"user": "User", "assistant": "Sprout"}
+    return "\n".join(f"{speakers.get(msg['role'], msg['role'])}: {msg['content']}" for msg in messages)
+
+def summary_system_text(summary: Optional[str]) -> str:
+    """System prompt addition carrying the summary of earlier turns"""
+    if not summary:
+        return ""
+    return f"\n\nSummary of the earlier conversation:\n{summary}"
+
+class ConversationSummarizer:
+    def __init__(self, provider: str = None, model: str = None):
+        self.provider = provider or os.environ.get('AI_SUMMARY_PROVIDER', 'lmstudio')
+        self.model = model or os.environ.get('AI_SUMMARY_MODEL')
+        # Messages always sent verbatim; older ones are summarized
+        self.keep_messages = int(os.environ.get('AI_SUMMARY_KEEP_MESSAGES', '12'))
+        # Messages folded into the summary per model call (kept even so chunks end on a reply)
+        self.chunk_messages = max(2, int(os.environ.get('AI_SUMMARY_CHUNK_MESSAGES', '8')) // 2 * 2)
+        self.max_words = int(os.environ.get('AI_SUMMARY_MAX_WORDS', '150'))
+        self._call = None
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _get_call(self):
+        if self._call is None:
+            if self.provider == 'ollama':
+                from deepseek_ai import OllamaAITester
+                client = OllamaAITester(self.model) if self.model else OllamaAITester()
+                request = OllamaAITester.call_ollama_api.__wrapped__
+            else:
+                from lmstudio_ai import LMStudioAITester
+                client = LMStudioAITester(self.model) if self.model else LMStudioAITester()
+                request = LMStudioAITester.call_lmstudio_api.__wrapped__
+            # Summaries are short; don't reserve a full chat reply
+            client.max_reply_tokens = self.max_words * 2
+            # Bypass the chat breaker: background summary failures get their own
+            # (AI_BREAKER_<PROVIDER>_SUMMARY_*) so they can't take chat offline
+            breaker = breakers.get(f"{self.provider}_summary")
+            self._call = functools.partial(breaker.call, request, client)
+        return self._call
+
+    def next_chunk(self, session: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        """Oldest unsummarized chunk outside the recent window, or None"""
+        start = session.get("summarized_count") or 0
+        if len(session["messages"]) - start - self.keep_messages < self.chunk_messages:
+            return None
+        return session["messages"][start:start + self.chunk_messages]
+
+    def summarize(self, summary: Optional[str], chunk: List[Dict[str, str]]) -> str:
+        """Fold one chunk of turns into the running summary"""
+        response = self._get_call()([
+            {"role": "system", "content": SUMMARY_PROMPT.format(max_words=self.max_words)},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none yet)'}\n\nNew turns:\n{format_turns(chunk)}\n\nUpdated summary:"}
+        ])
+        return response["content"].strip()
+
+    def schedule(self, conversation_id: str) -> None:
+        """Queue a conversation for background summarization if it has a chunk due"""
+        if not summary_enabled():
+            return
+        session = session_store.get(conversation_id)
+        if session is None or self.next_chunk(session) is None:
+            return
+        with self._lock:
+            if conversation_id in self._pending:
+                return
+            self._pending.add(conversation_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="conversation-summary", daemon=True)
+                self._thread.start()
+        self._queue.put(conversation_id)
+
+    def _run(self) -> None:
+        while True:
+            conversation_id = self._queue.get()
+            try:
+                self.catch_up(conversation_id)
+            except Exception as e:
+                # Left as is; the next turn schedules it again
+                print(f"⚠️ Conversation summary failed: {e}", file=sys.stderr)
+            finally:
+                with self._lock:
+                    self._pending.discard(conversation_id)
+
+    def catch_up(self, conversation_id: str) -> None:
+        """Summarize chunk by chunk until only the recent window is left"""
+        while True:
+            session = session_store.get(conversation_id)
+            if session is None:
+                return
+            chunk = self.next_chunk(session)
+            if chunk is None:
+                return
+            start = session.get("summarized_count") or 0
+            summary = self.summarize(session.get("summary"), chunk)
+            if not session_store.set_summary(conversation_id, summary, start + len(chunk), session):
+                # The session was reseeded while the model was writing
+                return
+
+# Global summarizer instance
+conversation_summarizer = ConversationSummarizer()
@@ -1,11 +1,17 @@
 import os
+import time
 import base64
 import json
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from datetime import datetime
 from dotenv import load_dotenv
 from ai_config_manager import config_manager
+from provider_health import health_registry
+from context_window import fit_history
+from prompt_layout import stable_system_prompt, story_text, ollama_cache_hints, STORY_OPENING_INSTRUCTIONS, STORY_CONTINUE_INSTRUCTIONS, OPEN_CONVERSATION_INSTRUCTIONS
+from circuit_breaker import breakers, guarded, CircuitOpenError, CallRefusedError
+from http_transport import get_session, get_async_client, httpx, ASYNC_HTTP_ERRORS
 
 # Load environment variables - try multiple paths
 from pathlib import Path
@@ -33,18 +39,20 @@ class OllamaAITester:
     def __init__(self, model: str = "llama3.2"):
         self.model = model
         self.base_url = "http://localhost:11434"
+        self.health_url = f"{self.base_url}/api/tags"
+        self.max_reply_tokens = 500
         print(f"Ollama client initialized with model: {self.model}")
         print(f"Base URL: {self.base_url}")
         
-        # Check if Ollama is running
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
+        # Check if Ollama is running (cached across instances by the health registry)
+        status = health_registry.check("ollama", self.health_url)
+        if status["alive"]:
+            if status["status_code"] == 200:
                 print("✅ Ollama is running and accessible")
             else:
                 print("⚠️ Ollama responded but with unexpected status")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Ollama is not running: {e}")
+        else:
+            print(f"❌ Ollama is not running: {status['error']}")
             print("Please install and start Ollama: https://ollama.ai")
             raise Exception("Ollama is not running. Please install and start Ollama first.")
     
@@ -54,13 +62,11 @@ class OllamaAITester:
         # Get personality prompt from configuration
         personality_prompt = config_manager.get_personality_prompt()
         
-        system_prompt = f"""{personality_prompt}
-
-You're having a natural conversation with someone who shared a story with you.
-
-Story: {test_title} - {test_description}
-
-Be genuinely curious, warm, and conversational. Ask natural questions and respond as a caring friend would. Avoid therapeutic jargon or structured responses."""
+        # Static instructions first so the backend can reuse their cached prefix
+        system_prompt = stable_system_prompt(
+            [personality_prompt, STORY_OPENING_INSTRUCTIONS],
+            [story_text(test_title, test_description)]
+        )
         
         messages = [
             {"role": "system", "content": system_prompt},
@@ -82,12 +88,13 @@ Be genuinely curious, warm, and conversational. Ask natural questions and respon
             print(f"Error in process_test_inputs: {e}")
             print(f"Error type: {type(e)}")
             # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("fallback")
+            fallback_template = config_manager.get_custom_response("fallback")
+            fallback_response = fallback_template
             if "{test_title}" in fallback_response:
                 fallback_response = fallback_response.replace("{test_title}", test_title)
             
             # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("fallback"):
+            if fallback_response == fallback_template:
                 fallback_response = f"""That's a really interesting story about {test_title}. 🌱
 
 What made you want to share this with me? I'd love to hear more about what this memory means to you."""
@@ -103,50 +110,146 @@ What made you want to share this with me? I'd love to hear more about what this
                 "fallback_mode": True
             }
     
+    def _chat_payload(self, messages: List[Dict]) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "stream": False,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": self.max_reply_tokens
+            }
+        }
+        # Keep the model loaded so its cached prompt prefix survives between turns
+        payload.update(ollama_cache_hints())
+        return payload
+    
+    def _handle_chat_response(self, response) -> Dict[str, Any]:
+        """Turn a requests/httpx response from Ollama into an assistant message"""
+        if response.status_code == 200:
+            response_data = response.json()
+            print(f"✅ Ollama response received successfully")
+            print(f"Response content: {response_data['message']['content']}")
+            
+            return {
+                "role": "assistant",
+                "content": response_data['message']['content']
+            }
+        else:
+            error_text = response.text if response.text else "No error details"
+            print(f"❌ Ollama API error: {response.status_code} - {error_text}")
+            raise Exception(f"Ollama API error: {response.status_code} - {error_text}")
+    
+    def _require_alive(self) -> None:
+        # The registry is refreshed by failed calls and background probes, so a
+        # backend that went down after construction is refused without a request.
+        # Refusals aren't breaker failures; the failed call that marked it dead was
+        if not health_registry.is_alive("ollama", self.health_url):
+            raise CallRefusedError("Ollama is not running. Please install and start Ollama first.")
+    
+    @guarded("ollama")
     def call_ollama_api(self, messages: List[Dict]) -> Dict[str, Any]:
         """Make API call to Ollama"""
         print(f"Making API call to Ollama with messages: {messages}")
+        self._require_alive()
         
         try:
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": 0.7,
-                    "num_predict": 500
-                }
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/api/chat",
-                json=payload,
+            url = f"{self.base_url}/api/chat"
+            response = get_session(url).post(
+                url,
+                json=self._chat_payload(messages),
                 timeout=60
             )
-            
-            if response.status_code == 200:
-                response_data = response.json()
-                print(f"✅ Ollama response received successfully")
-                print(f"Response content: {response_data['message']['content']}")
-                
-                return {
-                    "role": "assistant",
-                    "content": response_data['message']['content']
-                }
-            else:
-                error_text = response.text if response.text else "No error details"
-                print(f"❌ Ollama API error: {response.status_code} - {error_text}")
-                raise Exception(f"Ollama API error: {response.status_code} - {error_text}")
+            return self._handle_chat_response(response)
                 
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                health_registry.mark_dead("ollama", self.health_url, str(e))
             print(f"❌ Network error: {e}")
             raise Exception(f"Network error: {e}")
         except Exception as e:
             print(f"❌ General error: {e}")
             raise
     
-    def continue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> Dict[str, Any]:
-        """Continue an existing conversation with DeepSeek"""
+    @guarded("ollama")
+    async def acall_ollama_api(self, messages: List[Dict]) -> Dict[str, Any]:
+        """Async variant of call_ollama_api"""
+        print(f"Making async API call to Ollama with messages: {messages}")
+        self._require_alive()
+        
+        try:
+            url = f"{self.base_url}/api/chat"
+            response = await get_async_client(url).post(
+                url,
+                json=self._chat_payload(messages),
+                timeout=60
+            )
+            return self._handle_chat_response(response)
+                
+        except ASYNC_HTTP_ERRORS as e:
+            if isinstance(e, httpx.ConnectError):
+                health_registry.mark_dead("ollama", self.health_url, str(e))
+            print(f"❌ Network error: {e}")
+            raise Exception(f"Network error: {e}")
+    
+    def stream_ollama_api(self, messages: List[Dict]) -> Iterator[str]:
+        """Yield completion text from Ollama as tokens are generated (NDJSON)"""
+        payload = self._chat_payload(messages)
+        payload["stream"] = True
+        self._require_alive()
+        
+        breaker = breakers.get("ollama")
+        if not breaker.allow_request():
+            raise CircuitOpenError("ollama")
+        start = time.monotonic()
+        recorded = False
+        
+        try:
+            url = f"{self.base_url}/api/chat"
+            with get_session(url).post(url, json=payload, stream=True, timeout=60) as response:
+                if response.status_code != 200:
+                    error_text = response.text if response.text else "No error details"
+                    raise Exception(f"Ollama API error: {response.status_code} - {error_text}")
+                
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise Exception(f"Ollama API error: {chunk['error']}")
+                    content = chunk.get("message", {}).get("content")
+                    if content:
+                        if not recorded:
+                            # Streams are judged on time to first token
+                            breaker.record_success(time.monotonic() - start)
+                            recorded = True
+                        yield content
+                    if chunk.get("done"):
+                        break
+                
+        except requests.exceptions.RequestException as e:
+            if not recorded:
+                breaker.record_failure(time.monotonic() - start, str(e))
+                recorded = True
+            if isinstance(e, requests.exceptions.ConnectionError):
+                health_registry.mark_dead("ollama", self.health_url, str(e))
+            raise Exception(f"Network error: {e}")
+        except Exception as e:
+            if not recorded:
+                breaker.record_failure(time.monotonic() - start, str(e))
+                recorded = True
+            raise
+        else:
+            if not recorded:
+                breaker.record_success(time.monotonic() - start)
+                recorded = True
+        finally:
+            if not recorded:
+                # Closed before the first chunk: no verdict, so free the trial call
+                breaker.release()
+    
+    def build_conversation_messages(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> List[Dict]:
+        """Build the system prompt, history and new user message for a chat turn"""
         
         messages = []
         
@@ -155,26 +258,21 @@ What made you want to share this with me? I'd love to hear more about what this
         
         # Add system prompt with test context if available
         if test_context:
-            system_prompt = f"""{personality_prompt}
-
-You're continuing a natural conversation with someone who shared a story with you.
-
-Story: {test_context.get('test_title', 'N/A')} - {test_context.get('test_description', 'N/A')}
-
-Be genuinely curious, warm, and conversational. Respond naturally as a caring friend would."""
+            system_prompt = stable_system_prompt(
+                [personality_prompt, STORY_CONTINUE_INSTRUCTIONS],
+                [story_text(test_context.get('test_title', 'N/A'), test_context.get('test_description', 'N/A'))]
+            )
         else:
-            system_prompt = f"""{personality_prompt}
-
-You're having a natural conversation. Be genuinely curious and warm. Respond as a caring friend would."""
+            system_prompt = stable_system_prompt([personality_prompt, OPEN_CONVERSATION_INSTRUCTIONS])
         
         messages.append({
             "role": "system",
             "content": system_prompt
         })
         
-        # Add conversation history
+        # Add the most recent history that fits the model's context budget
         if conversation_history:
-            for msg in conversation_history:
+            for msg in fit_history(conversation_history, "ollama", [system_prompt, user_message], self.max_reply_tokens):
                 messages.append({
                     "role": msg.get("role", "user"),
                     "content": msg.get("content", "")
@@ -186,6 +284,39 @@ You're having a natural conversation. Be genuinely curious and warm. Respond as
             "content": user_message
         })
         
+        return messages
+    
+    def _conversation_fallback(self, user_message: str, test_context: Dict = None) -> Dict[str, Any]:
+        """Configured reflection response used when Ollama can't answer"""
+        # Get custom fallback response from configuration
+        fallback_template = config_manager.get_custom_response("reflection")
+        fallback_response = fallback_template
+        if "{user_message}" in fallback_response:
+            fallback_response = fallback_response.replace("{user_message}", user_message)
+        
+        # Add personalized touch if response is too generic
+        if fallback_response == fallback_template:
+            # Include context if available
+            context_reference = ""
+            if test_context and test_context.get('test_title'):
+                context_reference = f" I remember you shared about '{test_context.get('test_title')}' earlier. "
+            
+            fallback_response = f"""That's really interesting{context_reference}
+
+What's on your mind about that? I'm curious to hear more."""
+        
+        return {
+            "success": True,  # Mark as success to show the fallback response
+            "ai_response": fallback_response,
+            "timestamp": datetime.now().isoformat(),
+            "fallback_mode": True
+        }
+    
+    def continue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> Dict[str, Any]:
+        """Continue an existing conversation with DeepSeek"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context)
+        
         try:
             response = self.call_ollama_api(messages)
             return {
@@ -196,28 +327,45 @@ You're having a natural conversation. Be genuinely curious and warm. Respond as
         except Exception as e:
             print(f"Error in continue_conversation: {e}")
             print(f"Error type: {type(e)}")
-            # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("reflection")
-            if "{user_message}" in fallback_response:
-                fallback_response = fallback_response.replace("{user_message}", user_message)
-            
-            # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("reflection"):
-                # Include context if available
-                context_reference = ""
-                if test_context and test_context.get('test_title'):
-                    context_reference = f" I remember you shared about '{test_context.get('test_title')}' earlier. "
-                
-                fallback_response = f"""That's really interesting{context_reference}
-
-What's on your mind about that? I'm curious to hear more."""
-            
+            return self._conversation_fallback(user_message, test_context)
+    
+    async def acontinue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context)
+        
+        try:
+            response = await self.acall_ollama_api(messages)
             return {
-                "success": True,  # Mark as success to show the fallback response
-                "ai_response": fallback_response,
-                "timestamp": datetime.now().isoformat(),
-                "fallback_mode": True
+                "success": True,
+                "ai_response": response.get("content", ""),
+                "timestamp": datetime.now().isoformat()
             }
+        except Exception as e:
+            print(f"Error in acontinue_conversation: {e}")
+            return self._conversation_fallback(user_message, test_context)
+    
+    def stream_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> Iterator[Dict[str, Any]]:
+        """Continue a conversation, yielding {"type": "chunk"} events then one {"type": "complete"}"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context)
+        
+        full_response = ""
+        try:
+            for content in self.stream_ollama_api(messages):
+                full_response += content
+                yield {"type": "chunk", "content": content}
+        except Exception as e:
+            print(f"Error in stream_conversation: {e}")
+            if full_response:
+                # Part of the answer is already on screen; don't append a canned reply
+                yield {"type": "error", "error": str(e)}
+                return
+            fallback = self._conversation_fallback(user_message, test_context)
+            yield {"type": "complete", "content": fallback["ai_response"], "fallback_mode": True}
+            return
+        
+        yield {"type": "complete", "content": full_response}
 
 def process_memory_garden_test(test_title: str, test_description: str, api_key: str = None) -> Dict[str, Any]:
     """Main function to process Memory Garden test inputs"""
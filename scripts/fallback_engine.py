@@ -0,0 +1,103 @@
+"""
+Keyword-automaton fallback replies for cloud providers
+Rules come from the "fallback_rules" section of ai_config.json (per provider
+profile) and are compiled into one Aho-Corasick automaton, so a prompt is
+matched in a single pass regardless of how many keywords are configured.
+Keywords match as case-insensitive substrings and the earliest rule wins.
+"""
+
+import threading
+from typing import Dict, Any, List, Optional
+from ai_config_manager import config_manager, DEFAULT_FALLBACK_RULES
+
+class FallbackEngine:
+    def __init__(self, rules: List[Dict[str, Any]], default: str):
+        # An explicit "priority" (lower wins) overrides list order
+        ordered = sorted(enumerate(rules), key=lambda item: (item[1].get("priority", item[0]), item[0]))
+        self.responses = [rule["response"] for _, rule in ordered]
+        self.default = default
+        self._no_match = len(self.responses)
+        self._build([[keyword.lower() for keyword in rule.get("keywords", []) if keyword] for _, rule in ordered])
+
+    def _build(self, keyword_sets: List[List[str]]) -> None:
+        # Trie of every keyword; best[state] is the highest-priority rule it completes
+        goto = [{}]
+        best = [self._no_match]
+        for rule_index, keywords in enumerate(keyword_sets):
+            for keyword in keywords:
+                state = 0
+                for char in keyword:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][char] = next_state
+                        goto.append({})
+                        best.append(self._no_match)
+                    state = next_state
+                best[state] = min(best[state], rule_index)
+
+        # Breadth-first failure links, folding each state's fail target into
+        # both its output and its transitions to get a full DFA over the alphabet
+        fail = [0] * len(goto)
+        delta = [dict(goto[0])]
+        delta.extend({} for _ in range(len(goto) - 1))
+        queue = list(goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            best[state] = min(best[state], best[fail[state]])
+            transitions = dict(delta[fail[state]])
+            for char, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(char, 0)
+                transitions[char] = next_state
+                queue.append(next_state)
+            delta[state] = transitions
+        self._delta = delta
+        self._best = best
+
+    def match_index(self, text: str) -> Optional[int]:
+        """Index of the winning rule for a text, or None"""
+        delta = self._delta
+        best_of = self._best
+        state = 0
+        best = self._no_match
+        for char in text.lower():
+            state = delta[state].get(char, 0)
+            if best_of[state] < best:
+                best = best_of[state]
+                if best == 0:
+                    break
+        return best if best < self._no_match else None
+
+    def match(self, text: str) -> str:
+        """Canned reply for a text"""
+        index = self.match_index(text)
+        return self.default if index is None else self.responses[index]
+
+    def match_batch(self, texts: List[str]) -> List[str]:
+        """Canned replies for many texts at once"""
+        return [self.match(text) for text in texts]
+
+class FallbackEngineRegistry:
+    def __init__(self):
+        self._engines = {}
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    def get(self, profile: str) -> FallbackEngine:
+        """Engine for a provider profile, recompiled only when the config changes"""
+        snapshot = config_manager.snapshot
+        if snapshot.fingerprint != self._fingerprint:
+            with self._lock:
+                self._engines = {}
+                self._fingerprint = snapshot.fingerprint
+        engine = self._engines.get(profile)
+        if engine is None:
+            rules = config_manager.config.get("fallback_rules", {}).get(profile) or DEFAULT_FALLBACK_RULES[profile]
+            engine = FallbackEngine(rules.get("rules", []), rules.get("default", ""))
+            self._engines[profile] = engine
+        return engine
+
+# Global fallback engine registry
+fallback_engines = FallbackEngineRegistry()
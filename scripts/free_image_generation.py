@@ -10,6 +10,7 @@ import requests
 import base64
 from datetime import datetime
 from typing import Dict, Any
+from http_transport import get_session, get_async_client
 
 class FreeImageGenerator:
     def __init__(self):
@@ -24,41 +25,58 @@ class FreeImageGenerator:
         else:
             self.headers = {"Content-Type": "application/json"}
 
+    def _image_payload(self, prompt: str) -> Dict[str, Any]:
+        return {
+            "inputs": prompt,
+            "parameters": {
+                "num_inference_steps": 20,
+                "guidance_scale": 7.5,
+                "width": 1024,
+                "height": 1024
+            }
+        }
+
+    def _image_result(self, response, prompt: str, model: str) -> Dict[str, Any]:
+        """Turn a requests/httpx response into a result dict"""
+        if response.status_code == 200:
+            # Hugging Face returns image bytes
+            image_data = base64.b64encode(response.content).decode('utf-8')
+            
+            return {
+                "success": True,
+                "image_data": image_data,
+                "text_response": f"Generated realistic image: {prompt[:50]}...",
+                "prompt": prompt,
+                "model": model,
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return {
+                "success": False,
+                "error": f"Hugging Face API request failed: {response.status_code} - {response.text}",
+                "timestamp": datetime.now().isoformat()
+            }
+
     def generate_image(self, prompt: str, model: str = "stabilityai/stable-diffusion-xl-base-1.0") -> Dict[str, Any]:
         """Generate a single image using Hugging Face API"""
         try:
             url = f"{self.base_url}/{model}"
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "num_inference_steps": 20,
-                    "guidance_scale": 7.5,
-                    "width": 1024,
-                    "height": 1024
-                }
-            }
-            
-            response = requests.post(url, headers=self.headers, json=payload, timeout=60)
-            
-            if response.status_code == 200:
-                # Hugging Face returns image bytes
-                image_data = base64.b64encode(response.content).decode('utf-8')
+            response = get_session(url).post(url, headers=self.headers, json=self._image_payload(prompt), timeout=60)
+            return self._image_result(response, prompt, model)
                 
-                return {
-                    "success": True,
-                    "image_data": image_data,
-                    "text_response": f"Generated realistic image: {prompt[:50]}...",
-                    "prompt": prompt,
-                    "model": model,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"Hugging Face API request failed: {response.status_code} - {response.text}",
-                    "timestamp": datetime.now().isoformat()
-                }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Image generation failed: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+
+    async def agenerate_image(self, prompt: str, model: str = "stabilityai/stable-diffusion-xl-base-1.0") -> Dict[str, Any]:
+        """Async variant of generate_image"""
+        try:
+            url = f"{self.base_url}/{model}"
+            response = await get_async_client(url).post(url, headers=self.headers, json=self._image_payload(prompt), timeout=60)
+            return self._image_result(response, prompt, model)
                 
         except Exception as e:
             return {
@@ -10,6 +10,7 @@ import requests
 import base64
 from datetime import datetime
 from typing import Dict, Any, Optional
+from http_transport import get_session, get_async_client, ASYNC_HTTP_ERRORS
 
 class GetImgAIGenerator:
     def __init__(self):
@@ -23,6 +24,39 @@ class GetImgAIGenerator:
             "Content-Type": "application/json"
         }
 
+    def _image_result(self, result: Dict[str, Any], prompt: str, model: str) -> Dict[str, Any]:
+        if 'image' in result:
+            # GetImg returns base64 encoded image
+            image_data = result['image']
+            
+            return {
+                "success": True,
+                "image_data": image_data,
+                "text_response": f"Generated realistic image: {prompt[:50]}...",
+                "prompt": prompt,
+                "model": model,
+                "timestamp": datetime.now().isoformat()
+            }
+        else:
+            return {
+                "success": False,
+                "error": "No image data received from GetImg API",
+                "timestamp": datetime.now().isoformat()
+            }
+
+    def _request_error(self, error_msg: str) -> Dict[str, Any]:
+        if "402" in error_msg or "quota_exceeded" in error_msg:
+            return {
+                "success": False,
+                "error": "GetImg API quota exceeded. Please add credits to your account.",
+                "timestamp": datetime.now().isoformat()
+            }
+        return {
+            "success": False,
+            "error": f"GetImg API request failed: {error_msg}",
+            "timestamp": datetime.now().isoformat()
+        }
+
     def generate_image(self, prompt: str, model: str = "stable-diffusion-xl", width: int = 1024, height: int = 1024) -> Dict[str, Any]:
         """Generate a single image using GetImg API"""
         try:
@@ -34,43 +68,38 @@ class GetImgAIGenerator:
                 "height": height
             }
             
-            response = requests.post(url, headers=self.headers, json=payload, timeout=60)
+            response = get_session(url).post(url, headers=self.headers, json=payload, timeout=60)
             response.raise_for_status()
             
-            result = response.json()
-            
-            if 'image' in result:
-                # GetImg returns base64 encoded image
-                image_data = result['image']
-                
-                return {
-                    "success": True,
-                    "image_data": image_data,
-                    "text_response": f"Generated realistic image: {prompt[:50]}...",
-                    "prompt": prompt,
-                    "model": model,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": "No image data received from GetImg API",
-                    "timestamp": datetime.now().isoformat()
-                }
+            return self._image_result(response.json(), prompt, model)
                 
         except requests.exceptions.RequestException as e:
-            error_msg = str(e)
-            if "402" in error_msg or "quota_exceeded" in error_msg:
-                return {
-                    "success": False,
-                    "error": "GetImg API quota exceeded. Please add credits to your account.",
-                    "timestamp": datetime.now().isoformat()
-                }
+            return self._request_error(str(e))
+        except Exception as e:
             return {
                 "success": False,
-                "error": f"GetImg API request failed: {error_msg}",
+                "error": f"Image generation failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
+
+    async def agenerate_image(self, prompt: str, model: str = "stable-diffusion-xl", width: int = 1024, height: int = 1024) -> Dict[str, Any]:
+        """Async variant of generate_image"""
+        try:
+            url = f"{self.base_url}/{model}/text-to-image"
+            
+            payload = {
+                "prompt": prompt,
+                "width": width,
+                "height": height
+            }
+            
+            response = await get_async_client(url).post(url, headers=self.headers, json=payload, timeout=60)
+            response.raise_for_status()
+            
+            return self._image_result(response.json(), prompt, model)
+                
+        except ASYNC_HTTP_ERRORS as e:
+            return self._request_error(str(e))
         except Exception as e:
             return {
                 "success": False,
@@ -1,13 +1,21 @@
 import os
 import json
+import time
 from datetime import datetime
 from typing import Dict, Any, List
 from dotenv import load_dotenv
 from google import genai
+from response_cache import response_cache, make_key, cache_enabled
+from fallback_engine import fallback_engines
+from circuit_breaker import breakers, CircuitOpenError
+from context_window import fit_history
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
+# Sprout persona for website help chats (also part of the nav chat cache key)
+WEBSITE_SYSTEM_PROMPT = "You are Sprout, a kind Memory Garden helper. Use simple words and easy language. Keep responses short (4-5 lines max), warm, and friendly. ALWAYS end with a guiding question to help users explore their memories deeper."
+
 class GoogleAI:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_AI_API_KEY')
@@ -34,12 +42,23 @@ class GoogleAI:
         if context:
             full_prompt = f"{context}\n\n{prompt}"
         
+        # Skip the network entirely while Google AI is known to be failing
+        breaker = breakers.get("google")
+        if not breaker.allow_request():
+            return {
+                "success": False,
+                "error": str(CircuitOpenError("google")),
+                "timestamp": datetime.now().isoformat()
+            }
+        start = time.monotonic()
+        
         try:
             # Use the new Google GenAI SDK
             response = self.client.models.generate_content(
                 model="gemini-2.5-flash",
                 contents=full_prompt
             )
+            breaker.record_success(time.monotonic() - start)
             
             return {
                 "success": True,
@@ -49,66 +68,82 @@ class GoogleAI:
             }
                 
         except Exception as e:
+            breaker.record_failure(time.monotonic() - start, str(e))
             return {
                 "success": False,
                 "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
     
-    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
-        """Provide a fallback response when Google AI is unavailable"""
-        prompt_lower = prompt.lower()
-        
-        if "hello" in prompt_lower or "hi" in prompt_lower:
-            return {
-                "success": True,
-                "response": "Hi! 🌱 Ready to look at your memory garden? What memory would you like to plant today?",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "memory" in prompt_lower or "garden" in prompt_lower:
-            return {
-                "success": True,
-                "response": "I like helping with memories! What special moment do you want to remember today?",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "help" in prompt_lower:
+    async def acall_google_ai_api(self, prompt: str, context: str = None) -> Dict[str, Any]:
+        """Async variant of call_google_ai_api using the SDK's aio client"""
+        if not self.api_key or not self.client:
             return {
-                "success": True,
-                "response": "I'm here to help! What kind of memory are you thinking about planting?",
-                "model": "fallback",
+                "success": False,
+                "error": "Google AI API key not configured",
                 "timestamp": datetime.now().isoformat()
             }
-        elif "sunset" in prompt_lower or "walk" in prompt_lower:
+        
+        full_prompt = prompt
+        if context:
+            full_prompt = f"{context}\n\n{prompt}"
+        
+        breaker = breakers.get("google")
+        if not breaker.allow_request():
             return {
-                "success": True,
-                "response": "That sounds nice! 🌅 What made that time special for you?",
-                "model": "fallback",
+                "success": False,
+                "error": str(CircuitOpenError("google")),
                 "timestamp": datetime.now().isoformat()
             }
-        elif "reflection" in prompt_lower:
+        start = time.monotonic()
+        
+        try:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=full_prompt
+            )
+            breaker.record_success(time.monotonic() - start)
+            
             return {
                 "success": True,
-                "response": "Thinking about things is good! What did this memory show you about yourself?",
-                "model": "fallback",
+                "response": response.text,
+                "model": "gemini-2.5-flash",
                 "timestamp": datetime.now().isoformat()
             }
-        else:
+                
+        except Exception as e:
+            breaker.record_failure(time.monotonic() - start, str(e))
             return {
-                "success": True,
-                "response": "Hi! I'm here to help with your memory garden. What memory would you like to explore?",
-                "model": "fallback",
+                "success": False,
+                "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
     
-    def process_memory_garden_test(self, test_title: str, test_description: str) -> Dict[str, Any]:
-        """Process a memory garden test using Google AI"""
+    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
+        """Provide a fallback response when Google AI is unavailable"""
+        # Rules live in ai_config.json ("fallback_rules") and match in one pass
+        return {
+            "success": True,
+            "response": fallback_engines.get("google").match(prompt),
+            "model": "fallback",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def process_memory_garden_test(self, test_title: str, test_description: str, fresh: bool = False) -> Dict[str, Any]:
+        """Process a memory garden test using Google AI; fresh=True skips the response cache"""
         system_context = "You are a kind friend helping with the Memory Garden. Use simple words and easy language. Keep responses short (4-5 lines max), warm, and friendly. ALWAYS end with a guiding question to help them explore their memory deeper."
         
         prompt = f"Talk like a kind friend about this memory:\n\nTitle: {test_title}\nDescription: {test_description}\n\nUse simple words, keep it short (4-5 lines), be warm and friendly. IMPORTANT: Always end with a guiding question that starts with 'What' or 'How' to help them think about this memory more."
         
-        result = self.call_google_ai_api(prompt, system_context)
+        use_cache = cache_enabled() and not fresh
+        cache_key = make_key("google", "gemini-2.5-flash", [system_context, prompt])
+        cached = response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            result = {"success": True, "response": cached}
+        else:
+            result = self.call_google_ai_api(prompt, system_context)
+            if use_cache and result["success"]:
+                response_cache.put(cache_key, result["response"])
         
         if result["success"]:
             return {
@@ -116,7 +151,8 @@ class GoogleAI:
                 "reflection": result["response"],
                 "test_title": test_title,
                 "test_description": test_description,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "cached": cached is not None
             }
         else:
             # Use fallback response when Google AI fails
@@ -130,17 +166,18 @@ class GoogleAI:
                 "note": "Google AI unavailable, using fallback response"
             }
     
-    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Continue a conversation with context awareness"""
+    def build_conversation_prompt(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> str:
+        """Build the single-string prompt Gemini receives for a chat turn"""
         # Build context-aware system message
         if context and context.get('website_name') == 'Memory Garden':
-            system_context = "You are Sprout, a kind Memory Garden helper. Use simple words and easy language. Keep responses short (4-5 lines max), warm, and friendly. ALWAYS end with a guiding question to help users explore their memories deeper."
+            system_context = WEBSITE_SYSTEM_PROMPT
         else:
             system_context = "You are a kind friend helping with the Memory Garden. Use simple words and easy language. Keep responses short (4-5 lines max), warm, and friendly. ALWAYS end with a guiding question to help them think about their memories more."
         
         # Build conversation context
         conversation_text = ""
-        for msg in conversation_history[-5:]:  # Last 5 messages to stay within limits
+        # Most recent messages that fit the model's context budget
+        for msg in fit_history(conversation_history, "google", [system_context, message]):
             if msg.get('role') in ['user', 'assistant']:
                 role = "User" if msg['role'] == 'user' else "Assistant"
                 conversation_text += f"{role}: {msg['content']}\n"
@@ -150,8 +187,9 @@ class GoogleAI:
         else:
             full_prompt = f"{system_context}\n\nUser: {message}\n\nTalk like a kind friend (4-5 lines max, use simple words). IMPORTANT: Always end with a guiding question that starts with 'What' or 'How'."
         
-        result = self.call_google_ai_api(full_prompt)
-        
+        return full_prompt
+    
+    def _conversation_result(self, message: str, result: Dict[str, Any]) -> Dict[str, Any]:
         if result["success"]:
             return {
                 "success": True,
@@ -169,6 +207,18 @@ class GoogleAI:
                 "timestamp": datetime.now().isoformat(),
                 "note": "Google AI unavailable, using fallback response"
             }
+    
+    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Continue a conversation with context awareness"""
+        full_prompt = self.build_conversation_prompt(message, conversation_history, context)
+        result = self.call_google_ai_api(full_prompt)
+        return self._conversation_result(message, result)
+    
+    async def acontinue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        full_prompt = self.build_conversation_prompt(message, conversation_history, context)
+        result = await self.acall_google_ai_api(full_prompt)
+        return self._conversation_result(message, result)
 
 def main():
     """Test the Google AI integration"""
@@ -21,6 +21,55 @@ class GoogleAIImageGeneration:
             os.environ['GEMINI_API_KEY'] = self.api_key
             self.client = genai.Client()
     
+    def _image_result(self, response, prompt: str, output_path: str = None) -> Dict[str, Any]:
+        """Extract image data from a generate_content response and optionally save it"""
+        # Extract image data from response
+        image_data = None
+        text_response = ""
+        
+        for part in response.candidates[0].content.parts:
+            if hasattr(part, 'text') and part.text:
+                text_response = part.text
+            elif hasattr(part, 'inlineData') and part.inlineData:
+                image_data = part.inlineData.data
+            elif hasattr(part, 'fileData') and part.fileData:
+                # Alternative way to access image data
+                image_data = part.fileData.data
+            elif hasattr(part, 'inline_data') and part.inline_data:
+                # Another way to access image data (from dict)
+                if isinstance(part.inline_data, dict):
+                    image_data = part.inline_data.get('data')
+                else:
+                    image_data = part.inline_data.data
+        
+        if not image_data:
+            return {
+                "success": False,
+                "error": "No image data received from API",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        # Save image if output path is provided
+        if output_path:
+            try:
+                with open(output_path, 'wb') as f:
+                    f.write(base64.b64decode(image_data))
+            except Exception as e:
+                return {
+                    "success": False,
+                    "error": f"Failed to save image: {str(e)}",
+                    "timestamp": datetime.now().isoformat()
+                }
+        
+        return {
+            "success": True,
+            "image_data": image_data,
+            "text_response": text_response,
+            "output_path": output_path,
+            "prompt": prompt,
+            "timestamp": datetime.now().isoformat()
+        }
+    
     def generate_image(self, prompt: str, output_path: str = None) -> Dict[str, Any]:
         """Generate an image using Google AI Studio's Imagen 4 model"""
         if not self.api_key or not self.client:
@@ -39,53 +88,33 @@ class GoogleAIImageGeneration:
                     "responseModalities": ["TEXT", "IMAGE"]
                 }
             )
-            
-            # Extract image data from response
-            image_data = None
-            text_response = ""
-            
-            for part in response.candidates[0].content.parts:
-                if hasattr(part, 'text') and part.text:
-                    text_response = part.text
-                elif hasattr(part, 'inlineData') and part.inlineData:
-                    image_data = part.inlineData.data
-                elif hasattr(part, 'fileData') and part.fileData:
-                    # Alternative way to access image data
-                    image_data = part.fileData.data
-                elif hasattr(part, 'inline_data') and part.inline_data:
-                    # Another way to access image data (from dict)
-                    if isinstance(part.inline_data, dict):
-                        image_data = part.inline_data.get('data')
-                    else:
-                        image_data = part.inline_data.data
-            
-            if not image_data:
-                return {
-                    "success": False,
-                    "error": "No image data received from API",
-                    "timestamp": datetime.now().isoformat()
-                }
-            
-            # Save image if output path is provided
-            if output_path:
-                try:
-                    with open(output_path, 'wb') as f:
-                        f.write(base64.b64decode(image_data))
-                except Exception as e:
-                    return {
-                        "success": False,
-                        "error": f"Failed to save image: {str(e)}",
-                        "timestamp": datetime.now().isoformat()
-                    }
-            
+            return self._image_result(response, prompt, output_path)
+                
+        except Exception as e:
             return {
-                "success": True,
-                "image_data": image_data,
-                "text_response": text_response,
-                "output_path": output_path,
-                "prompt": prompt,
+                "success": False,
+                "error": f"Image generation failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
+    
+    async def agenerate_image(self, prompt: str, output_path: str = None) -> Dict[str, Any]:
+        """Async variant of generate_image"""
+        if not self.api_key or not self.client:
+            return {
+                "success": False,
+                "error": "Google AI API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        try:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-2.0-flash-exp-image-generation",
+                contents=prompt,
+                config={
+                    "responseModalities": ["TEXT", "IMAGE"]
+                }
+            )
+            return self._image_result(response, prompt, output_path)
                 
         except Exception as e:
             return {
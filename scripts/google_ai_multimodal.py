@@ -1,14 +1,28 @@
 import os
+import sys
 import json
-import base64
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Tuple, Union, Iterator, AsyncIterator
 from dotenv import load_dotenv
 from google import genai
+from media_cache import media_cache, media_cache_enabled
+from image_preprocess import submit_prepare, detect_mime
+from video_keyframes import reduce_video, video_mode
+from media_upload import iter_base64_file, generate_with_inline_media, generate_with_parts, GeminiFileUploader, INLINE_MAX_BYTES, media_deadline
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
+# Bump when the media description prompt changes so cached descriptions are not reused
+MEMORY_PROMPT_VERSION = "2"
+
+# Items analysed at once by the batch API, and the seconds each one may take
+BATCH_WORKERS = int(os.environ.get('AI_MEDIA_BATCH_WORKERS', '4'))
+BATCH_ITEM_TIMEOUT = float(os.environ.get('AI_MEDIA_ITEM_TIMEOUT', '120'))
+
 class GoogleAIMultimodal:
     def __init__(self):
         self.api_key = os.getenv('GOOGLE_AI_API_KEY')
@@ -20,23 +34,59 @@ class GoogleAIMultimodal:
             # Set the API key as environment variable for the client
             os.environ['GEMINI_API_KEY'] = self.api_key
             self.client = genai.Client()
+        self.uploader = GeminiFileUploader(self.api_key) if self.api_key else None
     
     def encode_image_to_base64(self, image_path: str) -> str:
         """Encode an image file to base64 string"""
         try:
-            with open(image_path, "rb") as image_file:
-                return base64.b64encode(image_file.read()).decode('utf-8')
+            return b"".join(iter_base64_file(image_path)).decode('utf-8')
         except Exception as e:
             raise Exception(f"Error encoding image: {str(e)}")
     
     def encode_video_to_base64(self, video_path: str) -> str:
         """Encode a video file to base64 string"""
         try:
-            with open(video_path, "rb") as video_file:
-                return base64.b64encode(video_file.read()).decode('utf-8')
+            return b"".join(iter_base64_file(video_path)).decode('utf-8')
         except Exception as e:
             raise Exception(f"Error encoding video: {str(e)}")
     
+    def _generate_from_image(self, image_path: str, prompt: str) -> str:
+        """Downscale and re-encode an image on the preprocessing pool, then analyze it"""
+        prepared = submit_prepare(image_path).result()
+        try:
+            return self._generate_from_media(prepared.path, prepared.mime_type, prompt)
+        finally:
+            prepared.cleanup()
+    
+    def _generate_from_video(self, video_path: str, prompt: str) -> str:
+        """Analyze a video from its scene-change keyframes, or the whole clip as a fallback"""
+        if video_mode() == "keyframes":
+            reduction = reduce_video(video_path)
+            if reduction is not None:
+                try:
+                    parts = reduction.parts(prompt)
+                    if reduction.audio_path and reduction.total_bytes() > INLINE_MAX_BYTES:
+                        # A long soundtrack goes through the Files API instead of inline
+                        handle = self.uploader.upload(reduction.audio_path, "audio/ogg")
+                        parts[-1] = {"file_uri": handle["uri"], "mime_type": handle["mime_type"]}
+                    return generate_with_parts(self.api_key, "gemini-1.5-flash", parts)
+                finally:
+                    reduction.cleanup()
+        return self._generate_from_media(video_path, detect_mime(video_path), prompt)
+    
+    def _generate_from_media(self, media_path: str, mime_type: str, prompt: str) -> str:
+        """Run a prompt over one media file without loading the file into memory"""
+        if os.path.getsize(media_path) <= INLINE_MAX_BYTES:
+            # Base64 is encoded chunk by chunk straight into the request body
+            return generate_with_inline_media(self.api_key, "gemini-1.5-flash", media_path, mime_type, prompt)
+        
+        # Large files go through the Files API once and are referenced by URI
+        handle = self.uploader.upload(media_path, mime_type)
+        return generate_with_parts(self.api_key, "gemini-1.5-flash", [
+            {"text": prompt},
+            {"file_uri": handle["uri"], "mime_type": handle["mime_type"]}
+        ])
+    
     def analyze_image(self, image_path: str, prompt: str = "Describe this image in detail") -> Dict[str, Any]:
         """Analyze an image using Gemini's vision capabilities"""
         if not self.api_key or not self.client:
@@ -47,31 +97,41 @@ class GoogleAIMultimodal:
             }
         
         try:
-            # Encode image to base64
-            image_base64 = self.encode_image_to_base64(image_path)
-            
-            # Create the content with image and text
-            content = [
-                {
-                    "text": prompt
-                },
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",  # Adjust based on your image type
-                        "data": image_base64
-                    }
-                }
-            ]
+            # Use Gemini's multimodal capabilities (1.5-flash for better multimodal support)
+            response_text = self._generate_from_image(image_path, prompt)
             
-            # Use Gemini's multimodal capabilities
-            response = self.client.models.generate_content(
-                model="gemini-1.5-flash",  # Use 1.5-flash for better multimodal support
-                contents=content
-            )
+            return {
+                "success": True,
+                "response": response_text,
+                "model": "gemini-1.5-flash",
+                "image_path": image_path,
+                "prompt": prompt,
+                "timestamp": datetime.now().isoformat()
+            }
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Image analysis failed: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    async def aanalyze_image(self, image_path: str, prompt: str = "Describe this image in detail") -> Dict[str, Any]:
+        """Async variant of analyze_image"""
+        if not self.api_key or not self.client:
+            return {
+                "success": False,
+                "error": "Google AI API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        try:
+            # Keep file reads, encoding and uploads off the event loop
+            response_text = await asyncio.to_thread(self._generate_from_image, image_path, prompt)
             
             return {
                 "success": True,
-                "response": response.text,
+                "response": response_text,
                 "model": "gemini-1.5-flash",
                 "image_path": image_path,
                 "prompt": prompt,
@@ -95,31 +155,12 @@ class GoogleAIMultimodal:
             }
         
         try:
-            # Encode video to base64
-            video_base64 = self.encode_video_to_base64(video_path)
-            
-            # Create the content with video and text
-            content = [
-                {
-                    "text": prompt
-                },
-                {
-                    "inline_data": {
-                        "mime_type": "video/mp4",  # Adjust based on your video type
-                        "data": video_base64
-                    }
-                }
-            ]
-            
-            # Use Gemini's multimodal capabilities
-            response = self.client.models.generate_content(
-                model="gemini-1.5-flash",
-                contents=content
-            )
+            # Use Gemini's multimodal capabilities (1.5-flash for better multimodal support)
+            response_text = self._generate_from_video(video_path, prompt)
             
             return {
                 "success": True,
-                "response": response.text,
+                "response": response_text,
                 "model": "gemini-1.5-flash",
                 "video_path": video_path,
                 "prompt": prompt,
@@ -133,8 +174,8 @@ class GoogleAIMultimodal:
                 "timestamp": datetime.now().isoformat()
             }
     
-    def analyze_memory_media(self, media_path: str, media_type: str, memory_context: str = "") -> Dict[str, Any]:
-        """Analyze media files for memory garden context"""
+    async def aanalyze_video(self, video_path: str, prompt: str = "Describe what happens in this video") -> Dict[str, Any]:
+        """Async variant of analyze_video"""
         if not self.api_key or not self.client:
             return {
                 "success": False,
@@ -142,31 +183,263 @@ class GoogleAIMultimodal:
                 "timestamp": datetime.now().isoformat()
             }
         
-        # Create context-aware prompt for memory analysis
-        if media_type.lower() in ['image', 'jpg', 'jpeg', 'png', 'gif', 'webp']:
-            prompt = f"""As a kind friend, look at this image for a memory garden (4-5 lines max):
-            
-            Memory Context: {memory_context if memory_context else "No extra info given"}
-            
-            Use simple words, give a nice short description. IMPORTANT: Always end with a guiding question that starts with 'What' or 'How' to help them explore this memory more."""
-            
-            return self.analyze_image(media_path, prompt)
+        try:
+            # Keep file reads, encoding and uploads off the event loop
+            response_text = await asyncio.to_thread(self._generate_from_video, video_path, prompt)
             
+            return {
+                "success": True,
+                "response": response_text,
+                "model": "gemini-1.5-flash",
+                "video_path": video_path,
+                "prompt": prompt,
+                "timestamp": datetime.now().isoformat()
+            }
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Video analysis failed: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def _memory_media_kind(self, media_type: str) -> Optional[str]:
+        """Analysis kind ('image'/'video') for a media type, or None if unsupported"""
+        if media_type.lower() in ['image', 'jpg', 'jpeg', 'png', 'gif', 'webp']:
+            return "image"
         elif media_type.lower() in ['video', 'mp4', 'mov', 'avi', 'webm']:
-            prompt = f"""As a kind friend, look at this video for a memory garden (4-5 lines max):
+            return "video"
+        return None
+    
+    def _media_description_prompt(self, kind: str) -> str:
+        # Carries no caller context, so one description serves every memory
+        return f"""Describe this {kind} for a memory garden in plain words (4-5 lines max):
+            who and what is shown, the place, what is happening and the mood.
+            Describe only what you see; don't add questions or advice."""
+    
+    def _memory_reply_prompt(self, kind: str, description: str, memory_context: str = "") -> str:
+        return f"""As a kind friend, talk about this {kind} for a memory garden (4-5 lines max):
+            
+            What the {kind} shows: {description}
             
             Memory Context: {memory_context if memory_context else "No extra info given"}
             
             Use simple words, give a nice short description. IMPORTANT: Always end with a guiding question that starts with 'What' or 'How' to help them explore this memory more."""
-            
-            return self.analyze_video(media_path, prompt)
+    
+    def _cached_analysis(self, media_path: str, kind: str, fresh: bool) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (cache_key, cached description) for a media file; the key is None when caching is off"""
+        if fresh or not media_cache_enabled():
+            return None, None
+        try:
+            cache_key = media_cache.make_key(media_path, "gemini-1.5-flash", MEMORY_PROMPT_VERSION, kind)
+        except OSError:
+            # Missing or unreadable files report their error from the analysis itself
+            return None, None
+        cached = media_cache.get(cache_key)
+        if cached is not None:
+            cached["cached"] = True
+        return cache_key, cached
+    
+    def _cacheable(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        # Only the context-free description is stored, never a prompt or a personal reply
+        return {"success": True, "response": result["response"], "model": result["model"]}
+    
+    def _memory_reply(self, media_path: str, kind: str, analysis: Dict[str, Any], memory_context: str) -> Dict[str, Any]:
+        """Turn a media description into the memory garden reply with a text-only call"""
+        description = analysis["response"]
+        result = {
+            "success": True,
+            "media_description": description,
+            "model": "gemini-1.5-flash",
+            f"{kind}_path": media_path,
+            "cached": bool(analysis.get("cached"))
+        }
+        try:
+            # Same REST transport as the media call, so a batch deadline bounds it too
+            result["response"] = generate_with_parts(self.api_key, "gemini-1.5-flash", [
+                {"text": self._memory_reply_prompt(kind, description, memory_context)}
+            ])
+        except Exception as e:
+            print(f"⚠️ Memory reply failed, returning the media description: {e}")
+            result["response"] = description
+            result["note"] = "Personalized reply unavailable, showing the media description"
+        result["timestamp"] = datetime.now().isoformat()
+        return result
+    
+    def analyze_memory_media(self, media_path: str, media_type: str, memory_context: str = "", fresh: bool = False) -> Dict[str, Any]:
+        """Analyze media files for memory garden context; fresh=True skips the analysis cache"""
+        if not self.api_key or not self.client:
+            return {
+                "success": False,
+                "error": "Google AI API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
         
-        else:
+        kind = self._memory_media_kind(media_type)
+        if kind is None:
             return {
                 "success": False,
                 "error": f"Unsupported media type: {media_type}",
                 "timestamp": datetime.now().isoformat()
             }
+        
+        # Identical file contents reuse an earlier description without any upload;
+        # the memory context is applied afterwards in a cheap text-only call
+        cache_key, analysis = self._cached_analysis(media_path, kind, fresh)
+        if analysis is None:
+            if kind == "image":
+                analysis = self.analyze_image(media_path, self._media_description_prompt(kind))
+            else:
+                analysis = self.analyze_video(media_path, self._media_description_prompt(kind))
+            if not analysis.get("success"):
+                return analysis
+            if cache_key:
+                media_cache.put(cache_key, self._cacheable(analysis))
+        return self._memory_reply(media_path, kind, analysis, memory_context)
+    
+    async def aanalyze_memory_media(self, media_path: str, media_type: str, memory_context: str = "", fresh: bool = False) -> Dict[str, Any]:
+        """Async variant of analyze_memory_media"""
+        if not self.api_key or not self.client:
+            return {
+                "success": False,
+                "error": "Google AI API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        kind = self._memory_media_kind(media_type)
+        if kind is None:
+            return {
+                "success": False,
+                "error": f"Unsupported media type: {media_type}",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        # Hashing reads the whole file, so it stays off the event loop
+        cache_key, analysis = await asyncio.to_thread(self._cached_analysis, media_path, kind, fresh)
+        if analysis is None:
+            if kind == "image":
+                analysis = await self.aanalyze_image(media_path, self._media_description_prompt(kind))
+            else:
+                analysis = await self.aanalyze_video(media_path, self._media_description_prompt(kind))
+            if not analysis.get("success"):
+                return analysis
+            if cache_key:
+                await asyncio.to_thread(media_cache.put, cache_key, self._cacheable(analysis))
+        return await asyncio.to_thread(self._memory_reply, media_path, kind, analysis, memory_context)
+    
+    def _batch_item_error(self, item: Any) -> Optional[str]:
+        # Batch input comes straight from stdin, so items are checked before use
+        if not isinstance(item, dict):
+            return f"Invalid batch item: expected an object, got {type(item).__name__}"
+        if not isinstance(item.get("path"), str) or not item["path"]:
+            return "Invalid batch item: \"path\" is required"
+        return None
+    
+    def _batch_item_result(self, index: int, item: Any, result: Dict[str, Any], started: float) -> Dict[str, Any]:
+        fields = item if isinstance(item, dict) else {}
+        result = dict(result)
+        result.update({
+            "index": index,
+            "id": fields.get("id"),
+            "media_path": fields.get("path"),
+            "elapsed": round(time.monotonic() - started, 3)
+        })
+        return result
+    
+    def _batch_timeout_result(self, index: int, item: Dict[str, Any], item_timeout: float, started: float) -> Dict[str, Any]:
+        return self._batch_item_result(index, item, {
+            "success": False,
+            "error": f"Analysis timed out after {item_timeout:g}s",
+            "timestamp": datetime.now().isoformat()
+        }, started)
+    
+    def analyze_memory_media_batch(self, items: List[Dict[str, Any]], memory_context: str = "", max_workers: int = None,
+                                   item_timeout: float = None) -> Iterator[Dict[str, Any]]:
+        """Analyze many media items concurrently, yielding each result as it completes"""
+        # Items are {"path", "type", optional "id", "context", "fresh"}; results carry the item's index and id
+        max_workers = max_workers or BATCH_WORKERS
+        item_timeout = item_timeout or BATCH_ITEM_TIMEOUT
+        started = {}
+        
+        def run(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            # The deadline counts from when a worker picks the item up, not from submission
+            started[index] = time.monotonic()
+            try:
+                error = self._batch_item_error(item)
+                if error:
+                    result = {
+                        "success": False,
+                        "error": error,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                else:
+                    # Every request the item makes gives up at its deadline, freeing this worker
+                    with media_deadline(item_timeout):
+                        result = self.analyze_memory_media(item["path"], item.get("type", ""), item.get("context", memory_context), item.get("fresh", False))
+            except Exception as e:
+                result = {
+                    "success": False,
+                    "error": f"Media analysis failed: {str(e)}",
+                    "timestamp": datetime.now().isoformat()
+                }
+            return self._batch_item_result(index, item, result, started[index])
+        
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="media-batch")
+        try:
+            pending = {pool.submit(run, index, item): index for index, item in enumerate(items)}
+            while pending:
+                now = time.monotonic()
+                running = [started[index] for index in pending.values() if index in started]
+                timeout = max(0.0, min(running) + item_timeout - now) if running else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    yield future.result()
+                now = time.monotonic()
+                for future, index in list(pending.items()):
+                    if index in started and now - started[index] >= item_timeout:
+                        # Its requests are failing at the same deadline; the late result is dropped
+                        pending.pop(future)
+                        yield self._batch_timeout_result(index, items[index], item_timeout, started[index])
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    async def aanalyze_memory_media_batch(self, items: List[Dict[str, Any]], memory_context: str = "", max_workers: int = None,
+                                          item_timeout: float = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async variant of analyze_memory_media_batch"""
+        max_workers = max_workers or BATCH_WORKERS
+        item_timeout = item_timeout or BATCH_ITEM_TIMEOUT
+        semaphore = asyncio.Semaphore(max_workers)
+        
+        async def run(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                started = time.monotonic()
+                error = self._batch_item_error(item)
+                if error:
+                    return self._batch_item_result(index, item, {
+                        "success": False,
+                        "error": error,
+                        "timestamp": datetime.now().isoformat()
+                    }, started)
+                try:
+                    # Cancelling the await doesn't stop to_thread work; the deadline does
+                    with media_deadline(item_timeout):
+                        result = await asyncio.wait_for(
+                            self.aanalyze_memory_media(item["path"], item.get("type", ""), item.get("context", memory_context), item.get("fresh", False)),
+                            timeout=item_timeout
+                        )
+                except asyncio.TimeoutError:
+                    return self._batch_timeout_result(index, item, item_timeout, started)
+                except Exception as e:
+                    result = {
+                        "success": False,
+                        "error": f"Media analysis failed: {str(e)}",
+                        "timestamp": datetime.now().isoformat()
+                    }
+                return self._batch_item_result(index, item, result, started)
+        
+        for next_result in asyncio.as_completed([run(index, item) for index, item in enumerate(items)]):
+            yield await next_result
     
     def generate_memory_insights(self, media_analysis: str, memory_title: str = "", memory_description: str = "") -> Dict[str, Any]:
         """Generate AI insights based on media analysis and memory details"""
@@ -242,6 +515,64 @@ class GoogleAIMultimodal:
                 "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
+    
+    async def acall_google_ai_api(self, prompt: str, context: str = None) -> Dict[str, Any]:
+        """Async variant of call_google_ai_api"""
+        if not self.api_key or not self.client:
+            return {
+                "success": False,
+                "error": "Google AI API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        full_prompt = prompt
+        if context:
+            full_prompt = f"{context}\n\n{prompt}"
+        
+        try:
+            response = await self.client.aio.models.generate_content(
+                model="gemini-1.5-flash",
+                contents=full_prompt
+            )
+            
+            return {
+                "success": True,
+                "response": response.text,
+                "model": "gemini-1.5-flash",
+                "timestamp": datetime.now().isoformat()
+            }
+                
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Request failed: {str(e)}",
+                "timestamp": datetime.now().isoformat()
+            }
+
+def run_batch():
+    """Analyze media items from stdin, writing one NDJSON line per finished item"""
+    # Input is a JSON array of items or one JSON item per line:
+    #   {"id": "...", "path": "...", "type": "image", "context": "..."}
+    protocol_out = sys.stdout
+    # Debug prints go to stderr so stdout stays pure NDJSON
+    sys.stdout = sys.stderr
+    
+    raw = sys.stdin.read().strip()
+    try:
+        items = json.loads(raw) if raw.startswith("[") else [json.loads(line) for line in raw.splitlines() if line.strip()]
+    except json.JSONDecodeError:
+        protocol_out.write(json.dumps({"type": "complete", "success": False, "error": "Invalid JSON input"}) + "\n")
+        return
+    
+    memory_context = sys.argv[2] if len(sys.argv) >= 3 else ""
+    ai = GoogleAIMultimodal()
+    succeeded = 0
+    for result in ai.analyze_memory_media_batch(items, memory_context):
+        succeeded += bool(result.get("success"))
+        protocol_out.write(json.dumps({"type": "result", **result}) + "\n")
+        protocol_out.flush()
+    protocol_out.write(json.dumps({"type": "complete", "success": True, "total": len(items), "succeeded": succeeded}) + "\n")
+    protocol_out.flush()
 
 def main():
     """Test the multimodal Google AI integration"""
@@ -289,4 +620,7 @@ def main():
     return True
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) >= 2 and sys.argv[1] == '--batch':
+        run_batch()
+    else:
+        main()
@@ -0,0 +1,101 @@
+"""
+Shared HTTP transport for REST-based AI providers
+Keeps one pooled keep-alive session per host so long-lived workers reuse
+TCP/TLS connections instead of opening a new one for every request
+
+Async provider methods use httpx instead (HTTP/2 when the h2 package is
+installed), with one client per host and event loop.
+"""
+
+import os
+import asyncio
+import threading
+import weakref
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Exceptions raised by the async client; an empty tuple catches nothing
+ASYNC_HTTP_ERRORS = (httpx.HTTPError,) if httpx else ()
+
+# Connections kept open per host; raise for workers with many threads
+POOL_SIZE = int(os.environ.get('AI_HTTP_POOL_SIZE', '10'))
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# event loop -> {host: httpx.AsyncClient}; clients can't be shared across loops
+_async_clients = weakref.WeakKeyDictionary()
+
+def _host_key(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+def _new_session(pool_size: int) -> requests.Session:
+    session = requests.Session()
+    # No automatic retries: callers already have their own fallback paths
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Connection": "keep-alive"})
+    return session
+
+def get_session(url: str) -> requests.Session:
+    """Return the shared keep-alive session for the host of a URL"""
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                session = _new_session(POOL_SIZE)
+                _sessions[key] = session
+    return session
+
+def get_async_client(url: str) -> "httpx.AsyncClient":
+    """Return the shared async client for the host of a URL on the running loop"""
+    if httpx is None:
+        raise ImportError("httpx is required for async provider calls: pip install httpx")
+
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, {})
+    key = _host_key(url)
+    client = clients.get(key)
+    if client is None:
+        limits = httpx.Limits(max_connections=POOL_SIZE * 10, max_keepalive_connections=POOL_SIZE)
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits)
+        clients[key] = client
+    return client
+
+async def aclose_async_clients() -> None:
+    """Close the async clients opened on the running loop"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose()
+
+def close_sessions() -> None:
+    """Close every pooled session (e.g. on worker shutdown)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def _reset_after_fork() -> None:
+    # Pooled sockets must not be shared between a parent and forked workers
+    global _sessions_lock
+    _sessions.clear()
+    _sessions_lock = threading.Lock()
+    _async_clients.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,13 +1,23 @@
 import os
 import json
+import time
+import asyncio
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
 from typing import Dict, Any, List
 from dotenv import load_dotenv
+from http_transport import get_session, get_async_client, ASYNC_HTTP_ERRORS
+from model_availability import availability_store
+from fallback_engine import fallback_engines
+from context_window import fit_history
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
+# Website help persona; nav chat answers are cached per prompt, so edits reset them
+WEBSITE_SYSTEM_PROMPT = "You are Sprout, a helpful Memory Garden assistant. Help users navigate the website and understand its features. Be practical and helpful."
+
 class HuggingFaceAI:
     def __init__(self):
         self.api_key = os.getenv('HUGGINGFACE_API_KEY')
@@ -21,10 +31,17 @@ class HuggingFaceAI:
             "gpt2"                           # Original GPT-2 (fallback)
         ]
         
+        # Hedged cascade: how many models may be in flight at once, how long to
+        # wait before hedging with the next one, and the overall time budget.
+        # Hedging multiplies request and quota use, so it is opt-in (> 1)
+        self.hedge_top_k = int(os.getenv('HUGGINGFACE_HEDGE_TOP_K', '1'))
+        self.hedge_stagger = float(os.getenv('HUGGINGFACE_HEDGE_STAGGER', '0.5'))
+        self.cascade_deadline = float(os.getenv('HUGGINGFACE_CASCADE_DEADLINE', '20'))
+        
         if not self.api_key:
             print("Warning: HUGGINGFACE_API_KEY not found in environment variables")
     
-    def call_huggingface_api(self, prompt: str, model: str = None) -> Dict[str, Any]:
+    def call_huggingface_api(self, prompt: str, model: str = None, hedged: bool = None) -> Dict[str, Any]:
         """Call Hugging Face API for text generation"""
         if not self.api_key:
             return {
@@ -33,9 +50,14 @@ class HuggingFaceAI:
                 "timestamp": datetime.now().isoformat()
             }
         
+        if hedged is None:
+            hedged = self.hedge_top_k > 1
+        
         # Try multiple models if none specified
-        if model is None:
-            for model_to_try in self.models:
+        if model is None and hedged:
+            return self._hedged_cascade(prompt)
+        elif model is None:
+            for model_to_try in availability_store.filter_available(self.models):
                 print(f"Trying model: {model_to_try}")
                 result = self._try_model(prompt, model_to_try)
                 if result["success"]:
@@ -47,8 +69,134 @@ class HuggingFaceAI:
         else:
             return self._try_model(prompt, model)
     
-    def _try_model(self, prompt: str, model: str) -> Dict[str, Any]:
-        """Try to use a specific model"""
+    def _hedged_cascade(self, prompt: str) -> Dict[str, Any]:
+        """Race up to hedge_top_k models, launching one every hedge_stagger
+        seconds (or as soon as one fails), and return the first success.
+        
+        The whole cascade is bounded by cascade_deadline. Queued requests are
+        cancelled once a winner arrives; blocking requests already on the wire
+        can't be interrupted and finish within their timeout, so callers that
+        can should prefer the async variant, which cancels them.
+        """
+        deadline = time.monotonic() + self.cascade_deadline
+        # Skip models recently seen missing, forbidden or still loading
+        candidates = availability_store.filter_available(self.models)
+        running = {}
+        next_launch = 0.0
+        executor = ThreadPoolExecutor(max_workers=max(1, self.hedge_top_k))
+        
+        try:
+            while candidates or running:
+                now = time.monotonic()
+                if now >= deadline:
+                    print(f"Cascade deadline of {self.cascade_deadline}s reached")
+                    break
+                
+                can_launch = candidates and len(running) < self.hedge_top_k
+                if can_launch and (not running or now >= next_launch):
+                    model_to_try = candidates.pop(0)
+                    print(f"Trying model: {model_to_try}")
+                    timeout = max(1.0, min(30, deadline - now))
+                    running[executor.submit(self._try_model, prompt, model_to_try, timeout)] = model_to_try
+                    next_launch = now + self.hedge_stagger
+                    continue
+                
+                wait_for = deadline - now
+                if can_launch:
+                    wait_for = min(wait_for, next_launch - now)
+                done, _ = wait(running, timeout=max(0, wait_for), return_when=FIRST_COMPLETED)
+                
+                for future in done:
+                    model_done = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {"success": False, "error": str(e)}
+                    if result["success"]:
+                        print(f"Success with model: {model_done}")
+                        return result
+                    # A failure frees a slot, so hedge with the next model right away
+                    next_launch = 0.0
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        # If all models fail, use fallback
+        print("All models failed, using fallback")
+        return self._fallback_response(prompt)
+    
+    async def _ahedged_cascade(self, prompt: str) -> Dict[str, Any]:
+        """Async variant of _hedged_cascade; losing requests are cancelled outright"""
+        deadline = time.monotonic() + self.cascade_deadline
+        candidates = availability_store.filter_available(self.models)
+        running = {}
+        next_launch = 0.0
+        
+        try:
+            while candidates or running:
+                now = time.monotonic()
+                if now >= deadline:
+                    print(f"Cascade deadline of {self.cascade_deadline}s reached")
+                    break
+                
+                can_launch = candidates and len(running) < self.hedge_top_k
+                if can_launch and (not running or now >= next_launch):
+                    model_to_try = candidates.pop(0)
+                    print(f"Trying model: {model_to_try}")
+                    running[asyncio.ensure_future(self._atry_model(prompt, model_to_try))] = model_to_try
+                    next_launch = now + self.hedge_stagger
+                    continue
+                
+                wait_for = deadline - now
+                if can_launch:
+                    wait_for = min(wait_for, next_launch - now)
+                done, _ = await asyncio.wait(running, timeout=max(0, wait_for), return_when=asyncio.FIRST_COMPLETED)
+                
+                for task in done:
+                    model_done = running.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        result = {"success": False, "error": str(e)}
+                    if result["success"]:
+                        print(f"Success with model: {model_done}")
+                        return result
+                    next_launch = 0.0
+        finally:
+            # Cancelling the losers closes their connections instead of waiting them out
+            for task in running:
+                task.cancel()
+        
+        print("All models failed, using fallback")
+        return self._fallback_response(prompt)
+    
+    async def acall_huggingface_api(self, prompt: str, model: str = None, hedged: bool = None) -> Dict[str, Any]:
+        """Async variant of call_huggingface_api"""
+        if not self.api_key:
+            return {
+                "success": False,
+                "error": "Hugging Face API key not configured",
+                "timestamp": datetime.now().isoformat()
+            }
+        
+        if hedged is None:
+            hedged = self.hedge_top_k > 1
+        
+        if model is None and hedged:
+            return await self._ahedged_cascade(prompt)
+        elif model is None:
+            for model_to_try in availability_store.filter_available(self.models):
+                print(f"Trying model: {model_to_try}")
+                result = await self._atry_model(prompt, model_to_try)
+                if result["success"]:
+                    print(f"Success with model: {model_to_try}")
+                    return result
+            print("All models failed, using fallback")
+            return self._fallback_response(prompt)
+        else:
+            return await self._atry_model(prompt, model)
+    
+    def _model_request(self, prompt: str, model: str):
+        """Build the URL, headers and payload for a text-generation call"""
         url = f"{self.api_url}/{model}"
         
         headers = {
@@ -66,72 +214,81 @@ class HuggingFaceAI:
                 "return_full_text": False
             }
         }
+        return url, headers, payload
+    
+    def _handle_model_response(self, prompt: str, model: str, response) -> Dict[str, Any]:
+        """Turn a requests/httpx response from the inference API into a result dict"""
+        print(f"Response status: {response.status_code}")
+        availability_store.record(model, response.status_code)
         
-        try:
-            print(f"Calling {url}")
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+        if response.status_code == 200:
+            result = response.json()
+            print(f"Response received from {model}")
             
-            print(f"Response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                result = response.json()
-                print(f"Response received from {model}")
+            # Extract the generated text from the response
+            if isinstance(result, list) and len(result) > 0:
+                if "generated_text" in result[0]:
+                    generated_text = result[0]["generated_text"]
+                else:
+                    generated_text = str(result[0])
+                
+                # Clean up the generated text
+                if prompt in generated_text:
+                    generated_text = generated_text.replace(prompt, '').strip()
                 
-                # Extract the generated text from the response
-                if isinstance(result, list) and len(result) > 0:
-                    if "generated_text" in result[0]:
-                        generated_text = result[0]["generated_text"]
-                    else:
-                        generated_text = str(result[0])
-                    
-                    # Clean up the generated text
+                return {
+                    "success": True,
+                    "generated_text": generated_text,
+                    "model": model,
+                    "timestamp": datetime.now().isoformat()
+                }
+            elif isinstance(result, dict):
+                if "generated_text" in result:
+                    generated_text = result["generated_text"]
                     if prompt in generated_text:
                         generated_text = generated_text.replace(prompt, '').strip()
-                    
                     return {
                         "success": True,
                         "generated_text": generated_text,
                         "model": model,
                         "timestamp": datetime.now().isoformat()
                     }
-                elif isinstance(result, dict):
-                    if "generated_text" in result:
-                        generated_text = result["generated_text"]
-                        if prompt in generated_text:
-                            generated_text = generated_text.replace(prompt, '').strip()
-                        return {
-                            "success": True,
-                            "generated_text": generated_text,
-                            "model": model,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    else:
-                        return {
-                            "success": False,
-                            "error": f"Unexpected response format from {model}",
-                            "timestamp": datetime.now().isoformat()
-                        }
                 else:
                     return {
                         "success": False,
                         "error": f"Unexpected response format from {model}",
                         "timestamp": datetime.now().isoformat()
                     }
-            elif response.status_code == 503:
-                # Model is loading, try next model
-                print(f"Model {model} is loading (503)")
-                return {"success": False, "error": "Model loading"}
-            elif response.status_code == 404:
-                # Model not found, try next model
-                print(f"Model {model} not found (404)")
-                return {"success": False, "error": "Model not found"}
             else:
-                print(f"API error {response.status_code}")
                 return {
                     "success": False,
-                    "error": f"API request failed with status {response.status_code}",
+                    "error": f"Unexpected response format from {model}",
                     "timestamp": datetime.now().isoformat()
                 }
+        elif response.status_code == 503:
+            # Model is loading, try next model
+            print(f"Model {model} is loading (503)")
+            return {"success": False, "error": "Model loading"}
+        elif response.status_code == 404:
+            # Model not found, try next model
+            print(f"Model {model} not found (404)")
+            return {"success": False, "error": "Model not found"}
+        else:
+            print(f"API error {response.status_code}")
+            return {
+                "success": False,
+                "error": f"API request failed with status {response.status_code}",
+                "timestamp": datetime.now().isoformat()
+            }
+    
+    def _try_model(self, prompt: str, model: str, timeout: float = 30) -> Dict[str, Any]:
+        """Try to use a specific model"""
+        url, headers, payload = self._model_request(prompt, model)
+        
+        try:
+            print(f"Calling {url}")
+            response = get_session(url).post(url, headers=headers, json=payload, timeout=timeout)
+            return self._handle_model_response(prompt, model, response)
                 
         except requests.exceptions.RequestException as e:
             print(f"Request failed for {model}: {str(e)}")
@@ -141,54 +298,39 @@ class HuggingFaceAI:
                 "timestamp": datetime.now().isoformat()
             }
     
-    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
-        """Provide a fallback response when models are unavailable"""
-        # Context-aware responses for different types of prompts
-        prompt_lower = prompt.lower()
+    async def _atry_model(self, prompt: str, model: str) -> Dict[str, Any]:
+        """Async variant of _try_model"""
+        url, headers, payload = self._model_request(prompt, model)
         
-        if "hello" in prompt_lower or "hi" in prompt_lower:
-            return {
-                "success": True,
-                "generated_text": "Hello! How can I help you today?",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "memory" in prompt_lower or "garden" in prompt_lower:
-            return {
-                "success": True,
-                "generated_text": "I'd be happy to help you with your memory garden! What would you like to know?",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "help" in prompt_lower:
-            return {
-                "success": True,
-                "generated_text": "I'm here to help! You can ask me about planting memories, exploring your garden, or any other features.",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "sunset" in prompt_lower or "walk" in prompt_lower:
-            return {
-                "success": True,
-                "generated_text": "That sounds like a beautiful memory! Evening walks can be so peaceful and reflective. The changing light and quiet moments often help us process our thoughts and feelings.",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "reflection" in prompt_lower:
-            return {
-                "success": True,
-                "generated_text": "This memory seems meaningful to you. Take a moment to reflect on how it made you feel and what it taught you about yourself.",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
+        try:
+            print(f"Calling {url}")
+            response = await get_async_client(url).post(url, headers=headers, json=payload, timeout=30)
+            return self._handle_model_response(prompt, model, response)
+                
+        except ASYNC_HTTP_ERRORS as e:
+            print(f"Request failed for {model}: {str(e)}")
             return {
-                "success": True,
-                "generated_text": "I'm here to assist you with your Memory Garden. How can I help?",
-                "model": "fallback",
+                "success": False,
+                "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
     
+    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
+        """Provide a fallback response when models are unavailable"""
+        # Rules live in ai_config.json ("fallback_rules") and match in one pass
+        return {
+            "success": True,
+            "generated_text": fallback_engines.get("huggingface").match(prompt),
+            "model": "fallback",
+            "timestamp": datetime.now().isoformat(),
+            "fallback_mode": True,
+            "note": "No Hugging Face model available, using fallback response"
+        }
+    
+    def _fallback_fields(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        # Carried into caller-facing results so canned text isn't taken for a model answer
+        return {key: result[key] for key in ("fallback_mode", "note") if key in result}
+    
     def process_memory_garden_test(self, test_title: str, test_description: str) -> Dict[str, Any]:
         """Process a memory garden test using AI"""
         prompt = f"Memory Garden Test: {test_title} - {test_description}. Please provide a thoughtful reflection on this memory."
@@ -201,7 +343,8 @@ class HuggingFaceAI:
                 "reflection": result["generated_text"],
                 "test_title": test_title,
                 "test_description": test_description,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                **self._fallback_fields(result)
             }
         else:
             return {
@@ -214,17 +357,17 @@ class HuggingFaceAI:
                 }
             }
     
-    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Continue a conversation with context awareness"""
+    def build_conversation_prompt(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> str:
+        """Build the plain-text prompt for a chat turn"""
         # Build context-aware prompt
         if context and context.get('website_name') == 'Memory Garden':
-            system_prompt = "You are Sprout, a helpful Memory Garden assistant. Help users navigate the website and understand its features. Be practical and helpful."
+            system_prompt = WEBSITE_SYSTEM_PROMPT
         else:
             system_prompt = "You are a supportive AI assistant for the Memory Garden therapy application. Provide thoughtful, therapeutic responses."
         
-        # Format conversation history
+        # Format the most recent history that fits the model's context budget
         formatted_messages = []
-        for msg in conversation_history:
+        for msg in fit_history(conversation_history, "huggingface", [system_prompt, message]):
             if msg.get('role') in ['user', 'assistant']:
                 formatted_messages.append(f"{msg['role']}: {msg['content']}")
         
@@ -235,14 +378,17 @@ class HuggingFaceAI:
         else:
             full_prompt = f"{system_prompt}\n\nUser: {message}\nAssistant:"
         
-        result = self.call_huggingface_api(full_prompt)
+        return full_prompt
+    
+    def _conversation_result(self, message: str, result: Dict[str, Any]) -> Dict[str, Any]:
         
         if result["success"]:
             return {
                 "success": True,
                 "response": result["generated_text"],
                 "message": message,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                **self._fallback_fields(result)
             }
         else:
             return {
@@ -251,6 +397,18 @@ class HuggingFaceAI:
                 "message": message,
                 "timestamp": datetime.now().isoformat()
             }
+    
+    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Continue a conversation with context awareness"""
+        full_prompt = self.build_conversation_prompt(message, conversation_history, context)
+        result = self.call_huggingface_api(full_prompt)
+        return self._conversation_result(message, result)
+    
+    async def acontinue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        full_prompt = self.build_conversation_prompt(message, conversation_history, context)
+        result = await self.acall_huggingface_api(full_prompt)
+        return self._conversation_result(message, result)
 
 def main():
     """Test the Hugging Face AI integration"""
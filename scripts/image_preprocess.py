@@ -0,0 +1,145 @@
+"""
+Image preprocessing before multimodal analysis
+Detects the real format from the file's magic bytes, then decodes, downscales
+to a maximum edge, drops EXIF (after applying its rotation) and re-encodes to
+a quality-tuned JPEG or WebP. The CPU work runs on a shared thread pool;
+Pillow releases the GIL while decoding and resizing, so several photos are
+prepared in parallel. Without Pillow the original file is sent with its
+detected MIME type.
+"""
+
+import os
+import tempfile
+import threading
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import NamedTuple, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+    ImageOps = None
+
+MAX_EDGE = int(os.environ.get('AI_IMAGE_MAX_EDGE', '1024'))
+OUTPUT_FORMAT = os.environ.get('AI_IMAGE_FORMAT', 'jpeg').lower()
+QUALITY = int(os.environ.get('AI_IMAGE_QUALITY', '85'))
+WORKERS = int(os.environ.get('AI_IMAGE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+OUTPUT_MIME = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+# (offset, signature, mime type); checked in order
+_SIGNATURES = [
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (8, b"WEBP", "image/webp"),
+    (8, b"AVI ", "video/x-msvideo"),
+    (0, b"BM", "image/bmp"),
+    (0, b"\x1a\x45\xdf\xa3", "video/webm"),
+]
+# ISO base media files carry their brand after "ftyp"
+_FTYP_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"msf1": "image/heif",
+    b"avif": "image/avif", b"qt  ": "video/quicktime", b"M4V ": "video/mp4",
+    b"3gp4": "video/3gpp", b"3gp5": "video/3gpp",
+}
+
+def detect_mime(path: str) -> str:
+    """MIME type from a file's leading bytes, falling back to its extension"""
+    try:
+        with open(path, "rb") as media_file:
+            head = media_file.read(32)
+    except OSError:
+        head = b""
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+    for offset, signature, mime_type in _SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime_type
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+def preprocess_enabled() -> bool:
+    return Image is not None and os.environ.get('AI_IMAGE_PREPROCESS', 'true').lower() == 'true'
+
+class PreparedImage(NamedTuple):
+    path: str
+    mime_type: str
+    original_bytes: int
+    prepared_bytes: int
+    # True when path is a temp file the caller should remove with cleanup()
+    temporary: bool
+
+    def cleanup(self) -> None:
+        if self.temporary:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+def prepare_image(path: str, max_edge: int = None, output_format: str = None, quality: int = None) -> PreparedImage:
+    """Downscaled, EXIF-free copy of an image ready for upload"""
+    mime_type = detect_mime(path)
+    size = os.path.getsize(path)
+    original = PreparedImage(path, mime_type, size, size, False)
+    if not preprocess_enabled():
+        return original
+
+    max_edge = max_edge or MAX_EDGE
+    output_format = output_format or OUTPUT_FORMAT
+    if output_format not in OUTPUT_MIME:
+        output_format = "jpeg"
+    out_path = None
+    try:
+        with Image.open(path) as img:
+            original_size = img.size
+            # Metadata that must not leave the device (GPS, camera serials, ...)
+            has_exif = bool(img.getexif()) or "exif" in img.info
+            # Let the JPEG decoder scale down by a power of two while decoding
+            img.draft("RGB", (max_edge, max_edge))
+            # Apply the EXIF orientation before the metadata is dropped
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            resized = img.size != original_size
+            if output_format == "jpeg" and img.mode != "RGB":
+                rgba = img.convert("RGBA")
+                img = Image.new("RGB", rgba.size, (255, 255, 255))
+                img.paste(rgba, mask=rgba.getchannel("A"))
+            elif img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            fd, out_path = tempfile.mkstemp(prefix="image_", suffix=f".{output_format}", dir=DEFAULT_CACHE_DIR)
+            with os.fdopen(fd, "wb") as out:
+                # No exif= argument, so nothing from the original's metadata is written
+                if output_format == "jpeg":
+                    img.save(out, "JPEG", quality=quality or QUALITY, optimize=True, progressive=True)
+                else:
+                    img.save(out, "WEBP", quality=quality or QUALITY, method=4)
+    except Exception as e:
+        # Formats Pillow can't decode (e.g. HEIC without a plugin) go up as they are
+        print(f"⚠️ Image preprocessing skipped for {path}: {e}")
+        if out_path and os.path.exists(out_path):
+            os.remove(out_path)
+        return original
+
+    prepared_size = os.path.getsize(out_path)
+    if prepared_size >= size and not resized and not has_exif:
+        # Already small and clean; re-encoding would only add bytes and generation loss
+        os.remove(out_path)
+        return original
+    return PreparedImage(out_path, OUTPUT_MIME[output_format], size, prepared_size, True)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def submit_prepare(path: str, **options) -> Future:
+    """Prepare an image on the shared preprocessing pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="image-prep")
+    return _pool.submit(prepare_image, path, **options)
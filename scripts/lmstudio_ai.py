@@ -1,11 +1,20 @@
 import os
+import time
 import base64
 import json
 import requests
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 from datetime import datetime
 from dotenv import load_dotenv
 from ai_config_manager import config_manager
+from provider_health import health_registry
+from session_store import normalize_history
+from context_window import fit_history
+from prompt_layout import stable_system_prompt, story_text, lmstudio_cache_hints, STORY_OPENING_INSTRUCTIONS, STORY_CONTINUE_INSTRUCTIONS, OPEN_CONVERSATION_INSTRUCTIONS
+from conversation_summary import summary_system_text
+from response_cache import response_cache, make_key, cache_enabled
+from circuit_breaker import breakers, guarded, CircuitOpenError, CallRefusedError
+from http_transport import get_session, get_async_client, httpx, ASYNC_HTTP_ERRORS
 
 # Load environment variables - try multiple paths
 from pathlib import Path
@@ -29,55 +38,95 @@ for env_path in env_paths:
 if not env_loaded:
     print("Warning: No .env.local file found. Using system environment variables.")
 
+# System prompt for website help (nav chat); answers cached by nav_chat_simple depend on it
+WEBSITE_SYSTEM_PROMPT = """You are Sprout, a helpful AI assistant for Memory Garden website. Your role is to help users navigate and use the Memory Garden website effectively.
+
+Memory Garden is a therapeutic space for sharing and cherishing memories with AI assistance.
+
+Key Features:
+- Plant memories with AI assistance
+- View memory garden organized by date 
+- Add photos, videos, and audio to memories
+- Chat about memories with AI
+- Take interactive tour
+- Customize visual styles
+- Test AI features
+
+Navigation Help:
+- Plant Memory: Click '🪴 Plant Your First Memory' on home page, fill title and story, add media (optional), click 'Plant This Memory'
+- View Garden: Click '🌱 View My Garden' on home page or use navigation menu to see all memories organized by date
+- Take Tour: Click '🎬 Take a Tour' on home page for interactive guide
+- Style Config: Click '🎨 Style Configuration' in navigation or visit Updates page
+- AI Testing: Go to Updates page and click '🧪 Testing' button
+- Features: Visit Features page to learn about all capabilities
+
+Technical Information:
+- Built with Next.js, React, and Tailwind CSS
+- UI elements styled with Tailwind classes
+- Code structure: TypeScript with components in app/components/, pages in app/, API routes in app/api/
+- Styling can be customized through style configuration page
+
+Be helpful, friendly, and provide clear step-by-step instructions. Use emojis to make responses engaging. Focus on practical website navigation, usage, and technical questions about the platform."""
+
 class LMStudioAITester:
     def __init__(self, model: str = "local-model"):
         self.model = model
         self.base_url = "http://localhost:1234/v1"
+        self.health_url = f"{self.base_url}/models"
+        self.max_reply_tokens = 500
         self.suppress_debug = os.environ.get('SUPPRESS_DEBUG', 'false').lower() == 'true'
         
         if not self.suppress_debug:
             print(f"LM Studio client initialized with model: {self.model}")
             print(f"Base URL: {self.base_url}")
         
-        # Check if LM Studio is running
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=5)
-            if response.status_code == 200:
-                if not self.suppress_debug:
+        # Check if LM Studio is running (cached across instances by the health registry)
+        status = health_registry.check("lmstudio", self.health_url)
+        if status["alive"]:
+            if not self.suppress_debug:
+                if status["status_code"] == 200:
                     print("✅ LM Studio is running and accessible")
-                    models = response.json()
+                    models = status["data"] or {}
                     print(f"Available models: {[m['id'] for m in models.get('data', [])]}")
-            else:
-                if not self.suppress_debug:
+                else:
                     print("⚠️ LM Studio responded but with unexpected status")
-        except requests.exceptions.RequestException as e:
+        else:
             if not self.suppress_debug:
-                print(f"❌ LM Studio is not running: {e}")
+                print(f"❌ LM Studio is not running: {status['error']}")
                 print("Please install and start LM Studio: https://lmstudio.ai")
                 print("Make sure to enable 'Local Server' in LM Studio settings")
             raise Exception("LM Studio is not running. Please install and start LM Studio first.")
     
-    def process_test_inputs(self, test_title: str, test_description: str, media_files: List[str] = None) -> Dict[str, Any]:
-        """Process test inputs and create context for DeepSeek AI chat"""
+    def process_test_inputs(self, test_title: str, test_description: str, media_files: List[str] = None, fresh: bool = False) -> Dict[str, Any]:
+        """Process test inputs and create context for DeepSeek AI chat; fresh=True skips the response cache"""
         
         # Get personality prompt from configuration
         personality_prompt = config_manager.get_personality_prompt()
         
-        system_prompt = f"""{personality_prompt}
-
-You're having a natural conversation with someone who shared a story with you.
-
-Story: {test_title} - {test_description}
-
-Be genuinely curious, warm, and conversational. Ask natural questions and respond as a caring friend would. Avoid therapeutic jargon or structured responses."""
+        # Static instructions first so the backend can reuse their cached prefix
+        system_prompt = stable_system_prompt(
+            [personality_prompt, STORY_OPENING_INSTRUCTIONS],
+            [story_text(test_title, test_description)]
+        )
         
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"I want to share a memory with you. The title is '{test_title}' and here's what happened: {test_description}"}
         ]
         
+        # The prompt is fully determined by the inputs, so replays can reuse a stored reply
+        use_cache = cache_enabled() and not fresh
+        payload = self._chat_payload(messages)
+        cache_key = make_key("lmstudio", self.model, messages, {"max_tokens": payload["max_tokens"], "temperature": payload["temperature"]})
+        cached = response_cache.get(cache_key) if use_cache else None
+        
         try:
-            response = self.call_lmstudio_api(messages)
+            if cached is None:
+                ai_response = self.call_lmstudio_api(messages).get("content", "")
+                if use_cache and ai_response:
+                    response_cache.put(cache_key, ai_response)
+            else:
+                ai_response = cached
             return {
                 "success": True,
                 "context": {
@@ -85,18 +134,20 @@ Be genuinely curious, warm, and conversational. Ask natural questions and respon
                     "test_description": test_description,
                     "timestamp": datetime.now().isoformat()
                 },
-                "ai_response": response.get("content", "")
+                "ai_response": ai_response,
+                "cached": cached is not None
             }
         except Exception as e:
             print(f"Error in process_test_inputs: {e}")
             print(f"Error type: {type(e)}")
             # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("fallback")
+            fallback_template = config_manager.get_custom_response("fallback")
+            fallback_response = fallback_template
             if "{test_title}" in fallback_response:
                 fallback_response = fallback_response.replace("{test_title}", test_title)
             
             # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("fallback"):
+            if fallback_response == fallback_template:
                 fallback_response = f"""That's a really interesting story about {test_title}. 🌱
 
 What made you want to share this with me? I'd love to hear more about what this memory means to you."""
@@ -112,43 +163,62 @@ What made you want to share this with me? I'd love to hear more about what this
                 "fallback_mode": True
             }
     
+    def _chat_payload(self, messages: List[Dict]) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_reply_tokens,
+            "temperature": 0.7,
+            "stream": False
+        }
+        # Ask the server to keep and reuse the cached prompt prefix
+        payload.update(lmstudio_cache_hints())
+        return payload
+    
+    def _handle_chat_response(self, response) -> Dict[str, Any]:
+        """Turn a requests/httpx response from LM Studio into an assistant message"""
+        if response.status_code == 200:
+            response_data = response.json()
+            if not self.suppress_debug:
+                print(f"✅ LM Studio response received successfully")
+                print(f"Response content: {response_data['choices'][0]['message']['content']}")
+            
+            return {
+                "role": "assistant",
+                "content": response_data['choices'][0]['message']['content']
+            }
+        else:
+            error_text = response.text if response.text else "No error details"
+            if not self.suppress_debug:
+                print(f"❌ LM Studio API error: {response.status_code} - {error_text}")
+            raise Exception(f"LM Studio API error: {response.status_code} - {error_text}")
+    
+    def _require_alive(self) -> None:
+        # The registry is refreshed by failed calls and background probes, so a
+        # backend that went down after construction is refused without a request.
+        # Refusals aren't breaker failures; the failed call that marked it dead was
+        if not health_registry.is_alive("lmstudio", self.health_url):
+            raise CallRefusedError("LM Studio is not running. Please install and start LM Studio first.")
+    
+    @guarded("lmstudio")
     def call_lmstudio_api(self, messages: List[Dict]) -> Dict[str, Any]:
         """Make API call to LM Studio using OpenAI-compatible API"""
         if not self.suppress_debug:
             print(f"Making API call to LM Studio with messages: {messages}")
+        self._require_alive()
         
         try:
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": 500,
-                "temperature": 0.7,
-                "stream": False
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                json=payload,
+            url = f"{self.base_url}/chat/completions"
+            response = get_session(url).post(
+                url,
+                json=self._chat_payload(messages),
                 timeout=60
             )
-            
-            if response.status_code == 200:
-                response_data = response.json()
-                if not self.suppress_debug:
-                    print(f"✅ LM Studio response received successfully")
-                    print(f"Response content: {response_data['choices'][0]['message']['content']}")
-                
-                return {
-                    "role": "assistant",
-                    "content": response_data['choices'][0]['message']['content']
-                }
-            else:
-                error_text = response.text if response.text else "No error details"
-                if not self.suppress_debug:
-                    print(f"❌ LM Studio API error: {response.status_code} - {error_text}")
-                raise Exception(f"LM Studio API error: {response.status_code} - {error_text}")
+            return self._handle_chat_response(response)
                 
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                health_registry.mark_dead("lmstudio", self.health_url, str(e))
             if not self.suppress_debug:
                 print(f"❌ Network error: {e}")
             raise Exception(f"Network error: {e}")
@@ -157,8 +227,87 @@ What made you want to share this with me? I'd love to hear more about what this
                 print(f"❌ General error: {e}")
             raise
     
-    def continue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None) -> Dict[str, Any]:
-        """Continue an existing conversation with LM Studio"""
+    @guarded("lmstudio")
+    async def acall_lmstudio_api(self, messages: List[Dict]) -> Dict[str, Any]:
+        """Async variant of call_lmstudio_api"""
+        if not self.suppress_debug:
+            print(f"Making async API call to LM Studio with messages: {messages}")
+        self._require_alive()
+        
+        try:
+            url = f"{self.base_url}/chat/completions"
+            response = await get_async_client(url).post(
+                url,
+                json=self._chat_payload(messages),
+                timeout=60
+            )
+            return self._handle_chat_response(response)
+                
+        except ASYNC_HTTP_ERRORS as e:
+            if isinstance(e, httpx.ConnectError):
+                health_registry.mark_dead("lmstudio", self.health_url, str(e))
+            if not self.suppress_debug:
+                print(f"❌ Network error: {e}")
+            raise Exception(f"Network error: {e}")
+    
+    def stream_lmstudio_api(self, messages: List[Dict]) -> Iterator[str]:
+        """Yield completion text from LM Studio as tokens are generated (SSE)"""
+        payload = self._chat_payload(messages)
+        payload["stream"] = True
+        self._require_alive()
+        
+        breaker = breakers.get("lmstudio")
+        if not breaker.allow_request():
+            raise CircuitOpenError("lmstudio")
+        start = time.monotonic()
+        recorded = False
+        
+        try:
+            url = f"{self.base_url}/chat/completions"
+            with get_session(url).post(url, json=payload, stream=True, timeout=60) as response:
+                if response.status_code != 200:
+                    error_text = response.text if response.text else "No error details"
+                    raise Exception(f"LM Studio API error: {response.status_code} - {error_text}")
+                
+                response.encoding = 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        if not recorded:
+                            # Streams are judged on time to first token
+                            breaker.record_success(time.monotonic() - start)
+                            recorded = True
+                        yield content
+                
+        except requests.exceptions.RequestException as e:
+            if not recorded:
+                breaker.record_failure(time.monotonic() - start, str(e))
+                recorded = True
+            if isinstance(e, requests.exceptions.ConnectionError):
+                health_registry.mark_dead("lmstudio", self.health_url, str(e))
+            raise Exception(f"Network error: {e}")
+        except Exception as e:
+            if not recorded:
+                breaker.record_failure(time.monotonic() - start, str(e))
+                recorded = True
+            raise
+        else:
+            if not recorded:
+                breaker.record_success(time.monotonic() - start)
+                recorded = True
+        finally:
+            if not recorded:
+                # Closed before the first chunk: no verdict, so free the trial call
+                breaker.release()
+    
+    def build_conversation_messages(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None, history_normalized: bool = False, conversation_summary: str = None) -> List[Dict]:
+        """Build the system prompt, cleaned history and new user message for a chat turn"""
         
         messages = []
         
@@ -168,85 +317,31 @@ What made you want to share this with me? I'd love to hear more about what this
         # Check if this is a website assistance request
         if test_context and test_context.get('website_name') == 'Memory Garden':
             # Website assistance mode
-            system_prompt = f"""You are Sprout, a helpful AI assistant for Memory Garden website. Your role is to help users navigate and use the Memory Garden website effectively.
-
-Memory Garden is a therapeutic space for sharing and cherishing memories with AI assistance.
-
-Key Features:
-- Plant memories with AI assistance
-- View memory garden organized by date 
-- Add photos, videos, and audio to memories
-- Chat about memories with AI
-- Take interactive tour
-- Customize visual styles
-- Test AI features
-
-Navigation Help:
-- Plant Memory: Click '🪴 Plant Your First Memory' on home page, fill title and story, add media (optional), click 'Plant This Memory'
-- View Garden: Click '🌱 View My Garden' on home page or use navigation menu to see all memories organized by date
-- Take Tour: Click '🎬 Take a Tour' on home page for interactive guide
-- Style Config: Click '🎨 Style Configuration' in navigation or visit Updates page
-- AI Testing: Go to Updates page and click '🧪 Testing' button
-- Features: Visit Features page to learn about all capabilities
-
-Technical Information:
-- Built with Next.js, React, and Tailwind CSS
-- UI elements styled with Tailwind classes
-- Code structure: TypeScript with components in app/components/, pages in app/, API routes in app/api/
-- Styling can be customized through style configuration page
-
-Be helpful, friendly, and provide clear step-by-step instructions. Use emojis to make responses engaging. Focus on practical website navigation, usage, and technical questions about the platform."""
+            system_prompt = WEBSITE_SYSTEM_PROMPT
         else:
             # Therapeutic conversation mode
             if test_context:
-                system_prompt = f"""{personality_prompt}
-
-You're continuing a natural conversation with someone who shared a story with you.
-
-Story: {test_context.get('test_title', 'N/A')} - {test_context.get('test_description', 'N/A')}
-
-Be genuinely curious, warm, and conversational. Respond naturally as a caring friend would."""
+                system_prompt = stable_system_prompt(
+                    [personality_prompt, STORY_CONTINUE_INSTRUCTIONS],
+                    [story_text(test_context.get('test_title', 'N/A'), test_context.get('test_description', 'N/A'))]
+                )
             else:
-                system_prompt = f"""{personality_prompt}
-
-You're having a natural conversation. Be genuinely curious and warm. Respond as a caring friend would."""
+                system_prompt = stable_system_prompt([personality_prompt, OPEN_CONVERSATION_INSTRUCTIONS])
+        
+        # Turns older than the history window live on as a rolling summary
+        system_prompt += summary_system_text(conversation_summary)
         
         messages.append({
             "role": "system",
             "content": system_prompt
         })
         
-        # Add conversation history, ensuring proper alternating format
+        # Add conversation history, ensuring proper alternating format; session
+        # histories were normalized when they were stored
         if conversation_history:
-            # Filter and validate conversation history to ensure proper alternating format
-            valid_messages = []
-            for msg in conversation_history:
-                role = msg.get("role", "user")
-                content = msg.get("content", "")
-                
-                # Only add messages with valid roles and content
-                if role in ["user", "assistant"] and content.strip():
-                    valid_messages.append({
-                        "role": role,
-                        "content": content
-                    })
-            
-            # Ensure alternating pattern: user -> assistant -> user -> assistant
-            formatted_messages = []
-            for i, msg in enumerate(valid_messages):
-                if i == 0 and msg["role"] != "user":
-                    # If first message is not from user, skip it
-                    continue
-                elif i > 0 and len(formatted_messages) > 0:
-                    # Check if this message alternates properly with the previous one
-                    prev_role = formatted_messages[-1]["role"]
-                    if msg["role"] == prev_role:
-                        # Skip duplicate roles to maintain alternating pattern
-                        continue
-                
-                formatted_messages.append(msg)
-            
-            messages.extend(formatted_messages)
+            history = conversation_history if history_normalized else normalize_history(conversation_history)
+            # Keep only the most recent turns that fit the model's context budget
+            messages.extend(fit_history(history, "lmstudio", [system_prompt, user_message], self.max_reply_tokens))
         
         # Add current user message
         messages.append({
@@ -254,6 +349,39 @@ You're having a natural conversation. Be genuinely curious and warm. Respond as
             "content": user_message
         })
         
+        return messages
+    
+    def _conversation_fallback(self, user_message: str, test_context: Dict = None) -> Dict[str, Any]:
+        """Configured reflection response used when LM Studio can't answer"""
+        # Get custom fallback response from configuration
+        fallback_template = config_manager.get_custom_response("reflection")
+        fallback_response = fallback_template
+        if "{user_message}" in fallback_response:
+            fallback_response = fallback_response.replace("{user_message}", user_message)
+        
+        # Add personalized touch if response is too generic
+        if fallback_response == fallback_template:
+            # Include context if available
+            context_reference = ""
+            if test_context and test_context.get('test_title'):
+                context_reference = f" I remember you shared about '{test_context.get('test_title')}' earlier. "
+            
+            fallback_response = f"""That's really interesting{context_reference}
+
+What's on your mind about that? I'm curious to hear more."""
+        
+        return {
+            "success": True,  # Mark as success to show the fallback response
+            "ai_response": fallback_response,
+            "timestamp": datetime.now().isoformat(),
+            "fallback_mode": True
+        }
+    
+    def continue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None, history_normalized: bool = False, conversation_summary: str = None) -> Dict[str, Any]:
+        """Continue an existing conversation with LM Studio"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context, history_normalized, conversation_summary)
+        
         try:
             response = self.call_lmstudio_api(messages)
             return {
@@ -264,28 +392,45 @@ You're having a natural conversation. Be genuinely curious and warm. Respond as
         except Exception as e:
             print(f"Error in continue_conversation: {e}")
             print(f"Error type: {type(e)}")
-            # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("reflection")
-            if "{user_message}" in fallback_response:
-                fallback_response = fallback_response.replace("{user_message}", user_message)
-            
-            # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("reflection"):
-                # Include context if available
-                context_reference = ""
-                if test_context and test_context.get('test_title'):
-                    context_reference = f" I remember you shared about '{test_context.get('test_title')}' earlier. "
-                
-                fallback_response = f"""That's really interesting{context_reference}
-
-What's on your mind about that? I'm curious to hear more."""
-            
+            return self._conversation_fallback(user_message, test_context)
+    
+    async def acontinue_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None, history_normalized: bool = False, conversation_summary: str = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context, history_normalized, conversation_summary)
+        
+        try:
+            response = await self.acall_lmstudio_api(messages)
             return {
-                "success": True,  # Mark as success to show the fallback response
-                "ai_response": fallback_response,
-                "timestamp": datetime.now().isoformat(),
-                "fallback_mode": True
+                "success": True,
+                "ai_response": response.get("content", ""),
+                "timestamp": datetime.now().isoformat()
             }
+        except Exception as e:
+            print(f"Error in acontinue_conversation: {e}")
+            return self._conversation_fallback(user_message, test_context)
+    
+    def stream_conversation(self, user_message: str, conversation_history: List[Dict] = None, test_context: Dict = None, history_normalized: bool = False, conversation_summary: str = None) -> Iterator[Dict[str, Any]]:
+        """Continue a conversation, yielding {"type": "chunk"} events then one {"type": "complete"}"""
+        
+        messages = self.build_conversation_messages(user_message, conversation_history, test_context, history_normalized, conversation_summary)
+        
+        full_response = ""
+        try:
+            for content in self.stream_lmstudio_api(messages):
+                full_response += content
+                yield {"type": "chunk", "content": content}
+        except Exception as e:
+            print(f"Error in stream_conversation: {e}")
+            if full_response:
+                # Part of the answer is already on screen; don't append a canned reply
+                yield {"type": "error", "error": str(e)}
+                return
+            fallback = self._conversation_fallback(user_message, test_context)
+            yield {"type": "complete", "content": fallback["ai_response"], "fallback_mode": True}
+            return
+        
+        yield {"type": "complete", "content": full_response}
 
 def process_memory_garden_test(test_title: str, test_description: str, api_key: str = None) -> Dict[str, Any]:
     """Main function to process Memory Garden test inputs"""
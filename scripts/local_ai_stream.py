@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Streaming chat script for local models (LM Studio or Ollama)
+Emits the same {"type": "chunk"} / {"type": "complete"} NDJSON lines as google_ai_stream.py
+"""
+
+import os
+import sys
+import json
+
+# Suppress debug output so stdout only carries stream events
+os.environ['SUPPRESS_DEBUG'] = 'true'
+
+# Add the scripts directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# Stream events are written here; everything else printed goes to stderr
+protocol_out = sys.stdout
+
+def emit(event):
+    protocol_out.write(json.dumps(event) + "\n")
+    protocol_out.flush()
+
+def main():
+    """Main function to stream a local model reply"""
+    if len(sys.argv) < 4 or sys.argv[1] not in ('lmstudio', 'ollama'):
+        emit({
+            "type": "error",
+            "error": "Usage: python3 local_ai_stream.py <lmstudio|ollama> <message> <conversationHistory> [testContext]"
+        })
+        sys.exit(1)
+    
+    provider = sys.argv[1]
+    message = sys.argv[2]
+    
+    try:
+        conversation_history = json.loads(sys.argv[3]) if sys.argv[3] != 'null' else []
+        test_context = json.loads(sys.argv[4]) if len(sys.argv) > 4 and sys.argv[4] != 'null' else None
+    except json.JSONDecodeError:
+        emit({
+            "type": "error",
+            "error": "Invalid conversation history or test context JSON"
+        })
+        sys.exit(1)
+    
+    # Provider modules print start-up diagnostics; keep them off the event stream
+    sys.stdout = sys.stderr
+    try:
+        if provider == 'lmstudio':
+            from lmstudio_ai import LMStudioAITester
+            ai = LMStudioAITester()
+        else:
+            from deepseek_ai import OllamaAITester
+            ai = OllamaAITester()
+        events = ai.stream_conversation(message, conversation_history, test_context)
+    except Exception as e:
+        emit({
+            "type": "error",
+            "error": f"Failed to initialize {provider}: {str(e)}"
+        })
+        sys.exit(1)
+    
+    for event in events:
+        emit(event)
+
+if __name__ == "__main__":
+    main()
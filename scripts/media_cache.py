@@ -0,0 +1,134 @@
+"""
+Content-addressed cache for media analysis results
+Files are identified by a BLAKE2b digest of their bytes, hashed through an
+mmap in large slices, so the same photo or video is recognised under any
+name or path. Digests are remembered per (path, size, mtime, inode), so an
+unchanged file is never hashed twice. Results live in SQLite keyed by
+digest, model, prompt template version and media kind, and are checked
+before any preprocessing or upload happens.
+"""
+
+import os
+import json
+import mmap
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from typing import Dict, Any, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+# Bytes handed to the hash per update; hashlib drops the GIL for large buffers
+HASH_SLICE = 16 * 1024 * 1024
+DEFAULT_TTL = float(os.environ.get('AI_MEDIA_CACHE_TTL', str(30 * 24 * 3600)))
+
+def media_cache_enabled() -> bool:
+    return os.environ.get('AI_MEDIA_CACHE', 'true').lower() == 'true'
+
+def file_digest(path: str) -> str:
+    """BLAKE2b-256 hex digest of a file's contents"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as media_file:
+        size = os.fstat(media_file.fileno()).st_size
+        if size == 0:
+            # Empty files can't be mapped
+            return digest.hexdigest()
+        with mmap.mmap(media_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mapped, "madvise"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            view = memoryview(mapped)
+            try:
+                for offset in range(0, size, HASH_SLICE):
+                    digest.update(view[offset:offset + HASH_SLICE])
+            finally:
+                view.release()
+    return digest.hexdigest()
+
+class MediaAnalysisCache:
+    def __init__(self, db_path: str = None, ttl: float = None):
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, 'media_analysis.sqlite3')
+        self.ttl = ttl if ttl is not None else DEFAULT_TTL
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps this safe across threads and forks
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_digests (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    digest TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_analysis (
+                    cache_key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def digest(self, path: str) -> str:
+        """Content digest of a file, rehashing only when its stat signature changed"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT size, mtime_ns, inode, digest FROM file_digests WHERE path = ?", (path,)
+                ).fetchone()
+        except sqlite3.Error:
+            row = None
+        if row is not None and tuple(row[:3]) == signature:
+            return row[3]
+
+        digest = file_digest(path)
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, inode, digest) VALUES (?, ?, ?, ?, ?)",
+                    (path, *signature, digest)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not record digest for {path}: {e}")
+        return digest
+
+    def make_key(self, path: str, model: str, prompt_version: str, kind: str) -> str:
+        # Only context-free analyses are cached, so the same file hits for every caller
+        return f"{self.digest(path)}:{model}:{prompt_version}:{kind}"
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Stored analysis result for a key, if unexpired"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT result FROM media_analysis WHERE cache_key = ? AND created_at > ?",
+                    (cache_key, time.time() - self.ttl)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, cache_key: str, result: Dict[str, Any]) -> None:
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO media_analysis (cache_key, result, created_at) VALUES (?, ?, ?)",
+                    (cache_key, json.dumps(result), time.time())
+                )
+                conn.execute("DELETE FROM media_analysis WHERE created_at <= ?", (time.time() - self.ttl,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not cache media analysis: {e}")
+
+# Global media analysis cache instance
+media_cache = MediaAnalysisCache()
@@ -0,0 +1,276 @@
+"""
+Bounded-memory media transport for Gemini multimodal requests
+Small files are sent inline: the request body is streamed, base64-encoding
+the file in fixed-size chunks as it is written to the socket, so the file
+is never held in memory whole. Files above the inline limit go through the
+Gemini Files API with a resumable, chunked upload; the resulting file handle
+is cached in SQLite until shortly before it expires, so re-analysing the same
+memory skips the upload. Code running inside media_deadline() has every
+request (and ffmpeg run) shortened to the time left, so a caller's deadline
+ends the work instead of leaving it running in the background.
+"""
+
+import os
+import json
+import time
+import base64
+import sqlite3
+import contextvars
+from contextlib import closing, contextmanager
+from typing import Dict, Any, List, Iterator, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+from http_transport import get_session
+
+API_BASE = "https://generativelanguage.googleapis.com"
+
+# Raw bytes read per inline chunk; a multiple of 3 so chunks encode without padding
+INLINE_CHUNK_BYTES = 3 * 256 * 1024
+# Gemini caps inline requests at 20MB, which base64 reaches at about 15MB of file
+INLINE_MAX_BYTES = int(os.environ.get('AI_INLINE_MEDIA_MAX_BYTES', str(15 * 1024 * 1024)))
+# Resumable upload chunks must be multiples of 256KiB
+UPLOAD_CHUNK_BYTES = max(1, int(os.environ.get('AI_UPLOAD_CHUNK_MB', '8'))) * 1024 * 1024
+UPLOAD_RETRIES = 3
+# Uploaded files live for 48 hours; stop reusing a handle an hour before that
+FILE_TTL = 47 * 3600
+PROCESSING_TIMEOUT = float(os.environ.get('AI_UPLOAD_PROCESSING_TIMEOUT', '300'))
+
+# Monotonic time by which the current media analysis must finish, if any;
+# asyncio.to_thread copies it into worker threads along with the context
+_deadline = contextvars.ContextVar("media_deadline", default=None)
+
+@contextmanager
+def media_deadline(seconds: float):
+    """Bound every media request made inside the block to finish within seconds"""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def bounded_timeout(default: float) -> float:
+    """A request timeout cut down to the time left before the current deadline"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Media analysis deadline passed")
+    return min(default, remaining)
+
+def iter_base64_file(path: str, chunk_size: int = INLINE_CHUNK_BYTES) -> Iterator[bytes]:
+    """Base64 of a file, produced one chunk at a time"""
+    with open(path, "rb") as media_file:
+        while True:
+            chunk = media_file.read(chunk_size)
+            if not chunk:
+                return
+            yield base64.b64encode(chunk)
+
+class InlineMediaBody:
+    """generateContent request body whose media parts are streamed in as inline_data"""
+
+    def __init__(self, parts: List[Dict[str, Any]]):
+        # Parts are {"text"}, {"path", "mime_type"} (inlined) or {"file_uri", "mime_type"}
+        self._pieces = []
+        self._length = 0
+        opening = '{"contents": [{"parts": ['
+        for index, part in enumerate(parts):
+            separator = ", " if index else ""
+            if "path" in part:
+                self._add((opening + separator + '{"inline_data": {"mime_type": ' + json.dumps(part["mime_type"]) + ', "data": "').encode())
+                size = os.path.getsize(part["path"])
+                self._pieces.append(part["path"])
+                self._length += 4 * ((size + 2) // 3)
+                opening = '"}}'
+            elif "file_uri" in part:
+                self._add((opening + separator + json.dumps({"file_data": {"mime_type": part["mime_type"], "file_uri": part["file_uri"]}})).encode())
+                opening = ""
+            else:
+                self._add((opening + separator + json.dumps({"text": part["text"]})).encode())
+                opening = ""
+        self._add((opening + ']}]}').encode())
+
+    def _add(self, data: bytes) -> None:
+        self._pieces.append(data)
+        self._length += len(data)
+
+    def __len__(self) -> int:
+        # Known up front, so the request goes out with a Content-Length instead of chunked encoding
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        for piece in self._pieces:
+            if isinstance(piece, bytes):
+                yield piece
+            else:
+                yield from iter_base64_file(piece)
+
+def response_text(data: Dict[str, Any]) -> str:
+    """Concatenated text parts of a generateContent response"""
+    candidates = data.get("candidates") or []
+    if not candidates:
+        raise Exception(f"No candidates in response: {data.get('promptFeedback', data)}")
+    parts = candidates[0].get("content", {}).get("parts", [])
+    return "".join(part.get("text", "") for part in parts)
+
+def generate_with_parts(api_key: str, model: str, parts: List[Dict[str, Any]]) -> str:
+    """Run generateContent on text and media parts, streaming inline media from disk"""
+    url = f"{API_BASE}/v1beta/models/{model}:generateContent"
+    response = get_session(url).post(
+        url,
+        data=InlineMediaBody(parts),
+        headers={"x-goog-api-key": api_key, "Content-Type": "application/json"},
+        timeout=bounded_timeout(300)
+    )
+    if response.status_code != 200:
+        raise Exception(f"Google AI API error: {response.status_code} - {response.text}")
+    return response_text(response.json())
+
+def generate_with_inline_media(api_key: str, model: str, path: str, mime_type: str, prompt: str) -> str:
+    """Run generateContent on a prompt plus one inline media file"""
+    return generate_with_parts(api_key, model, [{"text": prompt}, {"path": path, "mime_type": mime_type}])
+
+class GeminiFileUploader:
+    def __init__(self, api_key: str, db_path: str = None):
+        self.api_key = api_key
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, 'media_uploads.sqlite3')
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps this safe across threads and forks
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_uploads (
+                    file_key TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    uri TEXT NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _file_key(self, path: str, mime_type: str) -> str:
+        # Editing or replacing the file changes its size or mtime
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}:{mime_type}"
+
+    def cached(self, path: str, mime_type: str) -> Optional[Dict[str, Any]]:
+        """Unexpired handle for an earlier upload of this file, if any"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT name, uri, mime_type FROM media_uploads WHERE file_key = ? AND expires_at > ?",
+                    (self._file_key(path, mime_type), time.time())
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return {"name": row[0], "uri": row[1], "mime_type": row[2]}
+
+    def upload(self, path: str, mime_type: str) -> Dict[str, Any]:
+        """Return {"name", "uri", "mime_type"} for a file, uploading it only when needed"""
+        handle = self.cached(path, mime_type)
+        if handle is not None:
+            return handle
+
+        file_key = self._file_key(path, mime_type)
+        upload_url = self._start_upload(path, mime_type)
+        info = self._send_chunks(upload_url, path)
+        info = self._wait_until_active(info)
+        handle = {"name": info["name"], "uri": info["uri"], "mime_type": info.get("mimeType", mime_type)}
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO media_uploads (file_key, name, uri, mime_type, expires_at) VALUES (?, ?, ?, ?, ?)",
+                    (file_key, handle["name"], handle["uri"], handle["mime_type"], time.time() + FILE_TTL)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not cache upload handle for {path}: {e}")
+        return handle
+
+    def _start_upload(self, path: str, mime_type: str) -> str:
+        url = f"{API_BASE}/upload/v1beta/files"
+        response = get_session(url).post(
+            url,
+            headers={
+                "x-goog-api-key": self.api_key,
+                "X-Goog-Upload-Protocol": "resumable",
+                "X-Goog-Upload-Command": "start",
+                "X-Goog-Upload-Header-Content-Length": str(os.path.getsize(path)),
+                "X-Goog-Upload-Header-Content-Type": mime_type,
+                "Content-Type": "application/json"
+            },
+            json={"file": {"display_name": os.path.basename(path)}},
+            timeout=bounded_timeout(30)
+        )
+        upload_url = response.headers.get("X-Goog-Upload-URL")
+        if response.status_code != 200 or not upload_url:
+            raise Exception(f"Upload start failed: {response.status_code} - {response.text}")
+        return upload_url
+
+    def _received_bytes(self, upload_url: str) -> int:
+        # Ask the server how much of an interrupted upload it kept
+        response = get_session(upload_url).post(
+            upload_url,
+            headers={"X-Goog-Upload-Command": "query"},
+            timeout=bounded_timeout(30)
+        )
+        return int(response.headers.get("X-Goog-Upload-Size-Received", "0"))
+
+    def _send_chunks(self, upload_url: str, path: str) -> Dict[str, Any]:
+        size = os.path.getsize(path)
+        offset = 0
+        failures = 0
+        with open(path, "rb") as media_file:
+            while True:
+                media_file.seek(offset)
+                chunk = media_file.read(UPLOAD_CHUNK_BYTES)
+                last = offset + len(chunk) >= size
+                try:
+                    response = get_session(upload_url).post(
+                        upload_url,
+                        data=chunk,
+                        headers={
+                            "X-Goog-Upload-Command": "upload, finalize" if last else "upload",
+                            "X-Goog-Upload-Offset": str(offset)
+                        },
+                        timeout=bounded_timeout(120)
+                    )
+                    if response.status_code != 200:
+                        raise Exception(f"{response.status_code} - {response.text}")
+                except Exception as e:
+                    failures += 1
+                    if failures > UPLOAD_RETRIES:
+                        raise Exception(f"Upload failed at byte {offset}: {e}")
+                    time.sleep(bounded_timeout(2 ** failures))
+                    # Resume from what the server actually has
+                    offset = self._received_bytes(upload_url)
+                    continue
+                if last:
+                    return response.json()["file"]
+                offset += len(chunk)
+                failures = 0
+
+    def _wait_until_active(self, info: Dict[str, Any]) -> Dict[str, Any]:
+        # Videos are processed after upload and can't be referenced until ACTIVE
+        deadline = time.monotonic() + bounded_timeout(PROCESSING_TIMEOUT)
+        url = f"{API_BASE}/v1beta/{info['name']}"
+        while info.get("state") == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise Exception(f"Timed out waiting for {info['name']} to finish processing")
+            time.sleep(bounded_timeout(2))
+            response = get_session(url).get(url, headers={"x-goog-api-key": self.api_key}, timeout=bounded_timeout(30))
+            if response.status_code != 200:
+                raise Exception(f"File status check failed: {response.status_code} - {response.text}")
+            info = response.json()
+        if info.get("state") == "FAILED":
+            raise Exception(f"Processing of {info['name']} failed: {info.get('error')}")
+        return info
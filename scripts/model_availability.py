@@ -0,0 +1,105 @@
+"""
+On-disk availability table for Hugging Face inference models
+Shared across processes through SQLite so the model cascade can skip models
+that are known to be missing (404/403) or still loading (503)
+"""
+
+import os
+import time
+import sqlite3
+from contextlib import closing
+from typing import Dict, Any, List, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+# Seconds a status keeps a model out of the cascade
+NEGATIVE_TTLS = {
+    403: float(os.environ.get('HUGGINGFACE_FORBIDDEN_TTL', '86400')),
+    404: float(os.environ.get('HUGGINGFACE_NOT_FOUND_TTL', '86400')),
+    503: float(os.environ.get('HUGGINGFACE_LOADING_TTL', '60')),
+}
+
+class ModelAvailabilityStore:
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, 'model_availability.sqlite3')
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        # A short-lived connection per call keeps this safe across threads and forks
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS model_availability (
+                    model TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    available INTEGER NOT NULL,
+                    expires_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def record(self, model: str, status_code: int) -> None:
+        """Record the HTTP status a model last answered with"""
+        now = time.time()
+        available = status_code == 200
+        ttl = NEGATIVE_TTLS.get(status_code)
+        expires_at = now + ttl if ttl is not None else None
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO model_availability (model, status, available, expires_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (model, status_code, int(available), expires_at, now)
+                )
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not record availability for {model}: {e}")
+
+    def get(self, model: str) -> Optional[Dict[str, Any]]:
+        """Return the stored entry for a model, if any"""
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT status, available, expires_at, updated_at FROM model_availability WHERE model = ?",
+                    (model,)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        return {
+            "model": model,
+            "status": row[0],
+            "available": bool(row[1]),
+            "expires_at": row[2],
+            "updated_at": row[3]
+        }
+
+    def is_available(self, model: str) -> bool:
+        """False only while an unexpired negative entry exists"""
+        return bool(self.filter_available([model]))
+
+    def filter_available(self, models: List[str]) -> List[str]:
+        """Drop models with an unexpired negative entry, keeping the input order"""
+        if not models:
+            return []
+        placeholders = ",".join("?" for _ in models)
+        try:
+            with closing(self._connect()) as conn, conn:
+                rows = conn.execute(
+                    f"SELECT model FROM model_availability WHERE model IN ({placeholders}) "
+                    "AND available = 0 AND expires_at > ?",
+                    (*models, time.time())
+                ).fetchall()
+        except sqlite3.Error:
+            # The cache is an optimization; never let it block the cascade
+            return list(models)
+        dead = {row[0] for row in rows}
+        return [model for model in models if model not in dead]
+
+# Global availability store instance
+availability_store = ModelAvailabilityStore()
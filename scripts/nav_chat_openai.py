@@ -11,7 +11,9 @@ from datetime import datetime
 # Add the scripts directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from openai_ai import OpenAIAI
+from openai_ai import OpenAIAI, WEBSITE_SYSTEM_PROMPT
+from website_context import WEBSITE_CONTEXT
+from semantic_cache import SemanticCache, semantic_cache_enabled
 
 def main():
     """Main function to process navigation chat"""
@@ -36,6 +38,19 @@ def main():
         }))
         sys.exit(1)
     
+    # First-turn help questions repeat a lot; serve repeats from the cache
+    nav_cache = SemanticCache("openai", WEBSITE_CONTEXT, WEBSITE_SYSTEM_PROMPT) if semantic_cache_enabled() and not conversation_history else None
+    cached = nav_cache.lookup(message) if nav_cache else None
+    if cached:
+        print(json.dumps({
+            "success": True,
+            "response": cached["answer"],
+            "message": message,
+            "timestamp": datetime.now().isoformat(),
+            "cached": True
+        }))
+        return
+    
     # Initialize OpenAI AI
     ai = OpenAIAI()
     
@@ -43,9 +58,13 @@ def main():
     result = ai.continue_conversation(
         message, 
         conversation_history,
-        {"website_name": "Memory Garden"}
+        WEBSITE_CONTEXT
     )
     
+    # Canned fallback replies (marked with a note) are not worth caching
+    if nav_cache and result.get("success") and "note" not in result:
+        nav_cache.store(message, result["response"])
+    
     # Print only the JSON result (no debug output)
     print(json.dumps(result))
 
@@ -3,7 +3,9 @@ import sys
 import json
 import os
 from datetime import datetime
-from lmstudio_ai import LMStudioAITester
+from lmstudio_ai import LMStudioAITester, WEBSITE_SYSTEM_PROMPT
+from website_context import WEBSITE_CONTEXT
+from semantic_cache import SemanticCache, semantic_cache_enabled
 
 # Suppress debug output
 os.environ['SUPPRESS_DEBUG'] = 'true'
@@ -23,46 +25,32 @@ def main():
             print(json.dumps({"error": "Invalid conversation history format"}))
             return
 
+    # First-turn help questions repeat a lot; serve repeats from the cache
+    nav_cache = SemanticCache("lmstudio", WEBSITE_CONTEXT, WEBSITE_SYSTEM_PROMPT) if semantic_cache_enabled() and not conversation_history else None
+    cached = nav_cache.lookup(message) if nav_cache else None
+    if cached:
+        print(json.dumps({
+            "success": True,
+            "ai_response": cached["answer"],
+            "timestamp": datetime.now().isoformat(),
+            "cached": True
+        }))
+        return
+
     try:
         # Initialize AI tester
         ai_tester = LMStudioAITester()
         
-        # Create website assistance context
-        website_context = {
-            "website_name": "Memory Garden",
-            "purpose": "A therapeutic space for sharing and cherishing memories with AI assistance",
-            "main_features": [
-                "Plant memories with AI assistance",
-                "View memory garden organized by date", 
-                "Add photos, videos, and audio to memories",
-                "Chat about memories with AI",
-                "Take interactive tour",
-                "Customize visual styles",
-                "Test AI features"
-            ],
-            "navigation_help": {
-                "plant_memory": "Click '🪴 Plant Your First Memory' on home page, fill title and story, add media (optional), click 'Plant This Memory'",
-                "view_garden": "Click '🌱 View My Garden' on home page or use navigation menu to see all memories organized by date",
-                "take_tour": "Click '🎬 Take a Tour' on home page for interactive guide",
-                "style_config": "Click '🎨 Style Configuration' in navigation or visit Updates page",
-                "ai_testing": "Go to Updates page and click '🧪 Testing' button",
-                "features": "Visit Features page to learn about all capabilities"
-            },
-            "technical_info": {
-                "ui_elements": "Memory Garden is built with Next.js, React, and Tailwind CSS. UI elements are styled with Tailwind classes and can be customized through the style configuration.",
-                "code_structure": "The codebase uses TypeScript with components in app/components/, pages in app/, and API routes in app/api/",
-                "styling": "Styles are managed through Tailwind CSS classes and can be customized via the style configuration page"
-            }
-        }
-
         # Get AI response
         result = ai_tester.continue_conversation(
             user_message=message,
             conversation_history=conversation_history,
-            test_context=website_context
+            test_context=WEBSITE_CONTEXT
         )
 
         if result.get('success'):
+            if nav_cache and not result.get('fallback_mode'):
+                nav_cache.store(message, result.get('ai_response', ''))
             print(json.dumps({
                 "success": True,
                 "ai_response": result.get('ai_response', ''),
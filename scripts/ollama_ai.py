@@ -6,6 +6,9 @@ from typing import List, Dict, Any
 from datetime import datetime
 from dotenv import load_dotenv
 from ai_config_manager import config_manager
+from provider_health import health_registry
+from circuit_breaker import guarded, CallRefusedError
+from http_transport import get_session
 
 # Load environment variables - try multiple paths
 from pathlib import Path
@@ -33,20 +36,21 @@ class LMStudioAITester:
     def __init__(self, model: str = "local-model"):
         self.model = model
         self.base_url = "http://localhost:1234/v1"
+        self.health_url = f"{self.base_url}/models"
         print(f"LM Studio client initialized with model: {self.model}")
         print(f"Base URL: {self.base_url}")
         
-        # Check if LM Studio is running
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=5)
-            if response.status_code == 200:
+        # Check if LM Studio is running (cached across instances by the health registry)
+        status = health_registry.check("lmstudio", self.health_url)
+        if status["alive"]:
+            if status["status_code"] == 200:
                 print("✅ LM Studio is running and accessible")
-                models = response.json()
+                models = status["data"] or {}
                 print(f"Available models: {[m['id'] for m in models.get('data', [])]}")
             else:
                 print("⚠️ LM Studio responded but with unexpected status")
-        except requests.exceptions.RequestException as e:
-            print(f"❌ LM Studio is not running: {e}")
+        else:
+            print(f"❌ LM Studio is not running: {status['error']}")
             print("Please install and start LM Studio: https://lmstudio.ai")
             print("Make sure to enable 'Local Server' in LM Studio settings")
             raise Exception("LM Studio is not running. Please install and start LM Studio first.")
@@ -85,12 +89,13 @@ Be genuinely curious, warm, and conversational. Ask natural questions and respon
             print(f"Error in process_test_inputs: {e}")
             print(f"Error type: {type(e)}")
             # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("fallback")
+            fallback_template = config_manager.get_custom_response("fallback")
+            fallback_response = fallback_template
             if "{test_title}" in fallback_response:
                 fallback_response = fallback_response.replace("{test_title}", test_title)
             
             # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("fallback"):
+            if fallback_response == fallback_template:
                 fallback_response = f"""That's a really interesting story about {test_title}. 🌱
 
 What made you want to share this with me? I'd love to hear more about what this memory means to you."""
@@ -106,9 +111,18 @@ What made you want to share this with me? I'd love to hear more about what this
                 "fallback_mode": True
             }
     
+    def _require_alive(self) -> None:
+        # The registry is refreshed by failed calls and background probes, so a
+        # backend that went down after construction is refused without a request.
+        # Refusals aren't breaker failures; the failed call that marked it dead was
+        if not health_registry.is_alive("lmstudio", self.health_url):
+            raise CallRefusedError("LM Studio is not running. Please install and start LM Studio first.")
+    
+    @guarded("lmstudio")
     def call_lmstudio_api(self, messages: List[Dict]) -> Dict[str, Any]:
         """Make API call to LM Studio using OpenAI-compatible API"""
         print(f"Making API call to LM Studio with messages: {messages}")
+        self._require_alive()
         
         try:
             payload = {
@@ -119,8 +133,9 @@ What made you want to share this with me? I'd love to hear more about what this
                 "stream": False
             }
             
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
+            url = f"{self.base_url}/chat/completions"
+            response = get_session(url).post(
+                url,
                 json=payload,
                 timeout=60
             )
@@ -140,6 +155,8 @@ What made you want to share this with me? I'd love to hear more about what this
                 raise Exception(f"LM Studio API error: {response.status_code} - {error_text}")
                 
         except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectionError):
+                health_registry.mark_dead("lmstudio", self.health_url, str(e))
             print(f"❌ Network error: {e}")
             raise Exception(f"Network error: {e}")
         except Exception as e:
@@ -198,12 +215,13 @@ You're having a natural conversation. Be genuinely curious and warm. Respond as
             print(f"Error in continue_conversation: {e}")
             print(f"Error type: {type(e)}")
             # Get custom fallback response from configuration
-            fallback_response = config_manager.get_custom_response("reflection")
+            fallback_template = config_manager.get_custom_response("reflection")
+            fallback_response = fallback_template
             if "{user_message}" in fallback_response:
                 fallback_response = fallback_response.replace("{user_message}", user_message)
             
             # Add personalized touch if response is too generic
-            if fallback_response == config_manager.get_custom_response("reflection"):
+            if fallback_response == fallback_template:
                 # Include context if available
                 context_reference = ""
                 if test_context and test_context.get('test_title'):
@@ -1,22 +1,49 @@
 import os
 import json
+import time
 import requests
 from datetime import datetime
 from typing import Dict, Any, List
 from dotenv import load_dotenv
+from response_cache import response_cache, make_key, cache_enabled
+from fallback_engine import fallback_engines
+from circuit_breaker import breakers, CircuitOpenError
+from http_transport import get_session, get_async_client, ASYNC_HTTP_ERRORS
+from context_window import fit_history
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env.local'))
 
+# Website help persona; nav chat answers are cached per prompt, so edits reset them
+WEBSITE_SYSTEM_PROMPT = "You are Sprout, a helpful Memory Garden assistant. Help users navigate the website and understand its features. Be practical and helpful."
+
+# Result errors answered with the canned fallback instead of failing the request
+FALLBACK_ERRORS = ("quota_exceeded", "circuit_open")
+
 class OpenAIAI:
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
         self.api_url = "https://api.openai.com/v1/chat/completions"
         self.model = "gpt-3.5-turbo"  # Free tier model
+        self.max_reply_tokens = 150
         
         if not self.api_key:
             print("Warning: OPENAI_API_KEY not found in environment variables")
     
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+    
+    def _chat_payload(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": self.max_reply_tokens,
+            "temperature": 0.7
+        }
+    
     def call_openai_api(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
         """Call OpenAI API for chat completion"""
         if not self.api_key:
@@ -26,102 +53,117 @@ class OpenAIAI:
                 "timestamp": datetime.now().isoformat()
             }
         
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = self._headers()
+        payload = self._chat_payload(messages)
         
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "max_tokens": 150,
-            "temperature": 0.7
-        }
+        # Skip the network entirely while OpenAI is known to be failing
+        breaker = breakers.get("openai")
+        if not breaker.allow_request():
+            return self._circuit_open_result()
+        start = time.monotonic()
         
         try:
-            response = requests.post(self.api_url, headers=headers, json=payload, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()
-                content = result['choices'][0]['message']['content']
-                
-                return {
-                    "success": True,
-                    "response": content,
-                    "model": self.model,
-                    "timestamp": datetime.now().isoformat()
-                }
-            elif response.status_code == 429:
-                # Quota exceeded, use fallback
-                return {
-                    "success": False,
-                    "error": "quota_exceeded",
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": f"API request failed with status {response.status_code}: {response.text}",
-                    "timestamp": datetime.now().isoformat()
-                }
+            response = get_session(self.api_url).post(self.api_url, headers=headers, json=payload, timeout=30)
+            return self._record_outcome(breaker, start, self._handle_api_response(response))
                 
         except requests.exceptions.RequestException as e:
+            breaker.record_failure(time.monotonic() - start, str(e))
             return {
                 "success": False,
                 "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
     
-    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
-        """Provide a fallback response when OpenAI quota is exceeded"""
-        # Context-aware responses for different types of prompts
-        prompt_lower = prompt.lower()
-        
-        if "hello" in prompt_lower or "hi" in prompt_lower:
-            return {
-                "success": True,
-                "response": "Hello! How can I help you today?",
-                "model": "fallback",
-                "timestamp": datetime.now().isoformat()
-            }
-        elif "memory" in prompt_lower or "garden" in prompt_lower:
+    async def acall_openai_api(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Async variant of call_openai_api"""
+        if not self.api_key:
             return {
-                "success": True,
-                "response": "I'd be happy to help you with your memory garden! What would you like to know?",
-                "model": "fallback",
+                "success": False,
+                "error": "OpenAI API key not configured",
                 "timestamp": datetime.now().isoformat()
             }
-        elif "help" in prompt_lower:
+        
+        breaker = breakers.get("openai")
+        if not breaker.allow_request():
+            return self._circuit_open_result()
+        start = time.monotonic()
+        
+        try:
+            response = await get_async_client(self.api_url).post(
+                self.api_url,
+                headers=self._headers(),
+                json=self._chat_payload(messages),
+                timeout=30
+            )
+            return self._record_outcome(breaker, start, self._handle_api_response(response))
+                
+        except ASYNC_HTTP_ERRORS as e:
+            breaker.record_failure(time.monotonic() - start, str(e))
             return {
-                "success": True,
-                "response": "I'm here to help! You can ask me about planting memories, exploring your garden, or any other features.",
-                "model": "fallback",
+                "success": False,
+                "error": f"Request failed: {str(e)}",
                 "timestamp": datetime.now().isoformat()
             }
-        elif "sunset" in prompt_lower or "walk" in prompt_lower:
+    
+    def _circuit_open_result(self) -> Dict[str, Any]:
+        # No request was made; callers answer with the fallback as for an exhausted quota
+        return {
+            "success": False,
+            "error": "circuit_open",
+            "detail": str(CircuitOpenError("openai")),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def _fallback_note(self, error: str) -> str:
+        if error == "circuit_open":
+            return "OpenAI circuit open after repeated failures, using fallback response"
+        return "OpenAI quota exceeded, using fallback response"
+    
+    def _record_outcome(self, breaker, start: float, result: Dict[str, Any]) -> Dict[str, Any]:
+        if result["success"]:
+            breaker.record_success(time.monotonic() - start)
+        else:
+            breaker.record_failure(time.monotonic() - start, result["error"])
+        return result
+    
+    def _handle_api_response(self, response) -> Dict[str, Any]:
+        """Turn a requests/httpx response from OpenAI into a result dict"""
+        if response.status_code == 200:
+            result = response.json()
+            content = result['choices'][0]['message']['content']
+            
             return {
                 "success": True,
-                "response": "That sounds like a beautiful memory! Evening walks can be so peaceful and reflective. The changing light and quiet moments often help us process our thoughts and feelings.",
-                "model": "fallback",
+                "response": content,
+                "model": self.model,
                 "timestamp": datetime.now().isoformat()
             }
-        elif "reflection" in prompt_lower:
+        elif response.status_code == 429:
+            # Quota exceeded, use fallback
             return {
-                "success": True,
-                "response": "This memory seems meaningful to you. Take a moment to reflect on how it made you feel and what it taught you about yourself.",
-                "model": "fallback",
+                "success": False,
+                "error": "quota_exceeded",
                 "timestamp": datetime.now().isoformat()
             }
         else:
             return {
-                "success": True,
-                "response": "I'm here to assist you with your Memory Garden. How can I help?",
-                "model": "fallback",
+                "success": False,
+                "error": f"API request failed with status {response.status_code}: {response.text}",
                 "timestamp": datetime.now().isoformat()
             }
     
-    def process_memory_garden_test(self, test_title: str, test_description: str) -> Dict[str, Any]:
-        """Process a memory garden test using AI"""
+    def _fallback_response(self, prompt: str) -> Dict[str, Any]:
+        """Provide a fallback response when OpenAI quota is exceeded"""
+        # Rules live in ai_config.json ("fallback_rules") and match in one pass
+        return {
+            "success": True,
+            "response": fallback_engines.get("openai").match(prompt),
+            "model": "fallback",
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def process_memory_garden_test(self, test_title: str, test_description: str, fresh: bool = False) -> Dict[str, Any]:
+        """Process a memory garden test using AI; fresh=True skips the response cache"""
         messages = [
             {
                 "role": "system",
@@ -133,7 +175,16 @@ class OpenAIAI:
             }
         ]
         
-        result = self.call_openai_api(messages)
+        use_cache = cache_enabled() and not fresh
+        payload = self._chat_payload(messages)
+        cache_key = make_key("openai", self.model, messages, {"max_tokens": payload["max_tokens"], "temperature": payload["temperature"]})
+        cached = response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            result = {"success": True, "response": cached}
+        else:
+            result = self.call_openai_api(messages)
+            if use_cache and result["success"]:
+                response_cache.put(cache_key, result["response"])
         
         if result["success"]:
             return {
@@ -141,10 +192,11 @@ class OpenAIAI:
                 "reflection": result["response"],
                 "test_title": test_title,
                 "test_description": test_description,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "cached": cached is not None
             }
-        elif result["error"] == "quota_exceeded":
-            # Use fallback response when quota is exceeded
+        elif result["error"] in FALLBACK_ERRORS:
+            # Use fallback response when quota is exceeded or the circuit is open
             fallback = self._fallback_response(f"reflection on {test_title}: {test_description}")
             return {
                 "success": True,
@@ -152,7 +204,7 @@ class OpenAIAI:
                 "test_title": test_title,
                 "test_description": test_description,
                 "timestamp": datetime.now().isoformat(),
-                "note": "OpenAI quota exceeded, using fallback response"
+                "note": self._fallback_note(result["error"])
             }
         else:
             return {
@@ -165,27 +217,27 @@ class OpenAIAI:
                 }
             }
     
-    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Continue a conversation with context awareness"""
+    def build_conversation_messages(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> List[Dict[str, str]]:
+        """Build the system message, recent history and new message for a chat turn"""
         # Build context-aware system message
         if context and context.get('website_name') == 'Memory Garden':
-            system_message = "You are Sprout, a helpful Memory Garden assistant. Help users navigate the website and understand its features. Be practical and helpful."
+            system_message = WEBSITE_SYSTEM_PROMPT
         else:
             system_message = "You are a supportive AI assistant for the Memory Garden therapy application. Provide thoughtful, therapeutic responses."
         
         # Build messages array
         messages = [{"role": "system", "content": system_message}]
         
-        # Add conversation history (last 5 messages to stay within token limits)
-        for msg in conversation_history[-5:]:
+        # Add the most recent history that fits the model's context budget
+        for msg in fit_history(conversation_history, "openai", [system_message, message], self.max_reply_tokens):
             if msg.get('role') in ['user', 'assistant']:
                 messages.append({"role": msg['role'], "content": msg['content']})
         
         # Add current message
         messages.append({"role": "user", "content": message})
-        
-        result = self.call_openai_api(messages)
-        
+        return messages
+    
+    def _conversation_result(self, message: str, result: Dict[str, Any]) -> Dict[str, Any]:
         if result["success"]:
             return {
                 "success": True,
@@ -193,15 +245,15 @@ class OpenAIAI:
                 "message": message,
                 "timestamp": datetime.now().isoformat()
             }
-        elif result["error"] == "quota_exceeded":
-            # Use fallback response when quota is exceeded
+        elif result["error"] in FALLBACK_ERRORS:
+            # Use fallback response when quota is exceeded or the circuit is open
             fallback = self._fallback_response(message)
             return {
                 "success": True,
                 "response": fallback["response"],
                 "message": message,
                 "timestamp": datetime.now().isoformat(),
-                "note": "OpenAI quota exceeded, using fallback response"
+                "note": self._fallback_note(result["error"])
             }
         else:
             return {
@@ -210,6 +262,18 @@ class OpenAIAI:
                 "message": message,
                 "timestamp": datetime.now().isoformat()
             }
+    
+    def continue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Continue a conversation with context awareness"""
+        messages = self.build_conversation_messages(message, conversation_history, context)
+        result = self.call_openai_api(messages)
+        return self._conversation_result(message, result)
+    
+    async def acontinue_conversation(self, message: str, conversation_history: List[Dict[str, str]], context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        messages = self.build_conversation_messages(message, conversation_history, context)
+        result = await self.acall_openai_api(messages)
+        return self._conversation_result(message, result)
 
 def main():
     """Test the OpenAI AI integration"""
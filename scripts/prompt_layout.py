@@ -0,0 +1,42 @@
+"""
+Prefix-stable prompt assembly for local models
+llama.cpp-based servers (LM Studio) and Ollama reuse cached attention state
+for the longest prefix a prompt shares with the previous one. System prompts
+are laid out static-first: the personality and fixed instructions lead and
+per-conversation content (story, summary) comes last, so a new story only
+re-processes the tail instead of the whole prompt.
+"""
+
+import os
+from typing import Dict, Any, Iterable
+
+STORY_OPENING_INSTRUCTIONS = """You're having a natural conversation with someone who shared a story with you.
+
+Be genuinely curious, warm, and conversational. Ask natural questions and respond as a caring friend would. Avoid therapeutic jargon or structured responses."""
+
+STORY_CONTINUE_INSTRUCTIONS = """You're continuing a natural conversation with someone who shared a story with you.
+
+Be genuinely curious, warm, and conversational. Respond naturally as a caring friend would."""
+
+OPEN_CONVERSATION_INSTRUCTIONS = """You're having a natural conversation. Be genuinely curious and warm. Respond as a caring friend would."""
+
+# How long Ollama keeps the model (and its prompt cache) loaded between requests
+OLLAMA_KEEP_ALIVE = os.environ.get('AI_OLLAMA_KEEP_ALIVE', '30m')
+
+def prompt_cache_enabled() -> bool:
+    return os.environ.get('AI_PROMPT_CACHE', 'true').lower() == 'true'
+
+def story_text(title: str, description: str) -> str:
+    return f"Story: {title} - {description}"
+
+def stable_system_prompt(static_parts: Iterable[str], volatile_parts: Iterable[str] = ()) -> str:
+    """Join prompt sections with everything that rarely changes first"""
+    return "\n\n".join(part for part in [*static_parts, *volatile_parts] if part)
+
+def lmstudio_cache_hints() -> Dict[str, Any]:
+    """Extra request fields asking a llama.cpp-based server to reuse the cached prefix"""
+    return {"cache_prompt": True} if prompt_cache_enabled() else {}
+
+def ollama_cache_hints() -> Dict[str, Any]:
+    """Extra request fields keeping the Ollama model and its prompt cache warm"""
+    return {"keep_alive": OLLAMA_KEEP_ALIVE} if prompt_cache_enabled() else {}
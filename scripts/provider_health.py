@@ -0,0 +1,97 @@
+"""
+Shared liveness registry for local AI backends (LM Studio, Ollama)
+Caches probe results so constructors don't pay an HTTP round-trip per request
+"""
+
+import os
+import time
+import threading
+import requests
+from typing import Dict, Any, Optional
+from http_transport import get_session
+
+class ProviderHealthRegistry:
+    def __init__(self, ttl: float = None, dead_cooloff: float = None, probe_timeout: float = 5):
+        # How long a successful probe is trusted before it is refreshed
+        self.ttl = ttl if ttl is not None else float(os.environ.get('AI_HEALTH_TTL', '30'))
+        # How long a failed backend is reported dead without re-probing
+        self.dead_cooloff = dead_cooloff if dead_cooloff is not None else float(os.environ.get('AI_HEALTH_COOLOFF', '15'))
+        self.probe_timeout = probe_timeout
+        self._status = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def probe(self, name: str, url: str) -> Dict[str, Any]:
+        """Probe a backend synchronously and record the result"""
+        checked_at = time.monotonic()
+        try:
+            response = get_session(url).get(url, timeout=self.probe_timeout)
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            status = {
+                # A server that answers 5xx is up but can't serve requests
+                "alive": response.status_code < 500,
+                "status_code": response.status_code,
+                "data": data,
+                "error": None if response.status_code < 500 else f"HTTP {response.status_code}",
+                "checked_at": checked_at
+            }
+        except requests.exceptions.RequestException as e:
+            status = {
+                "alive": False,
+                "status_code": None,
+                "data": None,
+                "error": str(e),
+                "checked_at": checked_at
+            }
+
+        with self._lock:
+            self._status[(name, url)] = status
+            self._refreshing.discard((name, url))
+        return status
+
+    def _refresh_in_background(self, name: str, url: str) -> None:
+        with self._lock:
+            if (name, url) in self._refreshing:
+                return
+            self._refreshing.add((name, url))
+        threading.Thread(target=self.probe, args=(name, url), daemon=True).start()
+
+    def check(self, name: str, url: str) -> Dict[str, Any]:
+        """Return the cached status for a backend, probing only when needed"""
+        with self._lock:
+            status = self._status.get((name, url))
+
+        if status is None:
+            return self.probe(name, url)
+
+        age = time.monotonic() - status["checked_at"]
+        if status["alive"]:
+            if age >= self.ttl:
+                # Serve the last known-good status while a refresh runs
+                self._refresh_in_background(name, url)
+            return status
+
+        if age < self.dead_cooloff:
+            return status
+        return self.probe(name, url)
+
+    def is_alive(self, name: str, url: str) -> bool:
+        """Convenience wrapper around check()"""
+        return self.check(name, url)["alive"]
+
+    def mark_dead(self, name: str, url: str, error: Optional[str] = None) -> None:
+        """Record a failed call so the next requests fail fast"""
+        with self._lock:
+            self._status[(name, url)] = {
+                "alive": False,
+                "status_code": None,
+                "data": None,
+                "error": error,
+                "checked_at": time.monotonic()
+            }
+
+# Global health registry instance
+health_registry = ProviderHealthRegistry()
@@ -0,0 +1,205 @@
+"""
+Latency-aware router for Memory Garden chat backends
+Sends each continue_conversation call to the backend with the best expected
+completion time, based on EWMA latency, error rate and in-flight requests,
+and falls back through the remaining backends in order
+"""
+
+import os
+import time
+import random
+import importlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from circuit_breaker import breakers
+
+# backend name -> (module, class); also the default fallback order
+ROUTER_BACKENDS = {
+    "lmstudio": ("lmstudio_ai", "LMStudioAITester"),
+    "ollama": ("deepseek_ai", "OllamaAITester"),
+    "google": ("google_ai", "GoogleAI"),
+    "openai": ("openai_ai", "OpenAIAI"),
+    "huggingface": ("huggingface_ai", "HuggingFaceAI"),
+}
+
+# Smoothing factor for latency and error-rate averages
+EWMA_ALPHA = float(os.environ.get('AI_ROUTER_EWMA_ALPHA', '0.3'))
+# Assumed latency for a backend that has not answered yet
+DEFAULT_LATENCY = float(os.environ.get('AI_ROUTER_DEFAULT_LATENCY', '3.0'))
+# Share of calls sent to a non-best backend so its statistics stay current
+EXPLORE_RATE = float(os.environ.get('AI_ROUTER_EXPLORE_RATE', '0.05'))
+
+def _allowlist() -> List[str]:
+    """Backends from AI_ROUTER_BACKENDS (comma-separated, in fallback order)"""
+    configured = os.environ.get('AI_ROUTER_BACKENDS')
+    if not configured:
+        return list(ROUTER_BACKENDS)
+    return [name.strip() for name in configured.split(',') if name.strip() in ROUTER_BACKENDS]
+
+def _is_real_answer(result: Dict[str, Any]) -> bool:
+    # Providers report canned fallback text as success; the router treats it as a miss
+    return (bool(result.get("success")) and not result.get("fallback_mode") and "note" not in result
+            and result.get("model") != "fallback")
+
+class BackendStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.last_error = None
+
+    def expected_completion(self) -> float:
+        """Seconds until a new request on this backend is likely to succeed"""
+        latency = self.ewma_latency if self.ewma_latency is not None else DEFAULT_LATENCY
+        # Queued requests wait behind each other; failures cost a retry elsewhere
+        return latency * (1 + self.in_flight) / max(1.0 - self.error_rate, 0.05)
+
+    def observe(self, latency: float, ok: bool, error: Optional[str] = None) -> None:
+        self.calls += 1
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA * (0.0 if ok else 1.0)
+        if ok:
+            self.ewma_latency = latency if self.ewma_latency is None else (1 - EWMA_ALPHA) * self.ewma_latency + EWMA_ALPHA * latency
+        else:
+            self.failures += 1
+            self.last_error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "ewma_latency": self.ewma_latency,
+            "error_rate": round(self.error_rate, 4),
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "failures": self.failures,
+            "expected_completion": round(self.expected_completion(), 3),
+            "last_error": self.last_error
+        }
+
+class ProviderRouter:
+    def __init__(self, backends: List[str] = None):
+        self.backends = [name for name in (backends or _allowlist()) if name in ROUTER_BACKENDS]
+        if not self.backends:
+            raise ValueError("No routable chat backends configured (check AI_ROUTER_BACKENDS)")
+        self.stats = {name: BackendStats(name) for name in self.backends}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _get_client(self, name: str):
+        client = self._clients.get(name)
+        if client is None:
+            module_name, class_name = ROUTER_BACKENDS[name]
+            # Local constructors raise when their server is down; the health
+            # registry keeps that check cheap, so retry construction per call
+            client = getattr(importlib.import_module(module_name), class_name)()
+            self._clients[name] = client
+        return client
+
+    def ranked_backends(self) -> List[str]:
+        """Backends ordered by expected completion time, open breakers last"""
+        with self._lock:
+            scores = {name: self.stats[name].expected_completion() for name in self.backends}
+        order = {name: index for index, name in enumerate(self.backends)}
+        # Ties keep the allowlist order, so a cold router starts local-first
+        ranked = sorted(self.backends, key=lambda name: (breakers.get(name).is_open(), scores[name], order[name]))
+        candidates = [name for name in ranked[1:] if not breakers.get(name).is_open()]
+        if candidates and random.random() < EXPLORE_RATE:
+            explored = random.choice(candidates)
+            ranked.remove(explored)
+            ranked.insert(0, explored)
+        return ranked
+
+    def _begin(self, name: str) -> float:
+        with self._lock:
+            self.stats[name].in_flight += 1
+        return time.monotonic()
+
+    def _finish(self, name: str, start: float, ok: bool, error: Optional[str] = None) -> None:
+        with self._lock:
+            stats = self.stats[name]
+            stats.in_flight -= 1
+            stats.observe(time.monotonic() - start, ok, error)
+
+    def _routed_result(self, name: str, result: Dict[str, Any], attempts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Local backends answer with "ai_response", cloud ones with "response"
+        text = result.get("ai_response", result.get("response", ""))
+        routed = dict(result)
+        routed["ai_response"] = text
+        routed["response"] = text
+        routed["backend"] = name
+        routed["attempts"] = attempts
+        return routed
+
+    def continue_conversation(self, message: str, conversation_history: List[Dict] = None, context: Dict = None) -> Dict[str, Any]:
+        """Answer with the fastest healthy backend, falling back in order"""
+        attempts = []
+        first_fallback = None
+        for name in self.ranked_backends():
+            start = self._begin(name)
+            try:
+                result = self._get_client(name).continue_conversation(message, conversation_history or [], context)
+            except Exception as e:
+                self._finish(name, start, False, str(e))
+                attempts.append({"backend": name, "success": False, "error": str(e)})
+                continue
+
+            if _is_real_answer(result):
+                self._finish(name, start, True)
+                attempts.append({"backend": name, "success": True})
+                return self._routed_result(name, result, attempts)
+
+            error = result.get("error") or result.get("note") or "fallback response"
+            self._finish(name, start, False, error)
+            attempts.append({"backend": name, "success": False, "error": error})
+            if first_fallback is None and result.get("success"):
+                first_fallback = (name, result)
+
+        if first_fallback is not None:
+            # Every backend missed; keep the best-ranked canned reply
+            return self._routed_result(first_fallback[0], first_fallback[1], attempts)
+        return {
+            "success": False,
+            "error": "All chat backends failed",
+            "attempts": attempts,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    async def acontinue_conversation(self, message: str, conversation_history: List[Dict] = None, context: Dict = None) -> Dict[str, Any]:
+        """Async variant of continue_conversation"""
+        attempts = []
+        first_fallback = None
+        for name in self.ranked_backends():
+            start = self._begin(name)
+            try:
+                result = await self._get_client(name).acontinue_conversation(message, conversation_history or [], context)
+            except Exception as e:
+                self._finish(name, start, False, str(e))
+                attempts.append({"backend": name, "success": False, "error": str(e)})
+                continue
+
+            if _is_real_answer(result):
+                self._finish(name, start, True)
+                attempts.append({"backend": name, "success": True})
+                return self._routed_result(name, result, attempts)
+
+            error = result.get("error") or result.get("note") or "fallback response"
+            self._finish(name, start, False, error)
+            attempts.append({"backend": name, "success": False, "error": error})
+            if first_fallback is None and result.get("success"):
+                first_fallback = (name, result)
+
+        if first_fallback is not None:
+            return self._routed_result(first_fallback[0], first_fallback[1], attempts)
+        return {
+            "success": False,
+            "error": "All chat backends failed",
+            "attempts": attempts,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-backend routing statistics"""
+        with self._lock:
+            return {name: self.stats[name].to_dict() for name in self.backends}
@@ -0,0 +1,139 @@
+"""
+Content-addressed cache for deterministic first-turn AI responses
+Keys are a hash of (provider, model, rendered messages, sampling params), so a
+replayed memory gets the stored reflection instead of a fresh inference.
+Opt-in with AI_RESPONSE_CACHE=true; an in-memory LRU sits in front of a
+size-bounded SQLite tier shared by every process.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import closing
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+def cache_enabled() -> bool:
+    return os.environ.get('AI_RESPONSE_CACHE', 'false').lower() == 'true'
+
+def make_key(provider: str, model: str, messages: Any, params: Dict[str, Any] = None) -> str:
+    """Stable hash of everything that determines a model's output"""
+    canonical = json.dumps(
+        {"provider": provider, "model": model, "messages": messages, "params": params or {}},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, memory_entries: int = None, db_path: str = None, max_disk_bytes: int = None, ttl: float = None):
+        self.memory_entries = memory_entries or int(os.environ.get('AI_RESPONSE_CACHE_ENTRIES', '256'))
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, 'responses.sqlite3')
+        self.max_disk_bytes = max_disk_bytes or int(os.environ.get('AI_RESPONSE_CACHE_MAX_BYTES', str(50 * 1024 * 1024)))
+        # Seconds an entry stays valid in either tier
+        self.ttl = ttl if ttl is not None else float(os.environ.get('AI_RESPONSE_CACHE_TTL', str(7 * 24 * 3600)))
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._initialized = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for a key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        except sqlite3.Error:
+            row = None
+
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["disk_hits"] += 1
+        self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Store a response in both tiers, evicting old disk entries past the size bound"""
+        now = time.time()
+        self._remember(key, value, now)
+        self.stats["stores"] += 1
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value.encode("utf-8")), now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+                self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not store cached response: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        # Drop least recently used entries until the table fits again
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_disk_bytes:
+                break
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM responses")
+        except sqlite3.Error:
+            pass
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,103 @@
+"""
+Answer cache for nav_chat website-help questions
+A question is matched only when its normalized text (lowercased, punctuation
+and extra whitespace dropped) equals a stored one, so "how do I delete a
+memory?" and "How do I delete a memory" share an answer but "how do I not
+delete a memory" never does. Entries live in SQLite keyed by provider and a
+fingerprint of the website context and that provider's system prompt, so an
+edit to either drops them; concurrent writers each commit whole rows.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+from typing import Dict, Any, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+DEFAULT_MAX_ENTRIES = int(os.environ.get('NAV_CACHE_MAX_ENTRIES', '500'))
+
+def semantic_cache_enabled() -> bool:
+    return os.environ.get('NAV_SEMANTIC_CACHE', 'true').lower() == 'true'
+
+def context_fingerprint(context: Dict[str, Any], system_prompt: str = "") -> str:
+    """Hash of the website context and system prompt; any edit invalidates cached answers"""
+    payload = json.dumps({"context": context, "system_prompt": system_prompt}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def normalize_question(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower().replace("’", "'")))
+
+class SemanticCache:
+    def __init__(self, namespace: str, context: Dict[str, Any], system_prompt: str = "",
+                 db_path: str = None, max_entries: int = None):
+        self.db_path = db_path or os.path.join(DEFAULT_CACHE_DIR, 'nav_answers.sqlite3')
+        self.namespace = namespace
+        self.fingerprint = context_fingerprint(context, system_prompt)
+        self.max_entries = max_entries or DEFAULT_MAX_ENTRIES
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nav_answers (
+                    namespace TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, fingerprint, question)
+                )
+            """)
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def lookup(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return {"answer"} for a stored question with the same normalized text"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT answer FROM nav_answers WHERE namespace = ? AND fingerprint = ? AND question = ?",
+                    (self.namespace, self.fingerprint, normalized)
+                ).fetchone()
+        except sqlite3.Error:
+            return None
+        return {"answer": row[0]} if row else None
+
+    def store(self, question: str, answer: str) -> None:
+        """Add a question/answer pair, dropping stale and oldest entries past max_entries"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return
+        try:
+            # One transaction, so concurrent writers never lose each other's rows
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO nav_answers (namespace, fingerprint, question, answer, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, self.fingerprint, normalized, answer, time.time())
+                )
+                # Answers built from an older context or prompt can never be served again
+                conn.execute(
+                    "DELETE FROM nav_answers WHERE namespace = ? AND fingerprint != ?",
+                    (self.namespace, self.fingerprint)
+                )
+                conn.execute("""
+                    DELETE FROM nav_answers WHERE namespace = ? AND question NOT IN (
+                        SELECT question FROM nav_answers WHERE namespace = ?
+                        ORDER BY created_at DESC LIMIT ?
+                    )
+                """, (self.namespace, self.namespace, self.max_entries))
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not save nav chat cache: {e}", file=sys.stderr)
@@ -0,0 +1,236 @@
+"""
+Server-side conversation sessions for Memory Garden chat
+Keeps each conversation's normalized message list keyed by conversation id,
+so a chat request only needs to carry the new user message. Messages are
+appended to an embedded SQLite log; recently used sessions stay in an
+in-memory LRU, revalidated against the session row's updated_at, so a hot
+turn reads one indexed column while several worker processes sharing the
+database still see each other's writes.
+"""
+
+import os
+import json
+import atexit
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+
+def append_normalized(messages: List[Dict[str, str]], message: Dict[str, Any]) -> bool:
+    """Append one message if it keeps the user/assistant alternation valid"""
+    role = message.get("role", "user")
+    content = message.get("content", "")
+    if role not in ["user", "assistant"] or not isinstance(content, str) or not content.strip():
+        return False
+    if not messages and role != "user":
+        # Conversations must start with the user
+        return False
+    if messages and messages[-1]["role"] == role:
+        # Skip duplicate roles to maintain alternating pattern
+        return False
+    messages.append({"role": role, "content": content})
+    return True
+
+def normalize_history(conversation_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Filter a raw client history down to valid, alternating user/assistant messages"""
+    messages = []
+    for msg in conversation_history or []:
+        append_normalized(messages, msg)
+    return messages
+
+class SessionStore:
+    def __init__(self, db_path: str = None, hot_sessions: int = None, ttl: float = None):
+        self.db_path = db_path or os.environ.get('AI_SESSION_DB') or os.path.join(DEFAULT_CACHE_DIR, 'sessions.sqlite3')
+        self.hot_sessions = hot_sessions or int(os.environ.get('AI_SESSION_HOT', '128'))
+        # Sessions idle for longer than this are purged
+        self.ttl = ttl if ttl is not None else float(os.environ.get('AI_SESSION_TTL', str(7 * 24 * 3600)))
+        self._hot = OrderedDict()
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process; the lock serializes access from threads
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    conversation_id TEXT PRIMARY KEY,
+                    test_context TEXT,
+                    summary TEXT,
+                    summarized_count INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Databases created before rolling summaries lack these columns
+            for column in ("summary TEXT", "summarized_count INTEGER NOT NULL DEFAULT 0"):
+                try:
+                    conn.execute(f"ALTER TABLE sessions ADD COLUMN {column}")
+                except sqlite3.OperationalError:
+                    pass
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS session_messages (
+                    conversation_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (conversation_id, seq)
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+            self._hot.clear()
+        return self._conn
+
+    def close(self) -> None:
+        """Close this process's connection; the next call reopens it"""
+        with self._lock:
+            # A connection inherited across fork belongs to the parent
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+            self._pid = None
+
+    def _remember(self, conversation_id: str, session: Dict[str, Any], version: float) -> None:
+        # version is the updated_at this process last read or wrote
+        self._hot[conversation_id] = (session, version)
+        self._hot.move_to_end(conversation_id)
+        while len(self._hot) > self.hot_sessions:
+            self._hot.popitem(last=False)
+
+    def get(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Return {"messages", "test_context", "summary", "summarized_count"} for a conversation, or None"""
+        with self._lock:
+            conn = self._connect()
+            hot = self._hot.get(conversation_id)
+            row = conn.execute(
+                "SELECT test_context, summary, summarized_count, updated_at FROM sessions WHERE conversation_id = ? AND updated_at > ?",
+                (conversation_id, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                self._hot.pop(conversation_id, None)
+                return None
+            if hot is not None and hot[1] == row[3]:
+                # Nobody else has written since this process last saw it
+                self._hot.move_to_end(conversation_id)
+                return hot[0]
+
+            rows = conn.execute(
+                "SELECT role, content FROM session_messages WHERE conversation_id = ? ORDER BY seq",
+                (conversation_id,)
+            ).fetchall()
+            session = {
+                "messages": [{"role": role, "content": content} for role, content in rows],
+                "test_context": json.loads(row[0]) if row[0] else None,
+                "summary": row[1],
+                "summarized_count": row[2]
+            }
+            self._remember(conversation_id, session, row[3])
+            return session
+
+    def create(self, conversation_id: str, conversation_history: List[Dict[str, Any]] = None,
+               test_context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Start (or replace) a session, seeding it from a client-side history"""
+        now = time.time()
+        session = {
+            "messages": normalize_history(conversation_history),
+            "test_context": test_context,
+            "summary": None,
+            "summarized_count": 0
+        }
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM session_messages WHERE conversation_id = ?", (conversation_id,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (conversation_id, test_context, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                    (conversation_id, json.dumps(test_context) if test_context is not None else None, now, now)
+                )
+                conn.executemany(
+                    "INSERT INTO session_messages (conversation_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [(conversation_id, seq, msg["role"], msg["content"], now) for seq, msg in enumerate(session["messages"])]
+                )
+            self._remember(conversation_id, session, now)
+            self._purge_expired(conn, now)
+        return session
+
+    def append(self, conversation_id: str, messages: List[Dict[str, Any]], test_context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Append messages to a session (creating it if needed); only new rows are written"""
+        with self._lock:
+            session = self.get(conversation_id)
+            if session is None:
+                session = self.create(conversation_id, [], test_context)
+            conn = self._connect()
+            now = time.time()
+            start = len(session["messages"])
+            for message in messages:
+                append_normalized(session["messages"], message)
+            added = session["messages"][start:]
+            if test_context is not None:
+                session["test_context"] = test_context
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO session_messages (conversation_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    [(conversation_id, start + offset, msg["role"], msg["content"], now) for offset, msg in enumerate(added)]
+                )
+                conn.execute(
+                    "UPDATE sessions SET updated_at = ?, test_context = ? WHERE conversation_id = ?",
+                    (now, json.dumps(session["test_context"]) if session["test_context"] is not None else None, conversation_id)
+                )
+            self._remember(conversation_id, session, now)
+            return session
+
+    def set_summary(self, conversation_id: str, summary: str, summarized_count: int,
+                    based_on: Dict[str, Any] = None) -> bool:
+        """Store the rolling summary covering the first summarized_count messages"""
+        with self._lock:
+            session = self.get(conversation_id)
+            if session is None or (based_on is not None and session is not based_on):
+                # Gone, or changed (here or in another process) since the summary was computed
+                return False
+            version = self._hot[conversation_id][1]
+            now = time.time()
+            conn = self._connect()
+            with conn:
+                # Only if no other process wrote in between
+                updated = conn.execute(
+                    "UPDATE sessions SET summary = ?, summarized_count = ?, updated_at = ? WHERE conversation_id = ? AND updated_at = ?",
+                    (summary, summarized_count, now, conversation_id, version)
+                ).rowcount
+            if not updated:
+                self._hot.pop(conversation_id, None)
+                return False
+            session["summary"] = summary
+            session["summarized_count"] = summarized_count
+            self._remember(conversation_id, session, now)
+            return True
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            self._hot.pop(conversation_id, None)
+            with conn:
+                conn.execute("DELETE FROM session_messages WHERE conversation_id = ?", (conversation_id,))
+                conn.execute("DELETE FROM sessions WHERE conversation_id = ?", (conversation_id,))
+
+    def _purge_expired(self, conn: sqlite3.Connection, now: float) -> None:
+        cutoff = now - self.ttl
+        with conn:
+            conn.execute(
+                "DELETE FROM session_messages WHERE conversation_id IN "
+                "(SELECT conversation_id FROM sessions WHERE updated_at <= ?)",
+                (cutoff,)
+            )
+            conn.execute("DELETE FROM sessions WHERE updated_at <= ?", (cutoff,))
+
+# Global session store instance
+session_store = SessionStore()
+atexit.register(session_store.close)
@@ -0,0 +1,132 @@
+"""
+Memory-mapped snapshot file shared by every process on the host
+A fixed header carries a sequence counter and a version number; readers
+compare one integer to notice updates and never re-parse unchanged data.
+Writers follow a seqlock protocol (odd sequence while writing) under an
+exclusive file lock, so readers never block and never use a torn payload.
+"""
+
+import os
+import mmap
+import time
+import struct
+import threading
+from typing import Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on this platform; SHARED_SNAPSHOTS_AVAILABLE turns the feature off
+    fcntl = None
+
+SHARED_SNAPSHOTS_AVAILABLE = fcntl is not None
+
+MAGIC = b"MGSNAP01"
+# magic, sequence, version, payload length
+HEADER = struct.Struct("<8sQQQ")
+MIN_CAPACITY = 64 * 1024
+
+class SharedSnapshotFile:
+    def __init__(self, path: str):
+        self.path = path
+        self._map = None
+        self._fd = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _open(self) -> None:
+        if self._pid != os.getpid():
+            # flock is per open file description: a forked child needs its own
+            if self._map is not None:
+                self._map.close()
+            if self._fd is not None:
+                os.close(self._fd)
+            self._map = None
+            self._fd = None
+            self._pid = os.getpid()
+        if self._fd is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _ensure_map(self, min_size: int = 0) -> bool:
+        if self._pid != os.getpid():
+            self._open()
+        if self._map is not None and len(self._map) >= min_size:
+            return True
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        try:
+            self._open()
+            size = os.fstat(self._fd).st_size
+            if size < HEADER.size:
+                return False
+            self._map = mmap.mmap(self._fd, size)
+            return len(self._map) >= min_size
+        except (OSError, ValueError):
+            return False
+
+    def read_version(self) -> int:
+        """Current published version, 0 if nothing has been published"""
+        with self._lock:
+            if not self._ensure_map(HEADER.size):
+                return 0
+            magic, _, version, _ = HEADER.unpack_from(self._map, 0)
+            return version if magic == MAGIC else 0
+
+    def read(self) -> Optional[Tuple[int, bytes]]:
+        """Return (version, payload) from a consistent read, or None"""
+        with self._lock:
+            for _ in range(100):
+                if not self._ensure_map(HEADER.size):
+                    return None
+                magic, seq_before, version, length = HEADER.unpack_from(self._map, 0)
+                if magic != MAGIC:
+                    return None
+                if seq_before % 2:
+                    # A writer is mid-update
+                    time.sleep(0.001)
+                    continue
+                if not self._ensure_map(HEADER.size + length):
+                    continue
+                payload = bytes(self._map[HEADER.size:HEADER.size + length])
+                seq_after = HEADER.unpack_from(self._map, 0)[1]
+                if seq_after == seq_before:
+                    return version, payload
+            return None
+
+    def publish(self, payload: bytes) -> int:
+        """Write a new payload and return the version it was published as"""
+        with self._lock:
+            self._open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                needed = HEADER.size + len(payload)
+                size = os.fstat(self._fd).st_size
+                if size < needed:
+                    # Grow with headroom so small config edits don't remap every reader
+                    os.ftruncate(self._fd, max(MIN_CAPACITY, needed * 2))
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._fd, os.fstat(self._fd).st_size)
+
+                magic, seq, version, _ = HEADER.unpack_from(self._map, 0)
+                if magic != MAGIC:
+                    seq, version = 0, 0
+                new_version = version + 1
+                HEADER.pack_into(self._map, 0, MAGIC, seq + 1, version, 0)
+                self._map[HEADER.size:needed] = payload
+                HEADER.pack_into(self._map, 0, MAGIC, seq + 1, new_version, len(payload))
+                HEADER.pack_into(self._map, 0, MAGIC, seq + 2, new_version, len(payload))
+                return new_version
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
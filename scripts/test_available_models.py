@@ -6,6 +6,7 @@ Test which Hugging Face models are actually available
 import os
 import requests
 from dotenv import load_dotenv
+from model_availability import availability_store
 
 # Load environment variables from parent directory
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env.local'))
@@ -24,6 +25,8 @@ def test_model(model_name):
         response = requests.get(url, headers=headers)
         print(f"Model: {model_name}")
         print(f"  Status: {response.status_code}")
+        # Share the result with the HuggingFaceAI cascade
+        availability_store.record(model_name, response.status_code)
         
         if response.status_code == 200:
             print(f"  ✅ Available!")
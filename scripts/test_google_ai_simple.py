@@ -11,7 +11,7 @@ from datetime import datetime
 # Add the scripts directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from google_ai import GoogleAI
+from ai_gateway import call_gateway, DEFAULT_SOCKET_PATH
 
 def main():
     """Main function to process AI test"""
@@ -26,11 +26,23 @@ def main():
     test_title = sys.argv[1]
     test_description = sys.argv[2]
     
-    # Initialize Google AI
-    ai = GoogleAI()
+    # Use the warm gateway workers when a gateway is running
+    result = None
+    if os.path.exists(DEFAULT_SOCKET_PATH):
+        try:
+            result = call_gateway("google", "process_memory_garden_test", test_title, test_description)
+        except (OSError, ValueError):
+            result = None
     
-    # Process the memory garden test
-    result = ai.process_memory_garden_test(test_title, test_description)
+    if result is None:
+        # Imported only on this path; the SDK import dominates start-up time
+        from google_ai import GoogleAI
+        
+        # Initialize Google AI
+        ai = GoogleAI()
+        
+        # Process the memory garden test
+        result = ai.process_memory_garden_test(test_title, test_description)
     
     # Print only the JSON result (no debug output)
     print(json.dumps(result))
@@ -0,0 +1,148 @@
+"""
+Scene-change keyframe sampling for video analysis
+Instead of shipping a whole clip, ffmpeg keeps only the frames where the
+picture changes (plus the first frame), downscaled JPEGs at most
+AI_VIDEO_MAX_FRAMES of them, and optionally a mono low-bitrate Opus copy of
+the audio. A first pass only logs scene-change timestamps; the second writes
+just the evenly spaced frames that fit the budget. A static ten-minute clip
+yields a frame or two; a busy one is capped at the frame budget, so request
+size follows visual content rather than duration.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import subprocess
+from typing import Dict, Any, List, Optional
+from cache_paths import DEFAULT_CACHE_DIR
+from image_preprocess import MAX_EDGE
+from media_upload import bounded_timeout
+
+MAX_FRAMES = int(os.environ.get('AI_VIDEO_MAX_FRAMES', '16'))
+# Scene score (0-1) above which a frame counts as a new shot
+SCENE_THRESHOLD = float(os.environ.get('AI_VIDEO_SCENE_THRESHOLD', '0.3'))
+# Minimum seconds between kept frames, so flicker can't flood the budget
+MIN_FRAME_GAP = float(os.environ.get('AI_VIDEO_MIN_FRAME_GAP', '1.0'))
+AUDIO_BITRATE = os.environ.get('AI_VIDEO_AUDIO_BITRATE', '16k')
+FFMPEG_TIMEOUT = float(os.environ.get('AI_FFMPEG_TIMEOUT', '300'))
+
+_PTS_TIME = re.compile(r"pts_time:\s*([0-9.]+)")
+
+def video_mode() -> str:
+    """'keyframes' (default) or 'full' to send the original clip"""
+    return os.environ.get('AI_VIDEO_MODE', 'keyframes').lower()
+
+def audio_enabled() -> bool:
+    return os.environ.get('AI_VIDEO_AUDIO', 'true').lower() == 'true'
+
+def ffmpeg_path() -> Optional[str]:
+    return os.environ.get('AI_FFMPEG') or shutil.which('ffmpeg')
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def _spread(items: List[Any], limit: int) -> List[Any]:
+    # Evenly spaced subset that keeps the first and last item
+    if len(items) <= limit:
+        return items
+    if limit == 1:
+        return items[:1]
+    step = (len(items) - 1) / (limit - 1)
+    return [items[round(index * step)] for index in range(limit)]
+
+class VideoReduction:
+    def __init__(self, workdir: str, frames: List[Dict[str, Any]], audio_path: Optional[str]):
+        self.workdir = workdir
+        # [{"path", "time"}] in playback order
+        self.frames = frames
+        self.audio_path = audio_path
+
+    def total_bytes(self) -> int:
+        paths = [frame["path"] for frame in self.frames] + ([self.audio_path] if self.audio_path else [])
+        return sum(os.path.getsize(path) for path in paths)
+
+    def parts(self, prompt: str) -> List[Dict[str, Any]]:
+        """Request parts: prompt, then each keyframe labelled with its time, then the audio"""
+        count = f"{len(self.frames)} keyframe{'s' if len(self.frames) != 1 else ''}"
+        intro = (f"{prompt}\n\nThe video is shown as {count} taken where the scene changes"
+                 f"{', followed by its audio track' if self.audio_path else ''}.")
+        parts = [{"text": intro}]
+        for frame in self.frames:
+            parts.append({"text": f"Frame at {format_timestamp(frame['time'])}"})
+            parts.append({"path": frame["path"], "mime_type": "image/jpeg"})
+        if self.audio_path:
+            parts.append({"path": self.audio_path, "mime_type": "audio/ogg"})
+        return parts
+
+    def cleanup(self) -> None:
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+def _run(args: List[str]) -> subprocess.CompletedProcess:
+    # A timeout kills ffmpeg, so a missed analysis deadline doesn't leave it running
+    return subprocess.run(args, capture_output=True, text=True, timeout=bounded_timeout(FFMPEG_TIMEOUT))
+
+def reduce_video(video_path: str, max_frames: int = None, scene_threshold: float = None,
+                 include_audio: bool = None) -> Optional[VideoReduction]:
+    """Extract keyframes (and audio) from a video, or None when ffmpeg can't"""
+    ffmpeg = ffmpeg_path()
+    if ffmpeg is None:
+        return None
+    max_frames = max_frames or MAX_FRAMES
+    scene_threshold = SCENE_THRESHOLD if scene_threshold is None else scene_threshold
+    include_audio = audio_enabled() if include_audio is None else include_audio
+
+    os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="video_", dir=DEFAULT_CACHE_DIR)
+    try:
+        # First frame, then frames whose scene score clears the threshold and
+        # are at least MIN_FRAME_GAP after the previous kept one
+        select = (f"select='(isnan(prev_selected_t)+gt(scene\\,{scene_threshold}))"
+                  f"*(isnan(prev_selected_t)+gte(t-prev_selected_t\\,{MIN_FRAME_GAP}))'")
+        # Pass 1 only logs scene-change timestamps; nothing is scaled or encoded
+        result = _run([ffmpeg, "-hide_banner", "-nostdin", "-i", video_path, "-an",
+                       "-vf", f"{select},showinfo", "-f", "null", "-"])
+        times = [float(value) for value in _PTS_TIME.findall(result.stderr)]
+        if result.returncode != 0 or not times:
+            print(f"⚠️ Keyframe extraction failed for {video_path}: {result.stderr[-300:]}")
+            shutil.rmtree(workdir, ignore_errors=True)
+            return None
+
+        # Pass 2 re-runs the same selection and writes only the evenly spaced
+        # picks, so a busy clip never puts more than max_frames JPEGs on disk
+        picked = _spread(list(range(len(times))), max_frames)
+        pick = "select='" + "+".join(f"eq(n\\,{index})" for index in picked) + "'"
+        scale = f"scale='min({MAX_EDGE}\\,iw)':'min({MAX_EDGE}\\,ih)':force_original_aspect_ratio=decrease"
+        args = [
+            ffmpeg, "-hide_banner", "-nostdin", "-i", video_path, "-an",
+            "-vf", f"{select},{pick},{scale}", "-fps_mode", "vfr", "-frames:v", str(len(picked)), "-q:v", "4",
+            os.path.join(workdir, "frame_%05d.jpg")
+        ]
+        result = _run(args)
+        if result.returncode != 0 and "fps_mode" in result.stderr:
+            # Builds older than ffmpeg 5.1 only know the deprecated -vsync
+            result = _run(["-vsync" if arg == "-fps_mode" else arg for arg in args])
+        names = sorted(name for name in os.listdir(workdir) if name.startswith("frame_"))
+        if result.returncode != 0 or not names:
+            print(f"⚠️ Keyframe extraction failed for {video_path}: {result.stderr[-300:]}")
+            shutil.rmtree(workdir, ignore_errors=True)
+            return None
+        kept = [{"path": os.path.join(workdir, name), "time": times[picked[index]] if index < len(picked) else 0.0}
+                for index, name in enumerate(names)]
+
+        audio_path = None
+        if include_audio:
+            audio_path = os.path.join(workdir, "audio.ogg")
+            result = _run([
+                ffmpeg, "-hide_banner", "-nostdin", "-i", video_path, "-vn", "-ac", "1", "-ar", "16000",
+                "-c:a", "libopus", "-b:a", AUDIO_BITRATE, audio_path
+            ])
+            # Clips without an audio stream are sent as frames only
+            if result.returncode != 0 or not os.path.exists(audio_path) or os.path.getsize(audio_path) == 0:
+                audio_path = None
+        return VideoReduction(workdir, kept, audio_path)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️ Keyframe extraction failed for {video_path}: {e}")
+        shutil.rmtree(workdir, ignore_errors=True)
+        return None